@@ -1,24 +1,50 @@
 import os
+import uuid
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, send_from_directory
+from flask import (Flask, render_template, jsonify, request, redirect, url_for, flash,
+                   stream_with_context)
 from flask_bootstrap import Bootstrap5
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
 from config import Config
-from models.ecommerce.models import db, Product, CartItem
-from models.ecommerce.forms import CheckoutForm
+from models.ecommerce.models import db, Product
+from models.ecommerce.catalog import (CatalogQueryError, find_product, list_products, parse_product_filters,
+                                      stream_products)
+from models.ecommerce.cache import catalog_cache, encoded_response, request_cache_key
+from models.ecommerce.facets import category_facets
+from models.ecommerce.search import MAX_PAGE_SIZE as MAX_SEARCH_PAGE_SIZE, SearchError, search_products
+from models.ecommerce.schema import serialize_product
+from models.ecommerce.snapshot import catalog_snapshot
+from models.ecommerce.streaming import json_array_chunks, ndjson_chunks
+from models.ecommerce.cart import (CartError, apply_cart_action, apply_cart_batch, cart_delta, cart_lines,
+                                   cart_summary, current_cart_id, init_cart_store, stock_query_budget)
+from models.ecommerce.forms import IDEMPOTENCY_KEY, CheckoutForm
+from models.ecommerce.inventory import InventoryError
+from models.ecommerce.orders import ORDER_FIELDS, OrderError, cart_totals, place_order
 from instance.scripts.seed_db import seed_database
+from assets import assets
+from compression import compression
+from json_provider import init_json_provider
 from logging_config import configure_logging
+from metrics import metrics
+from query_profiler import query_budget, query_profiler
+from render_cache import render_cache
+from request_profiler import request_profiler
+from storage import read_only, storage
 
 
 # Load environment variables
 load_dotenv()
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Hide the FTS5 search tables, which are not models, from autogenerate."""
+    return not (type_ == 'table' and name.startswith('product_fts'))
+
 # Initialize extensions
 bootstrap = Bootstrap5()
-migrate = Migrate()
+migrate = Migrate(render_as_batch=True, include_object=include_object)  # SQLite needs batch mode for ALTER TABLE
 csrf = CSRFProtect()
 
 def create_app(config_class=Config):
@@ -45,7 +71,7 @@ def create_app(config_class=Config):
     # Create a route to serve static files from the ecommerce static directory
     @app.route('/static/ecommerce/<path:filename>')
     def ecommerce_static(filename):
-        return send_from_directory(os.path.join(ecommerce_static_dir), filename)
+        return compression.send_static(ecommerce_static_dir, filename)
     
     # Load configuration
     app.config.from_object(config_class)
@@ -65,15 +91,33 @@ def create_app(config_class=Config):
         config_class.init_app(app)
     
     # Initialize extensions
+    init_json_provider(app)
     bootstrap.init_app(app)
     CORS(app)
+    # Engine options and the read bind must be configured before the engines exist
+    storage.init_app(app)
     db.init_app(app)
+    storage.init_engines(app)
     migrate.init_app(app, db)
+    catalog_cache.init_app(app)
+    catalog_snapshot.init_app(app)
+    init_cart_store(app)
+    metrics.init_app(app)
+    query_profiler.init_app(app)
+    request_profiler.init_app(app)
     
     # Configure logging
     logger = configure_logging(app)
     app.logger = logger  # Make logger available via app.logger
     
+    # Registered after logging, so responses are compressed before the
+    # access log records their size
+    compression.init_app(app)
+    assets.init_app(app)
+    render_cache.init_app(app)
+    # Pages load the bundles of the current build
+    render_cache.depends_on(assets.manifest)
+    
     # Log application startup
     logger.info("=" * 50)
     logger.info("Application starting...")
@@ -145,108 +189,246 @@ def init_db():
 # Routes
 @app.route('/')
 def index():
-    return render_template('ecommerce/catalog.html')
+    return render_cache.page('ecommerce/catalog.html')
 
 @app.route('/cart')
 def cart():
-    return render_template('ecommerce/cart.html')
+    return render_cache.page('ecommerce/cart.html')
 
 @app.route('/checkout', methods=['GET', 'POST'])
+# Order lookup, cart write-through, stock hold (tracked set, cart read, renewal,
+# reservation read, one top-up) and the five-statement order transaction
+@query_budget(14)
 def checkout():
     form = CheckoutForm()
-    cart_items = CartItem.query.all()
+    cart_id = current_cart_id()
     
-    # Check if cart is empty
-    if not cart_items:
-        flash('Your cart is empty!', 'warning')
-        return redirect(url_for('cart'))
+    header_key = request.headers.get('Idempotency-Key')
+    if header_key is not None and not IDEMPOTENCY_KEY.fullmatch(header_key):
+        return jsonify({
+            'status': 'error',
+            'message': 'Idempotency-Key must be 1 to 64 letters, digits or "_.:-" characters'
+        }), 400
+    
+    # API clients may send their key in the header instead of the form
+    if header_key is not None and not form.idempotency_key.data:
+        form.idempotency_key.data = header_key
     
     # Process form submission
     if form.validate_on_submit():
+        # API clients may send their own key; browsers send the form's
+        idempotency_key = header_key or form.idempotency_key.data
         try:
-            # Process the order here
-            # For now, we'll just show a success message
-            flash('Your order has been placed successfully!', 'success')
-            return redirect(url_for('index'))
+            details = {field: getattr(form, field).data for field in ORDER_FIELDS}
+            order_id, created = place_order(cart_id, idempotency_key, details)
+        except (OrderError, InventoryError) as e:
+            flash(str(e), 'warning')
+            return redirect(url_for('cart'))
         except Exception as e:
             app.logger.error(f"Error processing order: {str(e)}")
             flash('An error occurred while processing your order. Please try again.', 'danger')
+        else:
+            if created:
+                flash(f'Your order #{order_id} has been placed successfully!', 'success')
+            else:
+                flash(f'Your order #{order_id} has already been placed.', 'info')
+            return redirect(url_for('index'))
+    
+    cart_items = cart_lines(cart_id)
     
-    # Calculate totals for the order summary
-    subtotal = sum(item.product.price * item.quantity for item in cart_items)
-    tax = subtotal * 0.1  # 10% tax
-    total = subtotal + tax
+    # Check if cart is empty
+    if not cart_items:
+        flash('Your cart is empty!', 'warning')
+        return redirect(url_for('cart'))
+    
+    # Calculate totals for the order summary, in cents as the order will be
+    subtotal, tax, total = (cents / 100 for cents in cart_totals(cart_items))
+    
+    # Every rendered form gets a new key; a form sent back with errors keeps its own
+    if not form.idempotency_key.data:
+        form.idempotency_key.data = uuid.uuid4().hex
     
     return render_template('ecommerce/checkout.html', form=form, cart_items=cart_items, subtotal=subtotal, tax=tax, total=total)
 
 # API Routes
 @app.route('/api/products')
+@read_only
+@query_budget(1)
 def get_products():
-    products = Product.query.all()
-    result = []
-    for p in products:
-        result.append({
-            'id': p.id,
-            'title': p.title,
-            'price': p.price,
-            'description': p.description,
-            'category': p.category,  # Make sure this matches the model field name
-            'image': p.image,
-            'rating': {
-                'rate': p.rating_rate,
-                'count': p.rating_count
-            }
-        })
-    return jsonify(result)
+    """Return one page of products.
+
+    Query parameters: ``category``, ``min_price``, ``max_price``,
+    ``sort`` (``id``, ``price`` or ``-price``), ``limit`` and the opaque
+    ``cursor`` returned as ``next_cursor`` by the previous page.
+
+    With ``stream=1``, every product from the cursor on is returned in one
+    response, encoded while the rows are read (``limit`` is ignored).
+    """
+    try:
+        filters = parse_product_filters(request.args, app.config['ITEMS_PER_PAGE'])
+    except CatalogQueryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    if request.args.get('stream') in ('1', 'true'):
+        filters.pop('limit')
+        try:
+            products = stream_products(app.config['SECRET_KEY'], **filters)
+        except CatalogQueryError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        chunks = json_array_chunks(map(serialize_product, products), app.json.dumps,
+                                   prefix='{"items":[', suffix='],"next_cursor":null}')
+        return app.response_class(stream_with_context(chunks), mimetype='application/json')
+
+    try:
+        body = catalog_snapshot.products_page(app.config['SECRET_KEY'], filters)
+    except CatalogQueryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if body is not None:
+        return encoded_response(body)
+
+    def build():
+        products, next_cursor = list_products(app.config['SECRET_KEY'], **filters)
+        return {
+            'items': [serialize_product(p) for p in products],
+            'next_cursor': next_cursor,
+            'limit': filters['limit']
+        }
+
+    try:
+        return catalog_cache.response(request_cache_key('products'), build)
+    except CatalogQueryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@app.route('/api/products/<int:product_id>')
+@read_only
+@query_budget(1)
+def get_product(product_id):
+    """Return one product."""
+    snapshot = catalog_snapshot.current()
+    if snapshot is not None:
+        body = snapshot.get(product_id)
+    else:
+        row = find_product(product_id)
+        body = app.json.dumps(serialize_product(row)).encode('utf-8') if row is not None else None
+    if body is None:
+        return jsonify({'status': 'error', 'message': 'Product not found'}), 404
+    return encoded_response(body)
+
+@app.route('/api/products/export')
+@read_only
+@query_budget(1)
+def export_products():
+    """Stream every product matching the filters as newline-delimited JSON.
+
+    Accepts the filters, ``sort`` and ``cursor`` of ``/api/products``.
+    """
+    try:
+        filters = parse_product_filters(request.args, app.config['ITEMS_PER_PAGE'])
+        filters.pop('limit')
+        products = stream_products(app.config['SECRET_KEY'], **filters)
+    except CatalogQueryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    chunks = ndjson_chunks(map(serialize_product, products), app.json.dumps)
+    return app.response_class(stream_with_context(chunks), mimetype='application/x-ndjson')
+
+@app.route('/api/categories')
+@read_only
+@query_budget(1)
+def get_categories():
+    """Return every category with its product count and price range."""
+    return catalog_cache.response(request_cache_key('categories'), category_facets)
+
+@app.route('/api/products/search')
+@read_only
+@query_budget(1)
+def search():
+    """Full-text product search ranked by BM25 (a LIKE search off SQLite).
+
+    Query parameters: ``q``, ``limit`` and the opaque ``cursor`` returned as
+    ``next_cursor`` by the previous page.
+    """
+    q = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', app.config['ITEMS_PER_PAGE']))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE:
+        return jsonify({'status': 'error', 'message': f'limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}'}), 400
+
+    def build():
+        items, next_cursor = search_products(app.config['SECRET_KEY'], q, limit, request.args.get('cursor') or None)
+        return {'items': items, 'next_cursor': next_cursor, 'limit': limit}
+
+    try:
+        return catalog_cache.response(request_cache_key('search'), build)
+    except SearchError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
 
 @app.route('/api/cart', methods=['GET', 'POST'])
+@query_budget(9)  # Up to four for the cart, five to reserve stock of a tracked product
 def handle_cart():
+    """Return the cart, applying one action first on POST.
+
+    POST ``?view=delta`` returns only the changed line and the new summary
+    instead of the full cart.
+    """
     if request.method == 'POST':
-        data = request.get_json()
-        product_id = data.get('product_id')
-        action = data.get('action', 'add')  # 'add', 'remove', or 'set'
-        
-        if action == 'add':
-            # Add to cart logic
-            cart_item = CartItem.query.filter_by(product_id=product_id).first()
-            if cart_item:
-                cart_item.quantity += 1
-            else:
-                cart_item = CartItem(product_id=product_id)
-                db.session.add(cart_item)
-        elif action == 'remove':
-            # Remove from cart logic
-            cart_item = CartItem.query.filter_by(product_id=product_id).first()
-            if cart_item:
-                if cart_item.quantity > 1:
-                    cart_item.quantity -= 1
-                else:
-                    db.session.delete(cart_item)
-        elif action == 'set' and 'quantity' in data:
-            # Set specific quantity
-            quantity = int(data['quantity'])
-            cart_item = CartItem.query.filter_by(product_id=product_id).first()
-            if cart_item:
-                if quantity > 0:
-                    cart_item.quantity = quantity
-                else:
-                    db.session.delete(cart_item)
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': 'Request body must be a JSON object'}), 400
+        cart_id = current_cart_id(create=True)
+        try:
+            product_id, _, _ = apply_cart_action(
+                cart_id,
+                data.get('product_id'),
+                data.get('action', 'add'),  # 'add', 'remove', or 'set'
+                data.get('quantity')
+            )
+        except CartError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        except InventoryError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 409
         
-        db.session.commit()
+        if request.args.get('view') == 'delta':
+            return jsonify(cart_delta(cart_id, [product_id]))
     
     # Return the updated cart
-    cart_items = CartItem.query.all()
-    return jsonify([{
-        'id': item.id,
-        'product_id': item.product_id,
-        'quantity': item.quantity,
-        'product': {
-            'id': item.product.id,
-            'title': item.product.title,
-            'price': item.product.price,
-            'image': item.product.image
-        }
-    } for item in cart_items])
+    return jsonify(cart_lines(current_cart_id()))
+
+@app.route('/api/cart/batch', methods=['POST'])
+# Three for the cart and up to two for the response, whatever the batch size;
+# to reserve stock, three reads and two statements per tracked product
+@query_budget(stock_query_budget(8))
+def cart_batch():
+    """Apply several cart operations in one transaction and return the cart.
+
+    Supports ``?view=delta`` like ``POST /api/cart``.
+    """
+    data = request.get_json(silent=True)
+    cart_id = current_cart_id(create=True)
+    try:
+        operations = apply_cart_batch(cart_id, data.get('operations') if isinstance(data, dict) else None)
+    except CartError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except InventoryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    
+    if request.args.get('view') == 'delta':
+        return jsonify(cart_delta(cart_id, [product_id for product_id, _, _ in operations]))
+    return jsonify(cart_lines(cart_id))
+
+@app.route('/api/cart/summary')
+@query_budget(1)
+def get_cart_summary():
+    """Return ``{count, subtotal}`` for the header badge."""
+    return jsonify(cart_summary(current_cart_id()))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-route request metrics of all worker processes, in Prometheus text format."""
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return jsonify({'status': 'error', 'message': 'A valid metrics token is required'}), 403
+    return metrics.response()
 
 def create_app():
     # This function is used to create the Flask application for testing or other purposes
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from flask import url_for
+
+from compression import precompress_directory
+
+ROOT_DIR = Path(__file__).parent.resolve()
+
+# Third-party scripts bundled into vendor.js: file in static/vendor -> the
+# pinned URL it is fetched from, which pages use until the bundle is built
+VENDOR = {
+    'vue.global.prod.js': 'https://unpkg.com/vue@3.2.47/dist/vue.global.prod.js',
+    'axios.min.js': 'https://cdn.jsdelivr.net/npm/axios@1.6.0/dist/axios.min.js',
+    'bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+}
+VENDOR_DIR = 'static/vendor'
+
+# Bundle name -> sources concatenated into it, relative to the project root
+BUNDLES = {
+    'vendor.js': tuple(f'{VENDOR_DIR}/{name}' for name in VENDOR),
+    'catalog.js': ('models/ecommerce/static/components/catalog.vue',),
+    'cart.js': ('models/ecommerce/static/components/cart.vue',),
+}
+
+# Built bundles and their manifest, inside the static folder
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Hashed files never change, so browsers may keep them for a year without revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Keywords after which a slash starts a regular expression, not a division
+_REGEX_KEYWORDS = frozenset(('case', 'delete', 'do', 'else', 'in', 'instanceof', 'new', 'return', 'throw',
+                             'typeof', 'void', 'yield'))
+_TRAILING_WORD = re.compile(r'(\w+)\s*$')
+_SOURCE_MAP = re.compile(r'^//# sourceMappingURL=.*$', re.MULTILINE)
+
+
+class AssetError(ValueError):
+    """Raised when a bundle source is missing."""
+
+
+def minify_js(source):
+    """Strip comments, indentation, trailing spaces and blank lines from JavaScript.
+
+    Conservative by design: strings, template literals and regular expression
+    literals are copied as they are, and line breaks are kept so automatic
+    semicolon insertion reads the code as before.
+    """
+    out = []
+    last = ''  # Last significant character written
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c in '\'"`':
+            j = i + 1
+            while j < n and source[j] != c:
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '\n' and c != '`':
+                    break
+                j += 1
+            out.append(source[i:j + 1])
+            last, i = c, j + 1
+        elif source.startswith('//', i):
+            j = source.find('\n', i)
+            i = n if j < 0 else j
+        elif source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            i = n if j < 0 else j + 2
+        elif c == '/' and _starts_regex(last, out):
+            j, in_class = i + 1, False
+            while j < n and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                elif source[j] == '/' and not in_class:
+                    break
+                j += 1
+            out.append(source[i:j + 1])
+            last, i = '/', j + 1
+        elif c == '\n':
+            while out and out[-1] in (' ', '\t', '\r'):
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            i += 1
+        elif c in ' \t\r' and (not out or out[-1] == '\n'):
+            i += 1
+        else:
+            out.append(c)
+            if not c.isspace():
+                last = c
+            i += 1
+    while out and out[-1] in (' ', '\t', '\r', '\n'):
+        out.pop()
+    return ''.join(out) + '\n'
+
+
+def _starts_regex(last, out):
+    if not last or last in '(,=:[!&|?{};+-*%<>~^':
+        return True
+    match = _TRAILING_WORD.search(''.join(out[-12:]))
+    return match is not None and match.group(1) in _REGEX_KEYWORDS
+
+
+def fetch_vendor(root=ROOT_DIR):
+    """Download the pinned vendor scripts into ``static/vendor`` (needs network access)."""
+    import requests
+
+    directory = Path(root) / VENDOR_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, url in VENDOR.items():
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        (directory / name).write_bytes(response.content)
+
+
+def build_assets(root=ROOT_DIR, static_folder=None):
+    """Bundle, minify and hash every bundle, then write the manifest.
+
+    A bundle is written as ``dist/<name>.<hash>.<ext>`` in the static folder,
+    with its precompressed siblings. ``vendor.js`` is skipped while the vendor
+    scripts have not been fetched. Files of the previous build are kept, for
+    pages rendered before the deploy, and older ones are removed. Returns the
+    manifest, bundle name -> path in the static folder.
+    """
+    root = Path(root)
+    dist = Path(static_folder or root / 'static') / DIST_DIR
+    dist.mkdir(parents=True, exist_ok=True)
+    previous = _read_manifest(dist / MANIFEST) or {}
+
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        missing = [source for source in sources if not (root / source).is_file()]
+        if missing:
+            if name == 'vendor.js':
+                continue
+            raise AssetError(f"{name}: missing source {', '.join(missing)}")
+        parts = []
+        for source in sources:
+            text = (root / source).read_text(encoding='utf-8')
+            # Vendor scripts are minified upstream already; their source maps are not shipped
+            parts.append(_SOURCE_MAP.sub('', text) if '.min.' in source or '.prod.' in source else minify_js(text))
+        # A lone semicolon between sources, so no two of them parse as one statement
+        body = '\n;\n'.join(part.strip() for part in parts).encode('utf-8') + b'\n'
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.blake2b(body, digest_size=6).hexdigest()}{ext}'
+        if not (dist / filename).exists():
+            (dist / filename).write_bytes(body)
+        manifest[name] = f'{DIST_DIR}/{filename}'
+
+    keep = {Path(path).name for path in list(manifest.values()) + list(previous.values())}
+    for path in dist.iterdir():
+        if path.name != MANIFEST and path.name.removesuffix('.gz').removesuffix('.br') not in keep:
+            path.unlink()
+    precompress_directory(dist)
+
+    tmp_path = dist / f'{MANIFEST}.tmp'
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding='utf-8')
+    os.replace(tmp_path, dist / MANIFEST)
+    return manifest
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Assets:
+    """Resolves bundle names to the URLs templates load them from.
+
+    Built bundles are served from content-hashed URLs marked immutable, so a
+    browser that has them never asks again; a new build changes the URLs. A
+    bundle missing from the manifest (nothing built yet, or
+    ``ASSETS_ENABLED=False`` in development) resolves to its unbundled
+    sources instead.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.manifest_path = None
+        self._manifest = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ASSETS_ENABLED', True)
+        self.manifest_path = os.path.join(app.static_folder, DIST_DIR, MANIFEST) if app.static_folder else None
+        self._manifest, self._manifest_mtime = {}, None
+        app.extensions['assets'] = self
+        app.jinja_env.globals['asset_urls'] = self.urls
+
+        # Wraps the static view in place, keeping precompressed serving
+        static_view = app.view_functions.get('static')
+        if static_view is not None:
+            def static(filename):
+                response = static_view(filename)
+                if filename.startswith(DIST_DIR + '/') and response.status_code in (200, 304):
+                    response.cache_control.public = True
+                    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+                    response.cache_control.immutable = True
+                return response
+            app.view_functions['static'] = static
+
+    def urls(self, name):
+        """URLs to load bundle ``name`` from: its hashed file, or its sources."""
+        path = self.manifest().get(name) if self.enabled else None
+        if path is not None:
+            return [url_for('static', filename=path)]
+        return [_source_url(source) for source in BUNDLES[name]]
+
+    def manifest(self):
+        """The manifest of the last build, reread when a build replaces it."""
+        if self.manifest_path is None:
+            return {}
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._manifest_mtime:
+            with self._lock:
+                self._manifest = _read_manifest(self.manifest_path) or {}
+                self._manifest_mtime = mtime
+        return self._manifest
+
+
+def _source_url(source):
+    if source.startswith(VENDOR_DIR + '/'):
+        return VENDOR[source[len(VENDOR_DIR) + 1:]]
+    if source.startswith('models/ecommerce/static/'):
+        return url_for('ecommerce_static', filename=source[len('models/ecommerce/static/'):])
+    return url_for('static', filename=source[len('static/'):])
+
+
+assets = Assets()
@@ -0,0 +1,235 @@
+"""Endpoint benchmarks over synthetic catalogs of increasing size.
+
+Seeds a throwaway SQLite database with synthetic catalogs and carts, drives
+the API and template routes through the Flask test client and reports, per
+case, the time per request, the peak memory allocated while handling one
+request and the number of SQL statements it runs:
+
+    python benchmarks/bench_endpoints.py --sizes 1000,100000 --output bench.json
+    python benchmarks/bench_endpoints.py --output new.json --compare bench.json --threshold 0.2
+
+With ``--compare`` the exit status is 1 when a case regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# As in tests/conftest.py, the engine and log sinks are created when app.py is
+# imported, so the benchmark database must be configured before that import
+_workdir = Path(tempfile.mkdtemp(prefix='ecommerce-bench-'))
+os.environ['DATABASE_URL'] = f"sqlite:///{_workdir / 'bench.db'}"
+os.environ['LOG_FILE'] = str(_workdir / 'bench.log')
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['CATALOG_VERSION_FILE'] = str(_workdir / 'catalog.version')
+os.environ['CART_STORE'] = 'sql'
+
+from sqlalchemy import delete, event, insert
+
+from app import create_app, db
+from benchmarks.compare import compare_results, format_comparison, load_results
+from benchmarks.fixtures import seed_catalog
+from models.ecommerce.cache import catalog_cache
+from models.ecommerce.models import CartItem
+
+CART_ID = 'bench-cart'
+
+CHECKOUT_FORM = {
+    'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com',
+    'phone': '555-0100', 'address': '1 Main St', 'city': 'London', 'state': 'London',
+    'zip_code': '12345', 'country': 'UK', 'payment_method': 'paypal'
+}
+
+
+def seed_cart(lines):
+    db.session.execute(delete(CartItem).where(CartItem.cart_id == CART_ID))
+    db.session.execute(insert(CartItem), [
+        {'cart_id': CART_ID, 'product_id': pid, 'quantity': 1} for pid in range(1, lines + 1)
+    ])
+    db.session.commit()
+
+
+def catalog_cases():
+    """Cases that depend only on the catalog size."""
+    return [
+        ('GET /api/products', 'GET', '/api/products', {}),
+        ('GET /api/products?category&sort=-price', 'GET',
+         '/api/products?category=electronics&sort=-price&limit=24', {}),
+        ('GET /api/categories', 'GET', '/api/categories', {}),
+        ('GET /api/products/search', 'GET', '/api/products/search?q=leather%20jack', {}),
+        ('GET /', 'GET', '/', {}),
+    ]
+
+
+def cart_cases(lines):
+    """Cases that depend on the number of cart lines."""
+    return [
+        ('GET /api/cart', 'GET', '/api/cart', {}),
+        ('POST /api/cart set', 'POST', '/api/cart', {'json': {'product_id': 1, 'action': 'set', 'quantity': 2}}),
+        ('POST /api/cart?view=delta set', 'POST', '/api/cart?view=delta',
+         {'json': {'product_id': 1, 'action': 'set', 'quantity': 3}}),
+        ('POST /api/cart/batch', 'POST', '/api/cart/batch?view=delta', {'json': {'operations': [
+            {'product_id': pid, 'action': 'set', 'quantity': 2} for pid in range(1, min(lines, 10) + 1)
+        ]}}),
+        ('GET /api/cart/summary', 'GET', '/api/cart/summary', {}),
+        ('GET /cart', 'GET', '/cart', {}),
+        ('GET /checkout', 'GET', '/checkout', {}),
+        ('POST /checkout', 'POST', '/checkout', lambda: checkout_request(lines)),
+    ]
+
+
+def checkout_request(lines):
+    """Refill the cart emptied by the previous order and send a new idempotency key."""
+    seed_cart(lines)
+    return {'data': CHECKOUT_FORM, 'headers': {'Idempotency-Key': uuid.uuid4().hex}}
+
+
+def measure(client, method, url, kwargs, min_time=0.2, repeat=5):
+    """Time one case; returns median/min microseconds, peak KiB and statement count.
+
+    ``kwargs`` may be a callable preparing each call, e.g. refilling the cart,
+    and returning its arguments; only the request itself is timed then.
+    """
+    prepare = kwargs if callable(kwargs) else lambda: kwargs
+
+    def call(arguments):
+        started = time.perf_counter()
+        response = client.open(url, method=method, **arguments)
+        elapsed = time.perf_counter() - started
+        # Failed cart actions and checkouts redirect back to the cart
+        if response.status_code >= 400 or (response.location or '').endswith('/cart'):
+            raise RuntimeError(f'{method} {url} returned {response.status_code} {response.location or ""}'.rstrip())
+        return elapsed
+
+    call(prepare())  # Warm up caches, compiled statements and templates
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    arguments = prepare()
+    # Including the read engine of the read-only views
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        call(arguments)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+
+    arguments = prepare()
+    tracemalloc.start()
+    try:
+        call(arguments)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    single = call(prepare())
+    number = max(1, int(min_time / repeat / max(single, 1e-6)))
+    timings = []
+    for _ in range(repeat):
+        elapsed = sum(call(prepare()) for _ in range(number))
+        timings.append(elapsed / number * 1e6)
+
+    return {
+        'median_us': statistics.median(timings),
+        'min_us': min(timings),
+        'peak_kib': round(peak / 1024, 1),
+        'sql_statements': len(statements),
+        'iterations': number * repeat
+    }
+
+
+def run(sizes, cart_sizes, min_time, use_cache):
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False)
+    catalog_cache.enabled = use_cache
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['cart_id'] = CART_ID
+
+    results = {}
+    with app.app_context():
+        for size in sizes:
+            started = time.perf_counter()
+            seed_catalog(size)
+            print(f'Seeded {size} products in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+            for name, method, url, kwargs in catalog_cases():
+                key = f'{name} [products={size}]'
+                results[key] = measure(client, method, url, kwargs, min_time)
+                print(f"{key:<60} {results[key]['median_us']:>10.1f}us", file=sys.stderr)
+
+            for lines in cart_sizes:
+                if lines > size:
+                    continue
+                for name, method, url, kwargs in cart_cases(lines):
+                    seed_cart(lines)
+                    key = f'{name} [products={size},lines={lines}]'
+                    results[key] = measure(client, method, url, kwargs, min_time)
+                    print(f"{key:<60} {results[key]['median_us']:>10.1f}us", file=sys.stderr)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=_int_list, default=[1000, 100000],
+                        help='catalog sizes, comma separated (default: 1000,100000; add 1000000 for the full run)')
+    parser.add_argument('--cart-lines', type=_int_list, default=[1, 50, 500],
+                        help='cart sizes, comma separated (default: 1,50,500)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent timing each case')
+    parser.add_argument('--cache', action='store_true', help='keep the catalog response cache enabled')
+    parser.add_argument('--output', default='bench.json', help='where to write the results')
+    parser.add_argument('--compare', help='baseline results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a case regresses')
+    args = parser.parse_args(argv)
+
+    document = {
+        'meta': {
+            'commit': _commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cache': args.cache
+        },
+        'results': run(args.sizes, args.cart_lines, args.min_time, args.cache)
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    print(f'Results written to {args.output}', file=sys.stderr)
+
+    if args.compare:
+        rows = compare_results(load_results(args.compare), document, args.threshold)
+        print(format_comparison(rows))
+        if any(row['regressed'] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Per-request cost of request logging, with LOG_FORMAT=text, LOG_FORMAT=json and without it.
+
+Serves a trivial route from bare Flask apps, one without request logging and
+one per log format set up by ``configure_logging``, and reports the median
+time per request and its overhead over the app that does not log. Console
+output goes to the null device and the log files to a throwaway directory,
+so the numbers measure formatting and handing records to the sinks:
+
+    python benchmarks/bench_logging.py --requests 5000 --output bench_logging.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from flask import Flask
+from loguru import logger
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from logging_config import configure_logging  # noqa: E402
+
+MODES = ('none', 'text', 'json')
+
+
+def make_app(mode, log_dir, level='INFO'):
+    """A bare app with one route; ``mode`` is ``none`` or a ``LOG_FORMAT``."""
+    app = Flask(__name__)
+    app.config.update(LOG_FILE=str(Path(log_dir) / f'{mode}.log'), LOG_LEVEL=level, LOG_FORMAT=mode)
+
+    @app.route('/ping')
+    def ping():
+        return {'status': 'ok'}
+
+    if mode == 'none':
+        logger.remove()
+    else:
+        configure_logging(app)
+    return app
+
+
+def measure(app, requests, repeat=5):
+    """Median and minimum microseconds per request over ``repeat`` rounds of ``requests``."""
+    client = app.test_client()
+    for _ in range(min(requests, 100)):  # Warm up
+        client.get('/ping')
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get('/ping')
+        timings.append((time.perf_counter() - started) / requests * 1e6)
+    return {'median_us': statistics.median(timings), 'min_us': min(timings), 'iterations': requests * repeat}
+
+
+def overheads(results):
+    """Add each mode's overhead over the ``none`` mode, in microseconds per request."""
+    baseline = results['none']['median_us']
+    for result in results.values():
+        result['overhead_us'] = result['median_us'] - baseline
+    return results
+
+
+def run(requests, repeat, level):
+    # The loguru logger is global: each mode replaces the sinks of the one before
+    stderr, sys.stderr = sys.stderr, open(os.devnull, 'w', encoding='utf-8')
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench-logging-') as log_dir:
+            for mode in MODES:
+                results[mode] = measure(make_app(mode, log_dir, level), requests, repeat)
+                print(f"{mode:<6} {results[mode]['median_us']:>10.1f}us", file=stderr)
+            logger.remove()  # Drains the queues and closes the files
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+    return overheads(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per timing round')
+    parser.add_argument('--repeat', type=int, default=5, help='timing rounds per mode')
+    parser.add_argument('--level', default='INFO', help='LOG_LEVEL of the logging modes')
+    parser.add_argument('--output', help='where to write the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.requests, args.repeat, args.level)
+    print(f"{'mode':<6} {'median':>12} {'overhead':>12}")
+    for mode, result in results.items():
+        print(f"{mode:<6} {result['median_us']:>10.1f}us {result['overhead_us']:>+10.1f}us")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'level': args.level, 'results': results}, f, indent=2)
+        print(f'Results written to {args.output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Compare two benchmark result files and flag regressions."""
+import json
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """Compare the cases present in both runs.
+
+    A case regresses when its median time grows by more than ``threshold``
+    (0.2 = 20%) or when it runs more SQL statements than before, which is
+    deterministic and so needs no tolerance. Returns one dict per case.
+    """
+    rows = []
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        ratio = result['median_us'] / base['median_us'] if base['median_us'] else float('inf')
+        more_statements = result['sql_statements'] > base['sql_statements']
+        rows.append({
+            'case': key,
+            'baseline_us': base['median_us'],
+            'current_us': result['median_us'],
+            'ratio': ratio,
+            'baseline_statements': base['sql_statements'],
+            'current_statements': result['sql_statements'],
+            'regressed': ratio > 1 + threshold or more_statements
+        })
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'case':<60} {'baseline':>12} {'current':>12} {'ratio':>7} {'sql':>9}"]
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        statements = f"{row['baseline_statements']}->{row['current_statements']}"
+        lines.append(
+            f"{row['case']:<60} {row['baseline_us']:>10.1f}us {row['current_us']:>10.1f}us "
+            f"{row['ratio']:>6.2f}x {statements:>9}{flag}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,10 @@
+"""Synthetic data shared by the benchmark scripts."""
+from models.ecommerce.models import db
+from models.ecommerce.seeding import load_products, synthetic_products
+
+
+def seed_catalog(size, chunk_size=10000):
+    """Recreate the schema and bulk load ``size`` synthetic products."""
+    db.drop_all()
+    db.create_all()
+    load_products(synthetic_products(size), chunk_size=chunk_size, fast=True, defer_indexes=True)
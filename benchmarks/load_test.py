@@ -0,0 +1,302 @@
+"""Concurrent mixed-workload load generator.
+
+Seeds a throwaway SQLite database with a synthetic catalog, starts
+``gunicorn -c gunicorn.conf.py app:app`` on it (the workers and threads used
+by docker-compose.yml) and lets N simulated shoppers browse, search, add and
+remove items in bursts and check out, all offline:
+
+    python benchmarks/load_test.py --shoppers 50 --duration 60 --products 10000
+    python benchmarks/load_test.py --mix browse=40,search=10,cart=40,checkout=10 --output load.json
+
+Pass ``--url`` to drive a server that is already running instead (it is not
+seeded; pass its ``--log-file`` to count lock errors). Reports throughput,
+p50/p95/p99 latency, the error rate and the server errors per request type,
+and how often the server logged SQLite's ``database is locked``.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_MIX = {'browse': 50, 'search': 10, 'cart': 30, 'checkout': 10}
+SEARCH_TERMS = ('cotton', 'slim jacket', 'leather', 'wireless mon', 'silver ring', 'backpack')
+LOCKED_MESSAGE = 'database is locked'
+
+CHECKOUT_FORM = {
+    'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com',
+    'phone': '555-0100', 'address': '1 Main St', 'city': 'London', 'state': 'London',
+    'zip_code': '12345', 'country': 'UK', 'payment_method': 'paypal'
+}
+
+# The CSRF token and idempotency key of the rendered checkout form
+_HIDDEN_FIELD = re.compile(r'<input[^>]* name="(\w+)"[^>]* type="hidden" value="([^"]*)"')
+
+
+class Shopper(threading.Thread):
+    """One simulated visitor with its own session cookie and connection pool."""
+
+    def __init__(self, base_url, mix, deadline, seed, products, think_time):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.scenarios, self.weights = zip(*mix.items())
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.products = products
+        self.think_time = think_time
+        self.session = requests.Session()
+        # (request name, seconds, ok, server error)
+        self.records = []
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            getattr(self, scenario)()
+            if self.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+    def request(self, name, method, path, expect=None, location=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=30,
+                                            allow_redirects=False, **kwargs)
+        except requests.RequestException:
+            self.records.append((name, time.perf_counter() - started, False, False))
+            return None
+        elapsed = time.perf_counter() - started
+        ok = response.status_code == expect if expect else response.status_code < 400
+        if location is not None:
+            ok = ok and urlsplit(response.headers.get('Location', '')).path == location
+        # The error handlers answer a generic 500, so a lock timeout is only a 5xx
+        # here; count_locked finds the lock errors themselves in the server log
+        self.records.append((name, elapsed, ok, response.status_code >= 500))
+        return response
+
+    def _product_id(self):
+        return self.rng.randint(1, self.products)
+
+    def browse(self):
+        response = self.request('GET /api/products', 'GET', '/api/products')
+        for _ in range(self.rng.randint(0, 3)):
+            if response is None or response.status_code != 200 or not response.json().get('next_cursor'):
+                break
+            response = self.request('GET /api/products?cursor', 'GET', '/api/products',
+                                    params={'cursor': response.json()['next_cursor']})
+        self.request('GET /api/categories', 'GET', '/api/categories')
+
+    def search(self):
+        self.request('GET /api/products/search', 'GET', '/api/products/search',
+                     params={'q': self.rng.choice(SEARCH_TERMS)})
+
+    def cart(self):
+        # A burst of clicks, sent as one batch like the catalog page does
+        operations = [{'product_id': self._product_id(), 'action': 'add'} for _ in range(self.rng.randint(1, 5))]
+        self.request('POST /api/cart/batch', 'POST', '/api/cart/batch',
+                     params={'view': 'delta'}, json={'operations': operations})
+        self.request('GET /api/cart/summary', 'GET', '/api/cart/summary')
+        if self.rng.random() < 0.5:
+            self.request('POST /api/cart remove', 'POST', '/api/cart', params={'view': 'delta'},
+                         json={'product_id': operations[0]['product_id'], 'action': 'remove'})
+        self.request('GET /api/cart', 'GET', '/api/cart')
+
+    def checkout(self):
+        self.request('POST /api/cart', 'POST', '/api/cart', params={'view': 'delta'},
+                     json={'product_id': self._product_id(), 'action': 'add'})
+        response = self.request('GET /checkout', 'GET', '/checkout')
+        if response is None or response.status_code != 200:
+            return
+        form = dict(CHECKOUT_FORM, **dict(_HIDDEN_FIELD.findall(response.text)))
+        # A placed order redirects to the catalog; an order or stock error redirects
+        # to /cart, and a 200 is the form again with validation errors
+        self.request('POST /checkout', 'POST', '/checkout', expect=302, location='/', data=form)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(records, elapsed):
+    by_name = defaultdict(list)
+    for record in records:
+        by_name[record[0]].append(record)
+
+    def stats(group):
+        latencies = sorted(seconds * 1000 for _, seconds, _, _ in group)
+        errors = sum(1 for _, _, ok, _ in group if not ok)
+        return {
+            'requests': len(group),
+            'throughput_rps': round(len(group) / elapsed, 1),
+            'error_rate': round(errors / len(group), 4) if group else 0.0,
+            'server_errors': sum(1 for *_, server_error in group if server_error),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2)
+        }
+
+    return {
+        'total': stats(records),
+        'requests': {name: stats(group) for name, group in sorted(by_name.items())}
+    }
+
+
+def seed(workdir, products):
+    """Create and seed the database the server will use, in this process."""
+    os.environ.update(_server_env(workdir))
+    from app import create_app, db
+    from benchmarks.fixtures import seed_catalog
+
+    app = create_app()
+    with app.app_context():
+        seed_catalog(products)
+        db.session.remove()
+
+
+def _server_env(workdir):
+    return {
+        'DATABASE_URL': f"sqlite:///{workdir / 'load.db'}",
+        'LOG_FILE': str(workdir / 'app.log'),
+        'LOG_LEVEL': 'WARNING',
+        'CATALOG_VERSION_FILE': str(workdir / 'catalog.version'),
+        'METRICS_DIR': str(workdir / 'metrics'),
+        'CART_STORE': 'sql',
+        'SECRET_KEY': 'load-test'
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, workers=None, threads=None):
+    port = _free_port()
+    env = dict(os.environ, **_server_env(workdir), GUNICORN_BIND=f'127.0.0.1:{port}')
+    if workers:
+        env['GUNICORN_WORKERS'] = str(workers)
+    if threads:
+        env['GUNICORN_THREADS'] = str(threads)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=open(workdir / 'gunicorn.log', 'w')
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited; see {workdir / 'gunicorn.log'}")
+        try:
+            requests.get(base_url + '/api/cart/summary', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start within 30 seconds')
+
+
+def count_locked(log_file):
+    try:
+        with open(log_file, encoding='utf-8', errors='replace') as f:
+            return sum(line.count(LOCKED_MESSAGE) for line in f)
+    except OSError:
+        return None
+
+
+def _mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}'")
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shoppers', type=int, default=20, help='concurrent shoppers (default: 20)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run (default: 30)')
+    parser.add_argument('--products', type=int, default=10000, help='synthetic catalog size (default: 10000)')
+    parser.add_argument('--mix', type=_mix, default=DEFAULT_MIX,
+                        help='scenario weights (default: browse=50,search=10,cart=30,checkout=10)')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between scenarios, in seconds')
+    parser.add_argument('--workers', type=int, help='gunicorn workers (default: gunicorn.conf.py)')
+    parser.add_argument('--threads', type=int, help='gunicorn threads per worker (default: gunicorn.conf.py)')
+    parser.add_argument('--url', help='drive this running server instead of starting one')
+    parser.add_argument('--log-file', help="the running server's LOG_FILE, to count lock errors")
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the shoppers')
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    server = None
+    log_file = args.log_file
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix='ecommerce-load-'))
+        print(f'Seeding {args.products} products in {workdir}...', file=sys.stderr)
+        seed(workdir, args.products)
+        server, base_url = start_server(workdir, args.workers, args.threads)
+        log_file = workdir / 'app.log'
+
+    try:
+        print(f'Running {args.shoppers} shoppers for {args.duration:.0f}s against {base_url}...', file=sys.stderr)
+        started = time.monotonic()
+        deadline = started + args.duration
+        shoppers = [
+            Shopper(base_url, args.mix, deadline, args.seed * 100003 + i, args.products, args.think_time)
+            for i in range(args.shoppers)
+        ]
+        for shopper in shoppers:
+            shopper.start()
+        for shopper in shoppers:
+            shopper.join()
+        elapsed = time.monotonic() - started
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    report = summarize([record for shopper in shoppers for record in shopper.records], elapsed)
+    report['config'] = {
+        'shoppers': args.shoppers, 'duration': args.duration, 'products': args.products,
+        'mix': args.mix, 'url': base_url
+    }
+    report['total']['locked_in_log'] = count_locked(log_file) if log_file else None
+
+    print(f"{'request':<32} {'count':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'5xx':>6}")
+    for name, stats in list(report['requests'].items()) + [('TOTAL', report['total'])]:
+        print(f"{name:<32} {stats['requests']:>7} {stats['throughput_rps']:>8.1f} {stats['error_rate'] * 100:>5.1f}% "
+              f"{stats['p50_ms']:>6.1f}ms {stats['p95_ms']:>6.1f}ms {stats['p99_ms']:>6.1f}ms "
+              f"{stats['server_errors']:>6}")
+    if report['total']['locked_in_log'] is not None:
+        print(f"'{LOCKED_MESSAGE}' in the server log: {report['total']['locked_in_log']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
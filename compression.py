@@ -0,0 +1,212 @@
+import gzip
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request, send_from_directory
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+# Content-Encoding -> suffix of the precompressed sibling of a static file
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Response mimetypes worth compressing; images and archives are compressed already
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+))
+
+# Static files precompressed at build time
+PRECOMPRESS_EXTENSIONS = frozenset(('.css', '.html', '.js', '.json', '.map', '.svg', '.txt', '.vue', '.xml'))
+
+
+def compress(body, encoding, gzip_level=6, brotli_quality=5):
+    """Compress ``body`` for the ``br`` or ``gzip`` content coding."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    # A fixed mtime keeps the output, and anything hashed from it, deterministic
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def precompress_directory(directory, min_size=256, force=False):
+    """Write ``.gz`` (and ``.br`` with brotli installed) siblings of the text assets under ``directory``.
+
+    Siblings are written at the highest levels, since this runs once at build
+    time, and only kept when smaller than the source. Up to date siblings are
+    skipped unless ``force``. Returns the paths of the siblings written.
+    """
+    encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            body = None
+            for encoding in encodings:
+                sibling = path + SUFFIXES[encoding]
+                if not force and _fresh(sibling, stat):
+                    continue
+                if body is None:
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                compressed = compress(body, encoding, gzip_level=9, brotli_quality=11)
+                if len(compressed) >= len(body):
+                    if os.path.exists(sibling):
+                        os.unlink(sibling)
+                    continue
+                tmp_path = sibling + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, sibling)
+                written.append(sibling)
+    return written
+
+
+def _fresh(sibling, source_stat):
+    try:
+        return os.stat(sibling).st_mtime >= source_stat.st_mtime
+    except FileNotFoundError:
+        return False
+
+
+class Compression:
+    """Compresses responses with the best content coding the client accepts.
+
+    Dynamic responses of a compressible type and at least ``COMPRESS_MIN_SIZE``
+    bytes are compressed after the view returns. Responses with a strong ETag,
+    such as cached catalog pages, keep their compressed body in a bounded
+    cache keyed by ETag and coding, so a repeated page is compressed once.
+    Static files are served from precompressed siblings written by
+    ``instance/scripts/precompress.py`` and never compressed per request.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.cache_max_bytes = 0
+        self.encodings = ()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+        self.cache_max_bytes = app.config.get('COMPRESS_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+        # Preferred first when the client accepts both equally
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self.clear()
+        app.extensions['compression'] = self
+        if app.static_folder:
+            static_folder = app.static_folder
+            app.view_functions['static'] = lambda filename: self.send_static(static_folder, filename)
+        if not self.enabled:
+            return
+
+        app.after_request(self._after_request)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def negotiate(self, encodings=None):
+        """The coding of ``encodings`` the client prefers, or ``None`` to send the body as is."""
+        return request.accept_encodings.best_match(encodings or self.encodings)
+
+    def compressed(self, body, encoding, etag=None):
+        """``body`` compressed for ``encoding``; cached under ``etag`` when given."""
+        if etag is None:
+            return compress(body, encoding, self.gzip_level, self.brotli_quality)
+        key = (etag, encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        cached = compress(body, encoding, self.gzip_level, self.brotli_quality)
+        if len(cached) <= self.cache_max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = cached
+                    self._size += len(cached)
+                while self._size > self.cache_max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return cached
+
+    def send_static(self, directory, filename):
+        """``send_from_directory``, preferring a precompressed sibling the client accepts.
+
+        A sibling older than its source is ignored, so an asset edited since
+        the last build is sent uncompressed rather than stale.
+        """
+        path = safe_join(directory, filename)
+        if self.enabled and path is not None and os.path.isfile(path):
+            source_stat = os.stat(path)
+            for encoding in self._accepted(tuple(SUFFIXES)):
+                if _fresh(path + SUFFIXES[encoding], source_stat):
+                    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                    response = send_from_directory(directory, filename + SUFFIXES[encoding], mimetype=mimetype)
+                    response.headers['Content-Encoding'] = encoding
+                    response.vary.add('Accept-Encoding')
+                    return response
+        response = send_from_directory(directory, filename)
+        if os.path.splitext(filename)[1].lower() in PRECOMPRESS_EXTENSIONS:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def _accepted(self, encodings):
+        # Accepted codings of ``encodings``, most preferred first
+        qualities = [(request.accept_encodings[encoding], -i, encoding) for i, encoding in enumerate(encodings)]
+        return [encoding for quality, _, encoding in sorted(qualities, reverse=True) if quality > 0]
+
+    def _after_request(self, response):
+        if response.status_code == 304:
+            etag, weak = response.get_etag()
+            if etag and not weak and not request.if_none_match.contains(etag):
+                # Revalidated the compressed variant: confirm the ETag it was sent with
+                response.set_etag(etag, weak=True)
+                response.vary.add('Accept-Encoding')
+            return response
+        if (response.direct_passthrough or response.is_streamed
+                or not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None or response.content_length is not None and response.content_length < self.min_size:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        response.set_data(self.compressed(body, encoding, etag if etag and not weak else None))
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # The compressed variant is not byte-identical to the original one
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
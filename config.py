@@ -24,6 +24,21 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f'sqlite:///{str(INSTANCE_DIR / "ecommerce.db")}')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Storage profile: SQLite pragmas set on every connection (balanced, durable
+    # or default), with SQLITE_PRAGMAS overrides such as "synchronous=FULL,mmap_size=0"
+    STORAGE_PROFILE = os.getenv('STORAGE_PROFILE', 'balanced')
+    SQLITE_PRAGMAS = os.getenv('SQLITE_PRAGMAS', '')
+    # Connection pool of each engine
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # Seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))  # Seconds; -1 keeps connections forever
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'False').lower() in ('true', '1', 't')
+    # Read-only catalog views query DATABASE_READ_URL (a replica) when set; a
+    # SQLite file gets a separate query-only pool on the same file
+    DATABASE_READ_URL = os.getenv('DATABASE_READ_URL', '')
+    READ_ENGINE_ENABLED = os.getenv('READ_ENGINE_ENABLED', 'True').lower() in ('true', '1', 't')
+    
     # Application settings
     DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
     HOST = os.getenv('HOST', '0.0.0.0')
@@ -34,12 +49,79 @@ class Config:
     LOG_FILE = os.getenv('LOG_FILE', str(LOGS_DIR / 'app.log'))
     LOG_ROTATION = os.getenv('LOG_ROTATION', '10 MB')
     LOG_RETENTION = os.getenv('LOG_RETENTION', '30 days')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text, or json for production
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))  # Fraction of successful requests logged
+    LOG_REQUEST_BODIES = os.getenv('LOG_REQUEST_BODIES', 'False').lower() in ('true', '1', 't')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Records buffered before dropping (json mode)
     
     # Application settings
     ITEMS_PER_PAGE = int(os.getenv('ITEMS_PER_PAGE', '12'))
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', str(BASE_DIR / 'static' / 'uploads'))
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))  # 16MB
     
+    # JSON encoding of API responses: auto (orjson when installed), orjson or stdlib
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'auto')
+    
+    # Response compression (gzip, and brotli when installed) of text responses
+    # of at least COMPRESS_MIN_SIZE bytes; static files are served from the
+    # siblings written by instance/scripts/precompress.py
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'True').lower() in ('true', '1', 't')
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+    COMPRESS_CACHE_MAX_BYTES = int(os.getenv('COMPRESS_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))  # 16MB
+    # Load the hashed bundles of instance/scripts/build_assets.py; disable to
+    # serve the component sources while editing them
+    ASSETS_ENABLED = os.getenv('ASSETS_ENABLED', 'True').lower() in ('true', '1', 't')
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.getenv('SEND_FILE_MAX_AGE_DEFAULT', '3600'))  # Static files, in seconds
+    
+    # Cache of rendered pages and {% cache %} fragments, rebuilt when a template,
+    # the config or the asset manifest changes
+    RENDER_CACHE_ENABLED = os.getenv('RENDER_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    
+    # Catalog cache
+    CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    CATALOG_CACHE_MAX_BYTES = int(os.getenv('CATALOG_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))  # 32MB
+    CATALOG_CACHE_POLICY = os.getenv('CATALOG_CACHE_POLICY', 'lru')  # lru or fifo
+    # Shared by all worker processes so a write in one invalidates the others
+    CATALOG_VERSION_FILE = os.getenv('CATALOG_VERSION_FILE', str(INSTANCE_DIR / 'catalog.version'))
+    # Memory-mapped catalog snapshot shared by all worker processes
+    CATALOG_SNAPSHOT_ENABLED = os.getenv('CATALOG_SNAPSHOT_ENABLED', 'False').lower() in ('true', '1', 't')
+    CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', str(INSTANCE_DIR / 'catalog.snap'))
+    # Rebuild a stale snapshot on demand; disable to build only with instance/scripts/build_snapshot.py
+    CATALOG_SNAPSHOT_AUTO_REBUILD = os.getenv('CATALOG_SNAPSHOT_AUTO_REBUILD', 'True').lower() in ('true', '1', 't')
+    
+    # Cart storage: sql (cart_item table), memory (single process only) or redis
+    CART_STORE = os.getenv('CART_STORE', 'sql')
+    CART_TTL = int(os.getenv('CART_TTL', str(7 * 24 * 3600)))  # Idle carts expire after 7 days
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    CART_REDIS_PREFIX = os.getenv('CART_REDIS_PREFIX', 'cart:')
+    
+    # Units of stock-tracked products stay reserved for a cart this many seconds
+    # after its last change; instance/scripts/sweep_reservations.py returns them
+    STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', str(15 * 60)))
+    
+    # Request metrics served at /metrics; with METRICS_DIR set, every worker
+    # process writes its values there and /metrics reports the sum
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    METRICS_DIR = os.getenv('METRICS_DIR', '')
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Bearer token of the scraper; /metrics is refused without one
+    
+    # SQL profiler: slow-query log and N+1 detection (fails tests in testing mode)
+    SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER_ENABLED', 'False').lower() in ('true', '1', 't')
+    SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', '100'))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', '10'))  # Same SELECT per request
+    
+    # Sampling request profiler; profiles a fraction of requests, or any request
+    # sent with a signed X-Profile-Request token
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False').lower() in ('true', '1', 't')
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0.0'))
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+    PROFILER_FORMAT = os.getenv('PROFILER_FORMAT', 'speedscope')  # speedscope or collapsed
+    PROFILER_DIR = os.getenv('PROFILER_DIR', str(LOGS_DIR / 'profiles'))
+    PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', '100'))  # Most recent profiles kept
+    PROFILER_TOKEN_MAX_AGE = int(os.getenv('PROFILER_TOKEN_MAX_AGE', '3600'))  # Seconds
+    
     # Create upload folder if it doesn't exist
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     
@@ -0,0 +1,23 @@
+"""Gunicorn settings, used with ``gunicorn -c gunicorn.conf.py app:app``."""
+import os
+import shutil
+from pathlib import Path
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '2'))
+
+
+def on_starting(server):
+    # Metric files of a previous run would be summed into the new totals
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+
+
+def child_exit(server, worker):
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        from metrics import mark_process_dead
+        mark_process_dead(metrics_dir, worker.pid)
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
+
+from assets import AssetError, build_assets, fetch_vendor
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bundle, minify and hash the static scripts.')
+    parser.add_argument('--fetch-vendor', action='store_true',
+                        help='download the pinned Vue, axios and Bootstrap scripts first (needs network access)')
+    args = parser.parse_args(argv)
+
+    if args.fetch_vendor:
+        # Offline, the app still starts: the scripts fetched before, if any,
+        # are bundled, otherwise pages keep loading them from their CDNs
+        try:
+            fetch_vendor()
+        except OSError as e:
+            print(f"Could not fetch the vendor scripts: {e}", file=sys.stderr)
+    try:
+        manifest = build_assets()
+    except AssetError as e:
+        print(f"Error building assets: {e}", file=sys.stderr)
+        return 1
+    for name, path in sorted(manifest.items()):
+        print(f"{name} -> static/{path}")
+    if 'vendor.js' not in manifest:
+        print("vendor.js not built: run with --fetch-vendor to bundle Vue, axios and Bootstrap.", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
+
+from app import create_app
+from models.ecommerce.snapshot import catalog_snapshot
+
+def build_snapshot():
+    """Build the shared catalog snapshot from the product table."""
+    app = create_app()
+    
+    with app.app_context():
+        print(f"Building catalog snapshot {catalog_snapshot.path}...")
+        version = catalog_snapshot.rebuild()
+        if version is None:
+            print("Another process is building the snapshot.")
+            return False
+        print(f"Snapshot is at catalog version {version} ({len(catalog_snapshot.current() or [])} products).")
+        return True
+
+if __name__ == '__main__':
+    sys.exit(0 if build_snapshot() else 1)
@@ -7,7 +7,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from app import create_app
+from app import create_app, db
+from models.ecommerce.models import Product
+from models.ecommerce.facets import category_facets
 
 def check_database():
     """Check the database status and contents."""
@@ -49,10 +51,10 @@ def check_database():
                 
                 # Show some sample categories
                 if product_count > 0:
-                    categories = db.session.query(Product.category).distinct().all()
                     print("\nCategories in database:")
-                    for cat in categories:  # Show all categories
-                        print(f"- {cat[0] if cat[0] else '(empty)'}")
+                    for facet in category_facets():  # Show all categories
+                        print(f"- {facet['category']} ({facet['count']} products, "
+                              f"${facet['price_min']:.2f} - ${facet['price_max']:.2f})")
                     
                     # Show sample products
                     print("\nSample products:")
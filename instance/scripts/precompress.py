@@ -0,0 +1,30 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add the project root directory to the Python path
+ROOT_DIR = Path(__file__).parent.parent.parent.resolve()
+sys.path.insert(0, str(ROOT_DIR))
+
+from compression import brotli, precompress_directory
+
+STATIC_DIRS = (ROOT_DIR / 'static', ROOT_DIR / 'models' / 'ecommerce' / 'static')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write .gz and .br siblings of the static text assets.')
+    parser.add_argument('directories', nargs='*', default=STATIC_DIRS, help='default: the static folders')
+    parser.add_argument('--min-size', type=int, default=256, help='skip smaller files (default: 256 bytes)')
+    parser.add_argument('--force', action='store_true', help='rewrite siblings that are up to date')
+    args = parser.parse_args(argv)
+
+    if brotli is None:
+        print("brotli is not installed: writing .gz siblings only.", file=sys.stderr)
+    for directory in args.directories:
+        if not Path(directory).is_dir():
+            continue
+        written = precompress_directory(directory, min_size=args.min_size, force=args.force)
+        print(f"{directory}: {len(written)} files written.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
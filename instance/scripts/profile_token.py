@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
+
+from config import Config
+from request_profiler import PROFILE_HEADER, profile_token
+
+def print_profile_token():
+    """Print a signed token that profiles any request sending it."""
+    token = profile_token(Config.SECRET_KEY)
+    print(f"{PROFILE_HEADER}: {token}")
+    print(f"Valid for {Config.PROFILER_TOKEN_MAX_AGE} seconds; recent profiles are listed at /debug/profiles?token={token}")
+    return token
+
+if __name__ == '__main__':
+    print_profile_token()
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
+
+from app import create_app, db
+from models.ecommerce.models import Product
+from models.ecommerce.search import rebuild_search_index
+
+def rebuild_search():
+    """Rebuild the product full-text search index from the product table."""
+    app = create_app()
+    
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print("Full-text search requires SQLite FTS5; nothing to rebuild.")
+            return False
+        
+        print("Rebuilding product search index...")
+        rebuild_search_index(db.session)
+        print(f"Indexed {Product.query.count()} products.")
+        return True
+
+if __name__ == '__main__':
+    rebuild_search()
@@ -1,45 +1,85 @@
+import argparse
 import sys
+import time
 from pathlib import Path
-import requests
 
 # Add the project root directory to the Python path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
 
-from models.ecommerce.models import db, Product
+from models.ecommerce.seeding import (DEFAULT_CHUNK_SIZE, SeedError, fakestore_products, load_products,
+                                      read_products, synthetic_products)
 
 def seed_database(app):
     """Seed the database with products from FakeStore API."""
     print("Seeding database with products from FakeStore API...")
-    
+
     with app.app_context():
-        # Clear existing data
-        db.session.query(Product).delete()
-        
         try:
-            # Fetch products from FakeStore API
-            response = requests.get('https://fakestoreapi.com/products')
-            response.raise_for_status()  # Raise an exception for bad status codes
-            
-            products = response.json()
-            
-            for product_data in products:
-                product = Product(
-                    id=product_data['id'],
-                    title=product_data['title'],
-                    description=product_data['description'],
-                    price=float(product_data['price']),
-                    image=product_data['image'],
-                    category=product_data.get('category', 'uncategorized'),  # Add category field
-                    rating_rate=float(product_data['rating']['rate']),
-                    rating_count=int(product_data['rating']['count'])
-                )
-                db.session.add(product)
-            
-            db.session.commit()
-            print(f"Successfully added {len(products)} products to the database.")
+            count = load_products(fakestore_products(), replace=True)
+            print(f"Successfully added {count} products to the database.")
             return True
-            
+
         except Exception as e:
-            db.session.rollback()
             print(f"Error seeding database: {str(e)}")
             return False
+
+def _categories(value):
+    """Parse ``name=weight,name=weight`` into a dict."""
+    categories = {}
+    for part in value.split(','):
+        name, _, weight = part.rpartition('=')
+        try:
+            categories[name.strip()] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected name=weight, got '{part}'")
+    return categories
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load products into the database.')
+    sources = parser.add_subparsers(dest='source', required=True)
+
+    synthetic = sources.add_parser('synthetic', help='deterministic generated products (offline)')
+    synthetic.add_argument('--count', type=int, default=1000, help='number of products (default: 1000)')
+    synthetic.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    synthetic.add_argument('--categories', type=_categories,
+                           help='category weights, e.g. "electronics=4,jewelery=1"')
+
+    from_file = sources.add_parser('file', help='a .json array, .jsonl/.ndjson or .csv file (streamed)')
+    from_file.add_argument('path')
+
+    sources.add_parser('fakestore', help='the FakeStore API sample products (needs network access)')
+
+    parser.add_argument('--append', action='store_true', help='keep existing products (default: replace them)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows per transaction')
+    parser.add_argument('--fast', action='store_true', help='relax SQLite durability pragmas during the load')
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help='rebuild the search index and category facets once at the end')
+    args = parser.parse_args(argv)
+
+    if args.source == 'synthetic':
+        rows = synthetic_products(args.count, seed=args.seed, categories=args.categories)
+    elif args.source == 'file':
+        rows = read_products(args.path)
+    else:
+        rows = fakestore_products()
+
+    from app import create_app
+    app = create_app()
+    started = time.perf_counter()
+
+    def progress(count):
+        rate = count / max(time.perf_counter() - started, 1e-9)
+        print(f"\rLoaded {count} products ({rate:,.0f}/s)", end='', file=sys.stderr, flush=True)
+
+    with app.app_context():
+        try:
+            count = load_products(rows, replace=not args.append, chunk_size=args.chunk_size, fast=args.fast,
+                                  defer_indexes=args.defer_indexes, progress=progress)
+        except SeedError as e:
+            print(f"\nError seeding database: {e}", file=sys.stderr)
+            return 1
+    print(f"\nLoaded {count} products in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent.resolve()))
+
+from app import create_app
+from models.ecommerce.inventory import release_expired_reservations
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Return the units of expired stock reservations to stock.')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='run every INTERVAL seconds until interrupted (default: run once)')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    while True:
+        with app.app_context():
+            released = release_expired_reservations()
+        if released or not args.interval:
+            print(f"Released {released} expired reservations.", flush=True)
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)
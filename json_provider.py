@@ -0,0 +1,69 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# JSON_PROVIDER values
+PROVIDERS = ('auto', 'orjson', 'stdlib')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson.
+
+    Response bodies are written as bytes straight from orjson, without a str
+    round trip. Values orjson has no native encoding for, and dates (so they
+    keep Flask's HTTP date format), go through the stdlib provider's
+    ``default``. Calls with stdlib-specific keyword arguments, and integers
+    beyond 64 bits, fall back to the stdlib provider. Keys are not sorted.
+    """
+
+    sort_keys = False
+
+    @property
+    def _option(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self._option | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        try:
+            body = orjson.dumps(obj, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """Install the JSON provider selected by ``JSON_PROVIDER`` on ``app``.
+
+    ``auto`` (the default) uses orjson when it is installed and Flask's stdlib
+    provider otherwise.
+    """
+    choice = app.config.get('JSON_PROVIDER', 'auto').lower()
+    if choice not in PROVIDERS:
+        raise ValueError(f"JSON_PROVIDER must be one of {', '.join(PROVIDERS)}")
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson requires the 'orjson' package")
+    if choice != 'stdlib' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    return app.json
@@ -1,16 +1,215 @@
 import os
 import sys
-from flask import request, jsonify
+import json
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import traceback
+from flask import request, jsonify, g
 from loguru import logger
 from pathlib import Path
-from datetime import datetime
-import sys
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Incoming X-Request-ID values are reused only if they look like an identifier
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_SIZE_UNITS = {'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+_DURATION_UNITS = {
+    'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 7 * 86400
+}
+
+
+def parse_size(value):
+    """Parse a size such as ``'10 MB'`` into bytes; ``None`` if not a size."""
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?b)\s*$', str(value), re.IGNORECASE)
+    if not match:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def parse_duration(value):
+    """Parse a duration such as ``'30 days'`` into seconds; ``None`` if not a duration."""
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*(second|minute|hour|day|week)s?\s*$', str(value), re.IGNORECASE)
+    if not match:
+        return None
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+
+
+def serialize_record(record):
+    """Render a loguru record as one compact JSON line."""
+    data = {
+        'time': record['time'].isoformat(),
+        'level': record['level'].name,
+        'message': record['message'],
+        'logger': record['name'],
+        'function': record['function'],
+        'line': record['line'],
+    }
+    data.update(record['extra'])
+    if record['exception'] is not None:
+        exc_type, exc_value, exc_tb = record['exception']
+        data['exception'] = ''.join(traceback.format_exception(exc_type, exc_value, exc_tb))
+    return json.dumps(data, default=str) + '\n'
+
+
+class RotatingFileWriter:
+    """Append-only log file rotated by size, with age-based retention.
+
+    Several worker processes may share the file. Rotation happens under an
+    exclusive lock on ``<file>.lock``. The file is checked again under the
+    lock: when another process has already rotated it, this one only reopens
+    the new file. Writers that have not noticed a rotation check for it on
+    each flush, so their records go to the rotated file until their queue
+    next drains at most. Sizes are counted in bytes.
+    """
+
+    def __init__(self, path, rotation=None, retention=None, encoding='utf-8'):
+        self.path = Path(path)
+        self.rotation = rotation
+        self.retention = retention
+        self.encoding = encoding
+        self._lock_path = self.path.with_name(self.path.name + '.lock')
+        self._open()
+
+    def write(self, text):
+        data = text.encode(self.encoding)
+        self._file.write(data)
+        self._size += len(data)
+        if self.rotation and self._size >= self.rotation:
+            self._rotate()
+
+    def flush(self):
+        self._file.flush()
+        if self._replaced():
+            self._reopen()
+            return
+        # Other processes append to the file too: the size of the file, not
+        # this writer's own count, decides when to rotate
+        self._size = os.fstat(self._file.fileno()).st_size
+        if self.rotation and self._size >= self.rotation:
+            self._rotate()
+
+    def close(self):
+        self._file.close()
+
+    def _open(self):
+        # Binary append: every write lands at the current end of the file,
+        # whichever process wrote last
+        self._file = open(self.path, 'ab')
+        self._size = os.fstat(self._file.fileno()).st_size
+
+    def _reopen(self):
+        self._file.close()
+        self._open()
+
+    def _replaced(self):
+        # True when the path no longer names the open file: another process rotated it
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        opened = os.fstat(self._file.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def _rotated_path(self):
+        stem = f"{self.path.stem}.{time.strftime('%Y-%m-%d_%H-%M-%S')}_{os.getpid()}"
+        target, index = self.path.with_name(stem + self.path.suffix), 1
+        while target.exists():
+            # Rotated twice within a second
+            target, index = self.path.with_name(f'{stem}-{index}{self.path.suffix}'), index + 1
+        return target
+
+    def _rotate(self):
+        self._file.flush()
+        with open(self._lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if self._replaced():
+                self._reopen()
+                return
+            self._size = os.fstat(self._file.fileno()).st_size
+            if self._size < self.rotation:
+                return
+            self._file.close()
+            self.path.rename(self._rotated_path())
+            self._open()
+            # flock is released when the lock file is closed
+        if self.retention:
+            cutoff = time.time() - self.retention
+            for old in self.path.parent.glob(f'{self.path.stem}.*{self.path.suffix}'):
+                try:
+                    if old.stat().st_mtime < cutoff:
+                        old.unlink()
+                except FileNotFoundError:
+                    # Removed by another process meanwhile
+                    pass
+
+
+class BoundedQueueSink:
+    """Loguru sink that hands records to a writer thread through a bounded queue.
+
+    The request thread only pays for a ``put_nowait``. When the queue is full
+    the record is dropped (and counted) instead of blocking the request; JSON
+    serialization happens on the writer thread.
+    """
+
+    def __init__(self, writer, maxsize=10000, serialize=False):
+        self.writer = writer
+        self.serialize = serialize
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        try:
+            self._queue.put_nowait(message.record if self.serialize else str(message))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self.writer.write(serialize_record(item) if self.serialize else item)
+            if self._queue.empty():
+                if self.dropped:
+                    dropped, self.dropped = self.dropped, 0
+                    self.writer.write(json.dumps({'level': 'WARNING', 'message': f'Dropped {dropped} log records'}) + '\n')
+                self.writer.flush()
+        self.writer.flush()
+
+
+def _new_request_id():
+    incoming = request.headers.get('X-Request-ID')
+    if incoming and _REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return secrets.token_hex(8)
+
 
 def configure_logging(app):
-    """Configure Loguru for the Flask application."""
+    """Configure Loguru for the Flask application.
+
+    ``LOG_FORMAT=text`` keeps the colourised console and plain file output.
+    ``LOG_FORMAT=json`` is the production mode: one JSON object per record,
+    written to stderr and the log file by background threads through bounded
+    queues (``LOG_QUEUE_SIZE``) that drop rather than block when full.
+    """
     # Clear default logger
     logger.remove()
-    
+
     # Format for log messages
     log_format = (
         "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
@@ -19,100 +218,139 @@ def configure_logging(app):
         "<magenta>Request ID: {extra[request_id]}</magenta> | "
         "<level>{message}</level>"
     )
-    
+
     # Configure logger with request ID
     logger.configure(extra={"request_id": "N/A"})
-    
-    # Console logging
-    logger.add(
-        sys.stderr,
-        level=app.config['LOG_LEVEL'],
-        format=log_format,
-        colorize=True,
-        backtrace=True,
-        diagnose=app.config.get('FLASK_ENV') == 'development'
-    )
-    
-    # File logging (rotating)
+
     log_file = Path(app.config['LOG_FILE'])
     log_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    logger.add(
-        str(log_file),
-        rotation=app.config.get('LOG_ROTATION', '10 MB'),
-        retention=app.config.get('LOG_RETENTION', '30 days'),
-        level=app.config['LOG_LEVEL'],
-        format=log_format,
-        backtrace=True,
-        diagnose=app.config.get('FLASK_ENV') == 'development',
-        enqueue=True,  # Makes logging thread-safe
-        encoding='utf-8'
-    )
-    
+
+    json_mode = app.config.get('LOG_FORMAT', 'text') == 'json'
+    # The text mode keeps its "Request:" line at INFO; in JSON mode the access
+    # log line carries method and path, so it is only a debug aid
+    request_level = 'DEBUG' if json_mode else 'INFO'
+
+    if json_mode:
+        queue_size = app.config.get('LOG_QUEUE_SIZE', 10000)
+        logger.add(
+            BoundedQueueSink(sys.stderr, maxsize=queue_size, serialize=True),
+            level=app.config['LOG_LEVEL'],
+            format='{message}',
+            backtrace=False,
+            diagnose=False
+        )
+        rotation = app.config.get('LOG_ROTATION', '10 MB')
+        retention = app.config.get('LOG_RETENTION', '30 days')
+        logger.add(
+            BoundedQueueSink(
+                RotatingFileWriter(log_file, rotation=parse_size(rotation), retention=parse_duration(retention)),
+                maxsize=queue_size,
+                serialize=True
+            ),
+            level=app.config['LOG_LEVEL'],
+            format='{message}',
+            backtrace=False,
+            diagnose=False
+        )
+    else:
+        # Console logging
+        logger.add(
+            sys.stderr,
+            level=app.config['LOG_LEVEL'],
+            format=log_format,
+            colorize=True,
+            backtrace=True,
+            diagnose=app.config.get('FLASK_ENV') == 'development'
+        )
+
+        # File logging (rotating)
+        logger.add(
+            str(log_file),
+            rotation=app.config.get('LOG_ROTATION', '10 MB'),
+            retention=app.config.get('LOG_RETENTION', '30 days'),
+            level=app.config['LOG_LEVEL'],
+            format=log_format,
+            backtrace=True,
+            diagnose=app.config.get('FLASK_ENV') == 'development',
+            enqueue=True,  # Makes logging thread-safe
+            encoding='utf-8'
+        )
+
     # Add request context processor for request ID
     @app.before_request
     def before_request():
-        from flask import g
-        import uuid
-        g.request_id = str(uuid.uuid4())
-        logger.bind(request_id=g.request_id)
-        
-        # Log request details
-        logger.info(f"Request: {request.method} {request.path}")
-        
-        # Log request data for non-GET requests
-        if request.method in ['POST', 'PUT', 'PATCH']:
+        g.request_id = _new_request_id()
+        g.request_started = time.perf_counter()
+        # Every record logged while handling the request carries its ID
+        g.log_context = logger.contextualize(request_id=g.request_id)
+        g.log_context.__enter__()
+
+        # Messages are formatted lazily: nothing is built below the enabled level
+        logger.log(request_level, "Request: {} {}", request.method, request.path)
+
+        # Request bodies may hold personal data and are costly to render
+        if app.config.get('LOG_REQUEST_BODIES') and request.method in ['POST', 'PUT', 'PATCH']:
             try:
                 if request.is_json:
-                    logger.debug(f"Request JSON: {request.get_json(silent=True) or {}}")
+                    logger.debug("Request JSON: {}", request.get_json(silent=True) or {})
                 elif request.form:
-                    logger.debug(f"Request Form: {dict(request.form)}")
+                    logger.debug("Request Form: {}", request.form.to_dict())
                 elif request.data:
-                    logger.debug(f"Request Data: {request.data.decode('utf-8')}")
+                    logger.debug("Request Data: {}", request.data.decode('utf-8', 'replace'))
             except Exception as e:
-                logger.warning(f"Failed to log request data: {str(e)}")
-    
+                logger.warning("Failed to log request data: {}", e)
+
     @app.after_request
     def after_request(response):
-        # Log response
-        logger.info(
-            f"Response: {response.status_code} {request.method} {request.path} "
-            f"({request.content_length or 0}b)"
-        )
-        
+        # Log response; successful requests may be sampled, errors never are
+        sample_rate = app.config.get('LOG_SAMPLE_RATE', 1.0)
+        if response.status_code >= 400 or sample_rate >= 1.0 or random.random() < sample_rate:
+            started = getattr(g, 'request_started', None)
+            duration_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+            logger.bind(
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+                duration_ms=round(duration_ms, 3),
+                size=response.content_length
+            ).info(
+                "Response: {} {} {} ({:.1f}ms)",
+                response.status_code, request.method, request.path, duration_ms
+            )
+
         # Add request ID to response headers
-        from flask import g
         response.headers['X-Request-ID'] = getattr(g, 'request_id', 'N/A')
-        
+
         return response
-    
+
+    @app.teardown_request
+    def teardown_request(exc):
+        log_context = g.pop('log_context', None)
+        if log_context is not None:
+            log_context.__exit__(None, None, None)
+
     # Log unhandled exceptions
     @app.errorhandler(Exception)
     def handle_exception(e):
         logger.opt(exception=e).error(
-            f"Unhandled Exception: {str(e)}\n"
-            f"Request: {request.method} {request.path}\n"
-            f"Headers: {dict(request.headers)}\n"
-            f"Args: {dict(request.args)}\n"
-            f"Form: {dict(request.form) if request.form else 'N/A'}"
+            "Unhandled Exception: {}\nRequest: {} {}\nArgs: {}",
+            e, request.method, request.path, request.args.to_dict()
         )
-        
+
         if app.debug:
             # In debug mode, return detailed error information
             response = jsonify({
                 'error': str(e),
                 'type': e.__class__.__name__,
-                'request_id': getattr(request, 'request_id', 'N/A')
+                'request_id': getattr(g, 'request_id', 'N/A')
             })
             response.status_code = 500
             return response
-        
+
         # In production, return a generic error message
         return jsonify({
             'error': 'An internal server error occurred',
-            'request_id': getattr(request, 'request_id', 'N/A')
+            'request_id': getattr(g, 'request_id', 'N/A')
         }), 500
-    
-    return logger
-    
+
     return logger
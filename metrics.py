@@ -0,0 +1,344 @@
+import functools
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency buckets in seconds; the last one is +Inf
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# name -> (type, help); gauges are summed over live worker processes only
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by route and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency, by route.'),
+    'http_requests_in_progress': ('gauge', 'Requests currently being handled, by route.'),
+    'db_statements_total': ('counter', 'SQL statements executed while handling requests, by route.'),
+    'db_statement_duration_seconds_total': ('counter', 'Time spent in SQL statements while handling requests, by route.'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_HEADER = struct.Struct('<I4x')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+class MmapValues:
+    """Float values keyed by string, kept in a memory-mapped file.
+
+    Each worker process writes its own file, so updates need no cross-process
+    locking; readers aggregate every file in the directory. An entry is the
+    key length, the key (padded to 8 bytes) and a double. The header holds
+    the number of bytes in use and is written after the entry, so readers
+    never see a partial entry.
+    """
+
+    def __init__(self, path, initial_size=64 * 1024):
+        self.path = Path(path)
+        self._file = open(self.path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(initial_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._offsets = {key: offset for key, _, offset in self._entries(self._map, self._used)}
+
+    def inc(self, key, amount):
+        offset = self._offset(key)
+        _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def set(self, key, value):
+        _VALUE.pack_into(self._map, self._offset(key), value)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _offset(self, key):
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._offsets[key] = self._append(key)
+        return offset
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded = _KEY_LENGTH.size + len(encoded)
+        padded += -padded % 8
+        end = self._used + padded + _VALUE.size
+        if end > len(self._map):
+            self._grow(end)
+
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        offset = self._used + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used = end
+        _HEADER.pack_into(self._map, 0, self._used)
+        return offset
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    @staticmethod
+    def _entries(data, used):
+        position = _HEADER.size
+        while position < used:
+            length = _KEY_LENGTH.unpack_from(data, position)[0]
+            start = position + _KEY_LENGTH.size
+            key = bytes(data[start:start + length]).decode('utf-8')
+            padded = _KEY_LENGTH.size + length
+            offset = position + padded + (-padded % 8)
+            yield key, _VALUE.unpack_from(data, offset)[0], offset
+            position = offset + _VALUE.size
+
+    @classmethod
+    def read(cls, path):
+        """Return ``{key: value}`` from a file written by any process."""
+        data = Path(path).read_bytes()
+        if len(data) < _HEADER.size:
+            return {}
+        used = _HEADER.unpack_from(data, 0)[0]
+        return {key: value for key, value, _ in cls._entries(data, used)}
+
+
+class MemoryValues(dict):
+    """In-process stand-in for ``MmapValues`` when no METRICS_DIR is configured."""
+
+    def inc(self, key, amount):
+        self[key] = self.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self[key] = value
+
+    def close(self):
+        pass
+
+
+def mark_process_dead(directory, pid):
+    """Drop the gauges of a worker that exited (called from gunicorn's ``child_exit``).
+
+    Its counters and histograms are kept, so totals do not go backwards.
+    """
+    Path(directory, f'gauge_{pid}.db').unlink(missing_ok=True)
+
+
+@functools.lru_cache(maxsize=4096)
+def _series_key(name, labels):
+    # Labels are tuples of (name, value) pairs, so keys can be memoized
+    return json.dumps([name, labels], separators=(',', ':'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_le(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class Metrics:
+    """Per-route request metrics, exposed in the Prometheus text format.
+
+    With ``METRICS_DIR`` set, every process writes its values to its own
+    memory-mapped files there and ``/metrics`` sums them, so any gunicorn
+    worker reports the totals of all workers. Without it, values are kept in
+    the current process. ``/metrics`` is only served to scrapers sending
+    ``METRICS_TOKEN`` as a bearer token; without a token, to nobody.
+    """
+
+    def __init__(self, directory=None):
+        self.enabled = False
+        self.token = None
+        self.directory = Path(directory) if directory else None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stores = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.token = app.config.get('METRICS_TOKEN') or None
+        directory = app.config.get('METRICS_DIR')
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._reset()
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def authorized(self, authorization):
+        """Whether an ``Authorization`` header carries the configured bearer token."""
+        scheme, _, token = (authorization or '').partition(' ')
+        if self.token is None or scheme.lower() != 'bearer':
+            return False
+        return hmac.compare_digest(token.strip().encode(), self.token.encode())
+
+    def inc(self, name, labels, amount=1.0):
+        with self._lock:
+            self._store('counter').inc(_series_key(name, labels), amount)
+
+    def add_gauge(self, name, labels, amount):
+        with self._lock:
+            self._store('gauge').inc(_series_key(name, labels), amount)
+
+    def observe(self, name, labels, value, buckets=REQUEST_BUCKETS):
+        for bound in buckets:
+            if value <= bound:
+                break
+        with self._lock:
+            store = self._store('counter')
+            store.inc(_series_key(f'{name}_bucket', labels + (('le', _format_le(bound)),)), 1.0)
+            store.inc(_series_key(f'{name}_sum', labels), value)
+
+    def collect(self):
+        """Return ``{(name, labels): value}`` summed over every process."""
+        totals = defaultdict(float)
+        if self.directory is not None:
+            for path in self.directory.glob('*.db'):
+                try:
+                    values = MmapValues.read(path)
+                except FileNotFoundError:
+                    # The worker exited while we were listing the directory
+                    continue
+                for key, value in values.items():
+                    totals[key] += value
+        else:
+            with self._lock:
+                for store in self._stores.values():
+                    for key, value in store.items():
+                        totals[key] += value
+
+        series = {}
+        for key, value in totals.items():
+            name, labels = json.loads(key)
+            series[name, tuple(tuple(label) for label in labels)] = value
+        return series
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        series = self.collect()
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                lines.extend(self._render_histogram(name, series))
+                continue
+            for (series_name, labels), value in sorted(series.items()):
+                if series_name == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+    @staticmethod
+    def _render_histogram(name, series):
+        buckets = defaultdict(dict)
+        sums = {}
+        for (series_name, labels), value in series.items():
+            if series_name == f'{name}_bucket':
+                buckets[labels[:-1]][labels[-1][1]] = value
+            elif series_name == f'{name}_sum':
+                sums[labels] = value
+
+        for labels in sorted(buckets):
+            cumulative = 0.0
+            for bound in REQUEST_BUCKETS:
+                cumulative += buckets[labels].get(_format_le(bound), 0.0)
+                le_labels = labels + (('le', _format_le(bound)),)
+                yield f'{name}_bucket{_format_labels(le_labels)} {cumulative!r}'
+            yield f'{name}_sum{_format_labels(labels)} {sums.get(labels, 0.0)!r}'
+            yield f'{name}_count{_format_labels(labels)} {cumulative!r}'
+
+    def _store(self, kind):
+        # A forked worker must not write into its parent's files
+        if self._pid != os.getpid():
+            self._reset()
+        return self._stores[kind]
+
+    def _reset(self):
+        for store in self._stores.values():
+            store.close()
+        self._pid = os.getpid()
+        if self.directory is None:
+            self._stores = {'counter': MemoryValues(), 'gauge': MemoryValues()}
+        else:
+            self._stores = {
+                kind: MmapValues(self.directory / f'{kind}_{self._pid}.db')
+                for kind in ('counter', 'gauge')
+            }
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql = [0, 0.0]
+        g.metrics_route = (('method', request.method), ('endpoint', _route()))
+        self.add_gauge('http_requests_in_progress', g.metrics_route, 1)
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        route = g.metrics_route
+        statements, sql_seconds = g.metrics_sql
+        self.observe('http_request_duration_seconds', route, time.perf_counter() - started)
+        self.inc('http_requests_total', route + (('status', str(response.status_code)),))
+        if statements:
+            self.inc('db_statements_total', route[1:], statements)
+            self.inc('db_statement_duration_seconds_total', route[1:], sql_seconds)
+        return response
+
+    def _teardown_request(self, exc):
+        route = g.pop('metrics_route', None)
+        if route is not None:
+            self.add_gauge('http_requests_in_progress', route, -1)
+
+
+def _route():
+    # The URL rule, not the path, so label cardinality stays bounded
+    rule = request.url_rule
+    return rule.rule if rule is not None else '<unmatched>'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None or not has_request_context():
+        return
+    stats = g.get('metrics_sql')
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+metrics = Metrics()
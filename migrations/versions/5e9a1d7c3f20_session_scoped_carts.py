@@ -0,0 +1,35 @@
+"""session scoped carts
+
+Revision ID: 5e9a1d7c3f20
+Revises: b7d05e3c9a41
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9a1d7c3f20'
+down_revision = 'b7d05e3c9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lines of the former global cart keep an empty cart id
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cart_id', sa.String(length=64), nullable=False, server_default=''))
+        batch_op.drop_constraint('uq_cart_item_product', type_='unique')
+        batch_op.create_unique_constraint('uq_cart_item_cart_product', ['cart_id', 'product_id'])
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.alter_column('cart_id', server_default=None)
+
+
+def downgrade():
+    op.execute("DELETE FROM cart_item WHERE cart_id != ''")
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_item_cart_product', type_='unique')
+        batch_op.create_unique_constraint('uq_cart_item_product', ['product_id'])
+        batch_op.drop_column('cart_id')
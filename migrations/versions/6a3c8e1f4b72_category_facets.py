@@ -0,0 +1,43 @@
+"""category facets
+
+Revision ID: 6a3c8e1f4b72
+Revises: d2f8b4a6c915
+Create Date: 2026-10-18 09:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models.ecommerce.facets import DROP_DDL, FACET_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '6a3c8e1f4b72'
+down_revision = 'd2f8b4a6c915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('category_facet',
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('product_count', sa.Integer(), nullable=False),
+    sa.Column('price_min', sa.Float(), nullable=True),
+    sa.Column('price_max', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('category')
+    )
+    op.execute(
+        "INSERT INTO category_facet (category, product_count, price_min, price_max) "
+        "SELECT category, COUNT(*), MIN(price), MAX(price) FROM product "
+        "WHERE category IS NOT NULL GROUP BY category"
+    )
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in FACET_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in DROP_DDL:
+            op.execute(statement)
+    op.drop_table('category_facet')
@@ -0,0 +1,29 @@
+"""product pagination indexes
+
+Revision ID: 8c4e2f6a1b93
+Revises: 3f1c9a2b7d10
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2f6a1b93'
+down_revision = '3f1c9a2b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_category'), ['category'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_price'), ['price'], unique=False)
+        batch_op.create_index('ix_product_category_price', ['category', 'price'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_category_price')
+        batch_op.drop_index(batch_op.f('ix_product_price'))
+        batch_op.drop_index(batch_op.f('ix_product_category'))
@@ -0,0 +1,39 @@
+"""unique cart line per product
+
+Revision ID: b7d05e3c9a41
+Revises: 8c4e2f6a1b93
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d05e3c9a41'
+down_revision = '8c4e2f6a1b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Merge duplicate lines into the oldest one before enforcing uniqueness
+    op.execute(
+        """
+        UPDATE cart_item SET quantity = (
+            SELECT SUM(COALESCE(other.quantity, 1)) FROM cart_item AS other
+            WHERE other.product_id = cart_item.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart_item GROUP BY product_id HAVING COUNT(*) > 1)
+        """
+    )
+    op.execute(
+        "DELETE FROM cart_item WHERE id NOT IN (SELECT MIN(id) FROM cart_item GROUP BY product_id)"
+    )
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cart_item_product', ['product_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_item_product', type_='unique')
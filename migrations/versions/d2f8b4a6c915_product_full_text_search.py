@@ -0,0 +1,33 @@
+"""product full text search
+
+Revision ID: d2f8b4a6c915
+Revises: 5e9a1d7c3f20
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from alembic import op
+
+from models.ecommerce.search import DROP_DDL, SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f8b4a6c915'
+down_revision = '5e9a1d7c3f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in SEARCH_DDL:
+        op.execute(statement)
+    # Index the products that already exist
+    op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in DROP_DDL:
+        op.execute(statement)
@@ -0,0 +1,46 @@
+"""stock reservations
+
+Revision ID: f7a2c5e9b184
+Revises: e4b19c7a2d53
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a2c5e9b184'
+down_revision = 'e4b19c7a2d53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE: a batch copy of product would drop its search and facet triggers
+    op.add_column('product', sa.Column('stock', sa.Integer(), nullable=True))
+    op.create_index('ix_product_stock_tracked', 'product', ['id'], unique=False,
+                    sqlite_where=sa.text('stock IS NOT NULL'),
+                    postgresql_where=sa.text('stock IS NOT NULL'))
+
+    op.create_table('stock_reservation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cart_id', sa.String(length=64), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cart_id', 'product_id', name='uq_stock_reservation_cart_product')
+    )
+    with op.batch_alter_table('stock_reservation', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_reservation_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_reservation', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_reservation_expires_at'))
+
+    op.drop_table('stock_reservation')
+    op.drop_index('ix_product_stock_tracked', table_name='product')
+    op.drop_column('product', 'stock')  # Needs SQLite 3.35
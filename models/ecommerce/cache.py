@@ -0,0 +1,248 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.ecommerce.models import Product
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Session.info flag set when a flush or bulk statement touched the catalog
+_CATALOG_DIRTY = 'catalog_dirty'
+
+# Execution option that lets a bulk Product statement opt out of invalidation
+SKIP_CATALOG_BUMP = 'skip_catalog_bump'
+
+
+class CatalogVersion:
+    """Monotonic catalog version shared between processes through a small file.
+
+    Reading the version costs one ``stat`` call; the file is only re-read when
+    its mtime changes. Without a file the version is local to the process.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._value = 0
+        self._mtime = None
+
+    def current(self):
+        if self.path is None:
+            return self._value
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self._value
+        if mtime != self._mtime:
+            with self._lock:
+                self._value = self._read()
+                self._mtime = mtime
+        return self._value
+
+    def bump(self):
+        """Move the version forward and return the new value."""
+        with self._lock:
+            if self.path is None:
+                self._value += 1
+                return self._value
+
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a+') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                value = self._parse(f.read()) + 1
+                f.seek(0)
+                f.truncate()
+                f.write(str(value))
+                f.flush()
+                # flock is released when the file is closed
+            self._value = value
+            self._mtime = None
+            return value
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return self._parse(f.read())
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _parse(text):
+        try:
+            return int(text.strip() or 0)
+        except ValueError:
+            return 0
+
+
+class CacheEntry:
+    __slots__ = ('version', 'body', 'etag')
+
+    def __init__(self, version, body, etag):
+        self.version = version
+        self.body = body
+        self.etag = etag
+
+
+class CatalogCache:
+    """In-process cache of serialized catalog responses.
+
+    Entries are keyed by request key and tagged with the catalog version they
+    were built from; any Product insert, update or delete moves the version
+    forward, which drops every entry at once. Hits never touch the database.
+    """
+
+    POLICIES = ('lru', 'fifo')
+
+    def __init__(self, app=None):
+        self.version = CatalogVersion()
+        self.enabled = True
+        self.max_bytes = 0
+        self.policy = 'lru'
+        self._entries = OrderedDict()
+        self._size = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CATALOG_CACHE_ENABLED', True)
+        self.max_bytes = app.config.get('CATALOG_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        self.policy = app.config.get('CATALOG_CACHE_POLICY', 'lru').lower()
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"CATALOG_CACHE_POLICY must be one of {', '.join(self.POLICIES)}")
+        self.version = CatalogVersion(app.config.get('CATALOG_VERSION_FILE'))
+        self.clear()
+        app.extensions['catalog_cache'] = self
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, key):
+        version = self.version.current()
+        with self._lock:
+            if version != self._version:
+                # The catalog changed: everything cached so far is stale
+                self._entries.clear()
+                self._size = 0
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.policy == 'lru':
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, version, body):
+        entry = CacheEntry(version, body, make_etag(body))
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if version != self._version:
+                # Built from a catalog that has changed since; serve but don't keep
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.body)
+            self._entries[key] = entry
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+        return entry
+
+    def response(self, key, build):
+        """Return a JSON response for ``key``, calling ``build()`` on a miss.
+
+        ``build`` returns the JSON-serializable payload. The response carries a
+        strong ETag and ``If-None-Match`` revalidations are answered with 304.
+        """
+        entry = self.get(key) if self.enabled else None
+        if entry is None:
+            version = self.version.current()
+            body = current_app.json.dumps(build()).encode('utf-8')
+            entry = self.set(key, version, body) if self.enabled else CacheEntry(version, body, make_etag(body))
+        return encoded_response(entry.body, entry.etag)
+
+
+def make_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def encoded_response(body, etag=None, mimetype='application/json'):
+    """Return an already encoded ``body`` (JSON by default) with a strong ETag.
+
+    ``If-None-Match`` revalidations are answered with 304. They use weak
+    comparison, so the weak ETag of a compressed variant matches as well.
+    """
+    etag = etag or make_etag(body)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def mark_catalog_changed(session):
+    """Bump the catalog version when ``session`` commits.
+
+    For product writes the session cannot see, such as statements sent with
+    ``exec_driver_sql``.
+    """
+    session.info[_CATALOG_DIRTY] = True
+
+
+def request_cache_key(name):
+    """Cache key for the current request: endpoint name plus its query string."""
+    return (name, tuple(sorted(request.args.items(multi=True))))
+
+
+catalog_cache = CatalogCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_product_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product) and (obj not in session.dirty or session.is_modified(obj)):
+            session.info[_CATALOG_DIRTY] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_product_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get(SKIP_CATALOG_BUMP):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Product:
+        orm_execute_state.session.info[_CATALOG_DIRTY] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_catalog_version(session):
+    if session.info.pop(_CATALOG_DIRTY, False):
+        catalog_cache.version.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_changes(session):
+    session.info.pop(_CATALOG_DIRTY, None)
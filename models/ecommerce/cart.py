@@ -0,0 +1,183 @@
+import uuid
+
+from flask import current_app, g, session
+
+from models.ecommerce.cart_store import SqlCartStore, apply_operations, create_cart_store
+from models.ecommerce.inventory import adjust_reservations, apply_reservations, held_quantities, tracked_products
+from models.ecommerce.models import db
+
+# Upper bound on the number of operations accepted by one batch request
+MAX_BATCH_OPERATIONS = 100
+
+
+class CartError(ValueError):
+    """Raised when a cart operation is malformed."""
+
+
+def init_cart_store(app):
+    """Create the configured cart store and attach it to ``app``."""
+    app.extensions['cart_store'] = create_cart_store(app)
+
+
+def get_cart_store():
+    return current_app.extensions['cart_store']
+
+
+def current_cart_id(create=False):
+    """Return the cart id of the visitor's session.
+
+    A new id is only issued when ``create`` is true, so read-only visits do
+    not set a session cookie.
+    """
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = session['cart_id'] = uuid.uuid4().hex
+    return cart_id
+
+
+def parse_cart_operation(product_id, action, quantity=None):
+    """Validate one cart action and return it as ``(product_id, action, quantity)``."""
+    if product_id is None:
+        raise CartError('product_id is required')
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        raise CartError('product_id must be an integer')
+
+    if action == 'add':
+        quantity = 1 if quantity is None else _as_int(quantity, action)
+        if quantity < 1:
+            raise CartError("'add' quantity must be at least 1")
+    elif action == 'set':
+        quantity = _as_int(quantity, action)
+    elif action != 'remove':
+        raise CartError(f"Unknown cart action '{action}'")
+
+    return product_id, action, quantity
+
+
+def parse_cart_batch(operations):
+    """Validate an ordered list of ``{product_id, action, quantity}`` operations."""
+    if not isinstance(operations, list) or not operations:
+        raise CartError('operations must be a non-empty list')
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise CartError(f'A batch may contain at most {MAX_BATCH_OPERATIONS} operations')
+
+    parsed = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            raise CartError(f'Operation {index} must be an object')
+        try:
+            parsed.append(parse_cart_operation(op.get('product_id'), op.get('action', 'add'), op.get('quantity')))
+        except CartError as e:
+            raise CartError(f'Operation {index}: {e}')
+    return parsed
+
+
+def apply_cart_action(cart_id, product_id, action, quantity=None):
+    """Apply one cart action and return the parsed operation."""
+    operation = parse_cart_operation(product_id, action, quantity)
+    _apply_with_stock(cart_id, [operation])
+    return operation
+
+
+def apply_cart_batch(cart_id, operations):
+    """Validate a whole batch, then apply it atomically; returns the parsed operations."""
+    parsed = parse_cart_batch(operations)
+    _apply_with_stock(cart_id, parsed)
+    return parsed
+
+
+def stock_query_budget(statements):
+    """Query budget of a cart write: ``statements``, plus two for each
+    stock-tracked product whose reservation the request moved."""
+    return lambda: statements + 2 * g.get('stock_moves', 0)
+
+
+def cart_lines(cart_id, product_ids=None):
+    """Return the serialized lines of a cart, optionally only for ``product_ids``."""
+    if cart_id is None:
+        return []
+    return get_cart_store().lines(cart_id, product_ids)
+
+
+def cart_summary(cart_id):
+    """Return the item count and subtotal of a cart."""
+    if cart_id is None:
+        return {'count': 0, 'subtotal': 0.0}
+    return get_cart_store().summary(cart_id)
+
+
+def cart_delta(cart_id, product_ids):
+    """Describe the effect of a write on ``product_ids`` without the full cart.
+
+    Returns the current lines of the touched products, the ids whose line no
+    longer exists and the new cart summary.
+    """
+    product_ids = sorted(set(product_ids))
+    lines = cart_lines(cart_id, product_ids)
+    remaining = {line['product_id'] for line in lines}
+    return {
+        'lines': lines,
+        'removed': [pid for pid in product_ids if pid not in remaining],
+        'summary': cart_summary(cart_id)
+    }
+
+
+def _apply_with_stock(cart_id, operations):
+    """Reserve the units of stock-tracked products, then apply the operations.
+
+    Raises ``InventoryError`` when units run short, leaving the cart as it
+    was. With the SQL store the reservations and the cart lines are written
+    in one transaction. Other stores keep carts outside the database: the
+    reservations are committed first and given back if the cart write fails.
+    A process dying between the two holds units that no cart line accounts
+    for. That is at most the units of this request, and only until the
+    reservation expires, ``STOCK_RESERVATION_TTL`` seconds later.
+    """
+    store = get_cart_store()
+    deltas = _stock_deltas(cart_id, operations)
+    g.stock_moves = len(deltas)
+    if isinstance(store, SqlCartStore):
+        try:
+            apply_reservations(cart_id, deltas)
+            store.write(cart_id, operations)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return
+
+    if deltas:
+        adjust_reservations(cart_id, deltas)
+    try:
+        store.apply(cart_id, operations)
+    except Exception:
+        if deltas:
+            adjust_reservations(cart_id, {pid: -delta for pid, delta in deltas.items()})
+        raise
+
+
+def _stock_deltas(cart_id, operations):
+    tracked = tracked_products()
+    touched = {pid for pid, _, _ in operations if pid in tracked}
+    if not touched:
+        return {}
+    if all(action == 'add' for pid, action, _ in operations if pid in touched):
+        # The add-to-cart path of a sale: no reads, the units are the deltas
+        deltas = {}
+        for pid, _, quantity in operations:
+            if pid in touched:
+                deltas[pid] = deltas.get(pid, 0) + quantity
+        return deltas
+    # Otherwise the reservation follows the cart line it ends up with
+    quantities = apply_operations(dict(get_cart_store().items(cart_id)), operations)
+    held = held_quantities(cart_id, touched)
+    return {pid: quantities.get(pid, 0) - held.get(pid, 0) for pid in touched}
+
+
+def _as_int(quantity, action):
+    try:
+        return int(quantity)
+    except (TypeError, ValueError):
+        raise CartError(f"'{action}' requires an integer quantity")
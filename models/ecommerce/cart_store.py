@@ -0,0 +1,382 @@
+import threading
+import time
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.ecommerce.models import db, Product, CartItem
+from models.ecommerce.schema import CART_PRODUCT_COLUMNS, product_table, serialize_cart_line
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+# One joined query projecting only the serialized columns, built once:
+# constructing the select costs more than running it
+_cart_items = CartItem.__table__.c
+_CART_LINES = (
+    select(_cart_items.id, _cart_items.quantity, *CART_PRODUCT_COLUMNS)
+    .join_from(CartItem.__table__, product_table, _cart_items.product_id == product_table.c.id)
+    .where(_cart_items.cart_id == bindparam('cart_id'))
+    .order_by(_cart_items.id)
+)
+_CART_LINES_FOR_PRODUCTS = _CART_LINES.where(_cart_items.product_id.in_(bindparam('product_ids', expanding=True)))
+
+
+def apply_operations(quantities, operations):
+    """Apply parsed ``(product_id, action, quantity)`` operations to a dict in place."""
+    for product_id, action, quantity in operations:
+        current = quantities.get(product_id, 0)
+        if action == 'add':
+            quantities[product_id] = current + quantity
+        elif action == 'remove':
+            if current > 1:
+                quantities[product_id] = current - 1
+            else:
+                quantities.pop(product_id, None)
+        elif action == 'set' and current:
+            if quantity > 0:
+                quantities[product_id] = quantity
+            else:
+                quantities.pop(product_id, None)
+    return quantities
+
+
+def _upsert(target):
+    dialect = db.session.get_bind().dialect.name
+    try:
+        return UPSERT_INSERTS[dialect](target)
+    except KeyError:
+        raise NotImplementedError(f'Cart upserts are not supported on {dialect}')
+
+
+class CartStore:
+    """Interface of cart storage backends.
+
+    A cart is identified by an opaque ``cart_id`` and maps product ids to
+    quantities. Operations reach the store already validated, as
+    ``(product_id, action, quantity)`` tuples; ``apply`` must apply a list of
+    them atomically.
+    """
+
+    def apply(self, cart_id, operations):
+        raise NotImplementedError
+
+    def items(self, cart_id):
+        """Return ``{product_id: quantity}`` in the order lines were added."""
+        raise NotImplementedError
+
+    def clear(self, cart_id):
+        raise NotImplementedError
+
+    def lines(self, cart_id, product_ids=None):
+        """Return serialized cart lines, optionally only for ``product_ids``."""
+        quantities = self.items(cart_id)
+        if product_ids is not None:
+            wanted = set(product_ids)
+            quantities = {pid: qty for pid, qty in quantities.items() if pid in wanted}
+        if not quantities:
+            return []
+
+        rows = db.session.execute(select(*CART_PRODUCT_COLUMNS).where(product_table.c.id.in_(quantities)))
+        products = {row.id: row for row in rows}
+        # Lines outside the SQL store have no row id; the product id stands in
+        return [
+            serialize_cart_line(pid, qty, products[pid])
+            for pid, qty in quantities.items() if pid in products
+        ]
+
+    def summary(self, cart_id):
+        """Return ``{count, subtotal}`` for the cart."""
+        quantities = self.items(cart_id)
+        if not quantities:
+            return {'count': 0, 'subtotal': 0.0}
+
+        prices = dict(db.session.execute(
+            select(Product.id, Product.price).where(Product.id.in_(quantities))
+        ).all())
+        return {
+            'count': sum(qty for pid, qty in quantities.items() if pid in prices),
+            'subtotal': round(sum(prices[pid] * qty for pid, qty in quantities.items() if pid in prices), 2)
+        }
+
+    def persist(self, cart_id):
+        """Write the cart through to the ``cart_item`` table (used at checkout)."""
+        quantities = self.items(cart_id)
+        try:
+            db.session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+            if quantities:
+                db.session.execute(insert(CartItem), [
+                    {'cart_id': cart_id, 'product_id': pid, 'quantity': qty}
+                    for pid, qty in quantities.items()
+                ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def checked_out(self, cart_id):
+        """Forget the cart once an order has consumed its persisted lines."""
+        self.clear(cart_id)
+
+
+class SqlCartStore(CartStore):
+    """Carts stored directly in the ``cart_item`` table.
+
+    A single operation is a single atomic statement: an upsert for ``add``, a
+    conditional decrement or delete for ``remove`` and an UPDATE or DELETE for
+    ``set``. A batch runs three statements whatever its size: the cart's lines
+    are read and write-locked by one UPDATE ... RETURNING, then the lines it
+    changes are upserted with one executemany and the lines it empties deleted.
+    """
+
+    def apply(self, cart_id, operations):
+        try:
+            self.write(cart_id, operations)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def write(self, cart_id, operations):
+        """Like ``apply``, in the session's transaction: the caller commits or rolls back."""
+        if len(operations) == 1:
+            product_id, action, quantity = operations[0]
+            if action == 'add':
+                self._add(cart_id, product_id, quantity)
+            elif action == 'remove':
+                self._remove(cart_id, product_id)
+            elif action == 'set':
+                self._set(cart_id, product_id, quantity)
+        else:
+            self._apply_batch(cart_id, operations)
+
+    def items(self, cart_id):
+        rows = db.session.execute(
+            select(CartItem.product_id, CartItem.quantity)
+            .where(CartItem.cart_id == cart_id)
+            .order_by(CartItem.id)
+        )
+        return dict(rows.all())
+
+    def clear(self, cart_id):
+        try:
+            db.session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def lines(self, cart_id, product_ids=None):
+        if product_ids is None:
+            rows = db.session.execute(_CART_LINES, {'cart_id': cart_id})
+        else:
+            rows = db.session.execute(_CART_LINES_FOR_PRODUCTS, {'cart_id': cart_id, 'product_ids': list(product_ids)})
+        return [serialize_cart_line(line_id, quantity, product) for line_id, quantity, *product in rows]
+
+    def summary(self, cart_id):
+        count, subtotal = db.session.execute(
+            select(
+                func.coalesce(func.sum(CartItem.quantity), 0),
+                func.coalesce(func.sum(CartItem.quantity * Product.price), 0.0)
+            )
+            .join(Product, CartItem.product_id == Product.id)
+            .where(CartItem.cart_id == cart_id)
+        ).one()
+        return {'count': int(count), 'subtotal': round(float(subtotal), 2)}
+
+    def persist(self, cart_id):
+        # Already durable
+        pass
+
+    def checked_out(self, cart_id):
+        # The order transaction deleted the lines
+        pass
+
+    def _apply_batch(self, cart_id, operations):
+        # The no-op UPDATE reads the lines and locks them in one statement, so
+        # nothing changes them between the read and the writes
+        current = dict(db.session.execute(
+            update(CartItem)
+            .where(CartItem.cart_id == cart_id)
+            .values(quantity=CartItem.quantity)
+            .returning(CartItem.product_id, CartItem.quantity)
+            .execution_options(synchronize_session=False)
+        ).all())
+        # New products come last, in the order the batch added them
+        quantities = apply_operations(dict(current), operations)
+
+        changed = [
+            {'cart_id': cart_id, 'product_id': pid, 'quantity': qty}
+            for pid, qty in quantities.items() if current.get(pid) != qty
+        ]
+        if changed:
+            stmt = _upsert(CartItem.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CartItem.cart_id, CartItem.product_id],
+                set_={'quantity': stmt.excluded.quantity}
+            )
+            db.session.execute(stmt, changed)
+        removed = [pid for pid in current if pid not in quantities]
+        if removed:
+            db.session.execute(
+                delete(CartItem)
+                .where(CartItem.cart_id == cart_id, CartItem.product_id.in_(removed))
+                .execution_options(synchronize_session=False)
+            )
+
+    def _add(self, cart_id, product_id, quantity):
+        stmt = _upsert(CartItem).values(cart_id=cart_id, product_id=product_id, quantity=quantity)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={'quantity': CartItem.quantity + stmt.excluded.quantity}
+        )
+        db.session.execute(stmt)
+
+    def _remove(self, cart_id, product_id):
+        # The DELETE only runs when the conditional decrement matched nothing
+        line = (CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+        result = db.session.execute(
+            update(CartItem)
+            .where(*line, CartItem.quantity > 1)
+            .values(quantity=CartItem.quantity - 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.execute(
+                delete(CartItem)
+                .where(*line, CartItem.quantity <= 1)
+                .execution_options(synchronize_session=False)
+            )
+
+    def _set(self, cart_id, product_id, quantity):
+        line = (CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+        if quantity > 0:
+            stmt = update(CartItem).where(*line).values(quantity=quantity)
+        else:
+            stmt = delete(CartItem).where(*line)
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+class MemoryCartStore(CartStore):
+    """Carts kept in a dict of the current process.
+
+    Only suitable for a single process (development, tests); idle carts
+    expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._carts = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def apply(self, cart_id, operations):
+        with self._lock:
+            quantities = dict(self._get(cart_id))
+            apply_operations(quantities, operations)
+            if quantities:
+                self._carts[cart_id] = quantities
+                if self.ttl:
+                    self._expires[cart_id] = time.monotonic() + self.ttl
+            else:
+                self._drop(cart_id)
+
+    def items(self, cart_id):
+        with self._lock:
+            return dict(self._get(cart_id))
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._drop(cart_id)
+
+    def _get(self, cart_id):
+        expires = self._expires.get(cart_id)
+        if expires is not None and expires < time.monotonic():
+            self._drop(cart_id)
+        return self._carts.get(cart_id, {})
+
+    def _drop(self, cart_id):
+        self._carts.pop(cart_id, None)
+        self._expires.pop(cart_id, None)
+
+
+class RedisCartStore(CartStore):
+    """Carts stored as Redis hashes of ``product_id -> quantity``.
+
+    Pure ``add`` batches are a pipelined HINCRBY; anything that may remove a
+    line uses an optimistic WATCH/MULTI transaction on the cart's key.
+    """
+
+    def __init__(self, client, ttl=None, prefix='cart:', watch_error=None):
+        if watch_error is None:
+            from redis.exceptions import WatchError as watch_error
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._watch_error = watch_error
+
+    def apply(self, cart_id, operations):
+        key = self._key(cart_id)
+
+        if all(action == 'add' for _, action, _ in operations):
+            pipe = self.client.pipeline(transaction=True)
+            for product_id, _, quantity in operations:
+                pipe.hincrby(key, product_id, quantity)
+            if self.ttl:
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+            return
+
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    quantities = self._decode(pipe.hgetall(key))
+                    apply_operations(quantities, operations)
+                    pipe.multi()
+                    pipe.delete(key)
+                    if quantities:
+                        pipe.hset(key, mapping=quantities)
+                        if self.ttl:
+                            pipe.expire(key, self.ttl)
+                    pipe.execute()
+                    return
+                except self._watch_error:
+                    # Another request changed this cart; retry on fresh state
+                    continue
+
+    def items(self, cart_id):
+        return self._decode(self.client.hgetall(self._key(cart_id)))
+
+    def clear(self, cart_id):
+        self.client.delete(self._key(cart_id))
+
+    def _key(self, cart_id):
+        return f'{self.prefix}{cart_id}'
+
+    @staticmethod
+    def _decode(mapping):
+        return {int(pid): int(qty) for pid, qty in mapping.items() if int(qty) > 0}
+
+
+def create_cart_store(app):
+    """Build the backend selected by ``CART_STORE`` (sql, memory or redis)."""
+    backend = app.config.get('CART_STORE', 'sql').lower()
+    ttl = app.config.get('CART_TTL')
+
+    if backend == 'sql':
+        return SqlCartStore()
+    if backend == 'memory':
+        return MemoryCartStore(ttl=ttl)
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CART_STORE=redis requires the 'redis' package")
+        client = redis.Redis.from_url(app.config['REDIS_URL'])
+        return RedisCartStore(client, ttl=ttl, prefix=app.config.get('CART_REDIS_PREFIX', 'cart:'))
+    raise ValueError(f"Unknown CART_STORE '{backend}'")
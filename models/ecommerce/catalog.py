@@ -0,0 +1,132 @@
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import select, tuple_
+
+from models.ecommerce.models import db
+from models.ecommerce.schema import PRODUCT_COLUMNS, product_table
+
+# Maximum page size a client may request from /api/products
+MAX_PAGE_SIZE = 100
+
+# Rows fetched per round trip when streaming a whole result set
+STREAM_BATCH_SIZE = 1000
+
+# Supported sort orders: name -> (key column, descending)
+SORTS = {
+    'id': (product_table.c.id, False),
+    'price': (product_table.c.price, False),
+    '-price': (product_table.c.price, True),
+}
+
+
+class CatalogQueryError(ValueError):
+    """Raised when catalog query parameters or cursors are invalid."""
+
+
+def _serializer(secret_key):
+    return URLSafeSerializer(secret_key, salt='product-cursor')
+
+
+def encode_cursor(secret_key, sort, key, product_id):
+    """Build an opaque cursor pointing just after the product at ``(key, product_id)`` for ``sort``."""
+    return _serializer(secret_key).dumps([sort, key, product_id])
+
+
+def decode_cursor(secret_key, token, sort):
+    """Decode a cursor and return its ``(key, id)`` position."""
+    try:
+        cursor_sort, key, product_id = _serializer(secret_key).loads(token)
+    except (BadSignature, ValueError, TypeError):
+        raise CatalogQueryError('Invalid cursor')
+    if cursor_sort != sort:
+        raise CatalogQueryError('Cursor does not match the requested sort order')
+    return key, product_id
+
+
+def parse_product_filters(args, default_limit):
+    """Validate the query string of /api/products."""
+    filters = {
+        'category': args.get('category') or None,
+        'sort': args.get('sort', 'id'),
+        'cursor': args.get('cursor') or None,
+    }
+
+    if filters['sort'] not in SORTS:
+        raise CatalogQueryError(f"Unsupported sort '{filters['sort']}'")
+
+    try:
+        filters['limit'] = int(args.get('limit', default_limit))
+        filters['min_price'] = float(args['min_price']) if args.get('min_price') else None
+        filters['max_price'] = float(args['max_price']) if args.get('max_price') else None
+    except ValueError:
+        raise CatalogQueryError('limit, min_price and max_price must be numbers')
+
+    if not 1 <= filters['limit'] <= MAX_PAGE_SIZE:
+        raise CatalogQueryError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    return filters
+
+
+def _ordered_query(secret_key, category, min_price, max_price, sort, cursor):
+    """Select products matching the filters, ordered by ``(sort key, id)`` from ``cursor`` on."""
+    column, descending = SORTS[sort]
+    query = select(*PRODUCT_COLUMNS)
+
+    if category is not None:
+        query = query.where(product_table.c.category == category)
+    if min_price is not None:
+        query = query.where(product_table.c.price >= min_price)
+    if max_price is not None:
+        query = query.where(product_table.c.price <= max_price)
+
+    if cursor is not None:
+        key, last_id = decode_cursor(secret_key, cursor, sort)
+        if column is product_table.c.id:
+            position = product_table.c.id < last_id if descending else product_table.c.id > last_id
+        else:
+            row = tuple_(column, product_table.c.id)
+            position = row < (key, last_id) if descending else row > (key, last_id)
+        query = query.where(position)
+
+    if column is product_table.c.id:
+        order = [product_table.c.id.desc() if descending else product_table.c.id.asc()]
+    else:
+        order = [column.desc(), product_table.c.id.desc()] if descending else [column.asc(), product_table.c.id.asc()]
+    return query.order_by(*order)
+
+
+def list_products(secret_key, category=None, min_price=None, max_price=None,
+                  sort='id', cursor=None, limit=12):
+    """Return one keyset-paginated page of products.
+
+    The page is fetched with a single range scan ordered by ``(sort key, id)``,
+    so the cost of a request does not depend on how deep the client has paged.
+    Returns ``(rows, next_cursor)``, where rows carry the ``PRODUCT_COLUMNS``;
+    ``next_cursor`` is ``None`` on the last page.
+    """
+    # Fetch one extra row to know whether another page exists
+    query = _ordered_query(secret_key, category, min_price, max_price, sort, cursor).limit(limit + 1)
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        column, _ = SORTS[sort]
+        next_cursor = encode_cursor(secret_key, sort, getattr(rows[-1], column.key), rows[-1].id)
+
+    return rows, next_cursor
+
+
+def find_product(product_id):
+    """Return the ``PRODUCT_COLUMNS`` row of one product, or ``None``."""
+    return db.session.execute(select(*PRODUCT_COLUMNS).where(product_table.c.id == product_id)).first()
+
+
+def stream_products(secret_key, category=None, min_price=None, max_price=None,
+                    sort='id', cursor=None, batch_size=STREAM_BATCH_SIZE):
+    """Return an iterable over every product row matching the filters, in page order.
+
+    Rows are fetched from a server-side cursor ``batch_size`` at a time, so
+    memory use does not grow with the number of rows. Invalid cursors raise
+    here rather than once iteration has started.
+    """
+    query = _ordered_query(secret_key, category, min_price, max_price, sort, cursor)
+    return db.session.execute(query.execution_options(yield_per=batch_size))
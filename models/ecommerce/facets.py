@@ -0,0 +1,79 @@
+from sqlalchemy import DDL, event, func, select, text
+
+from models.ecommerce.models import db, Product, CategoryFacet
+
+# Decrement the old category; its min/max are only recomputed when the removed
+# price was the boundary, which is a single (category, price) index probe
+_REMOVE_OLD = (
+    "UPDATE category_facet SET "
+    "product_count = product_count - 1, "
+    "price_min = CASE WHEN old.price <= price_min "
+    "THEN (SELECT MIN(price) FROM product WHERE category = old.category) ELSE price_min END, "
+    "price_max = CASE WHEN old.price >= price_max "
+    "THEN (SELECT MAX(price) FROM product WHERE category = old.category) ELSE price_max END "
+    "WHERE category = old.category; "
+    "DELETE FROM category_facet WHERE category = old.category AND product_count <= 0;"
+)
+
+_ADD_NEW = (
+    "INSERT INTO category_facet (category, product_count, price_min, price_max) "
+    "VALUES (new.category, 1, new.price, new.price) "
+    "ON CONFLICT (category) DO UPDATE SET "
+    "product_count = product_count + 1, "
+    "price_min = MIN(price_min, excluded.price_min), "
+    "price_max = MAX(price_max, excluded.price_max);"
+)
+
+FACET_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS category_facet_ai AFTER INSERT ON product "
+    f"WHEN new.category IS NOT NULL BEGIN {_ADD_NEW} END",
+    "CREATE TRIGGER IF NOT EXISTS category_facet_ad AFTER DELETE ON product "
+    f"WHEN old.category IS NOT NULL BEGIN {_REMOVE_OLD} END",
+    "CREATE TRIGGER IF NOT EXISTS category_facet_au_old AFTER UPDATE OF category, price ON product "
+    f"WHEN old.category IS NOT NULL BEGIN {_REMOVE_OLD} END",
+    "CREATE TRIGGER IF NOT EXISTS category_facet_au_new AFTER UPDATE OF category, price ON product "
+    f"WHEN new.category IS NOT NULL BEGIN {_ADD_NEW} END",
+]
+
+DROP_DDL = [
+    "DROP TRIGGER IF EXISTS category_facet_au_new",
+    "DROP TRIGGER IF EXISTS category_facet_au_old",
+    "DROP TRIGGER IF EXISTS category_facet_ad",
+    "DROP TRIGGER IF EXISTS category_facet_ai",
+]
+
+# The triggers reference both tables, so they hang off the metadata and are
+# created once every table exists
+for _statement in FACET_DDL:
+    event.listen(db.metadata, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in DROP_DDL:
+    event.listen(db.metadata, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+def category_facets():
+    """Return every category with its product count and price range."""
+    if db.session.get_bind().dialect.name != 'sqlite':
+        # No triggers outside SQLite: aggregate on the fly
+        rows = db.session.execute(
+            select(Product.category, func.count(), func.min(Product.price), func.max(Product.price))
+            .where(Product.category.isnot(None))
+            .group_by(Product.category)
+            .order_by(Product.category)
+        )
+        return [
+            {'category': category, 'count': count, 'price_min': price_min, 'price_max': price_max}
+            for category, count, price_min, price_max in rows
+        ]
+
+    return [facet.to_dict() for facet in CategoryFacet.query.order_by(CategoryFacet.category)]
+
+
+def rebuild_category_facets(session):
+    """Recompute the facet table from scratch (after loads that bypass triggers)."""
+    session.execute(text("DELETE FROM category_facet"))
+    session.execute(text(
+        "INSERT INTO category_facet (category, product_count, price_min, price_max) "
+        "SELECT category, COUNT(*), MIN(price), MAX(price) FROM product "
+        "WHERE category IS NOT NULL GROUP BY category"
+    ))
+    session.commit()
@@ -1,6 +1,12 @@
+import re
+
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SubmitField, IntegerField, TelField, EmailField
-from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
+from wtforms import StringField, SelectField, SubmitField, IntegerField, TelField, EmailField, HiddenField
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, Regexp
+
+# Idempotency keys, from the form or an Idempotency-Key header: up to 64
+# URL-safe characters, the size of Order.idempotency_key
+IDEMPOTENCY_KEY = re.compile(r'[A-Za-z0-9_.:-]{1,64}\Z')
 
 class CheckoutForm(FlaskForm):
     # Personal Information
@@ -39,6 +45,10 @@ class CheckoutForm(FlaskForm):
                            validators=[Optional(), 
                                      Length(min=2, max=100)])
     
+    # Issued by the view when it renders the form, so resubmitting the same
+    # form places one order; a POST without a key fails validation
+    idempotency_key = HiddenField(validators=[DataRequired(), Regexp(IDEMPOTENCY_KEY)])
+    
     # Submit Button
     submit = SubmitField('Place Order')
     
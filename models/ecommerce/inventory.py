@@ -0,0 +1,218 @@
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, select, update
+
+from models.ecommerce.cache import SKIP_CATALOG_BUMP, catalog_cache
+from models.ecommerce.cart_store import UPSERT_INSERTS
+from models.ecommerce.models import db, Product, StockReservation
+
+# Reservations not checked out within this many seconds go back to stock
+DEFAULT_RESERVATION_TTL = 15 * 60
+
+# Stock moves do not change what the catalog serves, so they keep its caches
+_STOCK_WRITE = {SKIP_CATALOG_BUMP: True, 'synchronize_session': False}
+
+_reservations = StockReservation.__table__
+_products = Product.__table__
+
+_RETURN_STOCK = (
+    update(_products)
+    .where(_products.c.id == bindparam('product_id'), _products.c.stock.isnot(None))
+    .values(stock=_products.c.stock + bindparam('released'))
+)
+
+# (catalog version, ids of the products with a stock limit)
+_tracked = (None, frozenset())
+
+
+class InventoryError(ValueError):
+    """Raised when a product has not enough stock left for a reservation."""
+
+
+def reservation_ttl():
+    return timedelta(seconds=current_app.config.get('STOCK_RESERVATION_TTL', DEFAULT_RESERVATION_TTL))
+
+
+def tracked_products():
+    """Ids of the products sold from a limited stock.
+
+    Read once per catalog version: ``set_stock`` moves the version when a
+    product starts or stops being tracked, reservations do not.
+    """
+    global _tracked
+    version = catalog_cache.version.current()
+    if _tracked[0] != version:
+        ids = db.session.execute(select(_products.c.id).where(_products.c.stock.isnot(None))).scalars()
+        _tracked = (version, frozenset(ids))
+    return _tracked[1]
+
+
+def held_quantities(cart_id, product_ids=None):
+    """``{product_id: quantity}`` reserved for the cart, optionally only for ``product_ids``."""
+    stmt = (
+        select(_reservations.c.product_id, _reservations.c.quantity)
+        .where(_reservations.c.cart_id == cart_id, _reservations.c.quantity > 0)
+    )
+    if product_ids is not None:
+        stmt = stmt.where(_reservations.c.product_id.in_(list(product_ids)))
+    return dict(db.session.execute(stmt).all())
+
+
+def adjust_reservations(cart_id, deltas):
+    """Reserve or give back units for the cart, ``{product_id: delta}``, in one short transaction.
+
+    A positive delta takes units from stock with a conditional UPDATE ...
+    WHERE stock >= delta, so concurrent reservations of the last units
+    cannot oversell: the database serializes them on the product row and the
+    ones that find too little stock match no row. The whole adjustment is
+    rolled back and ``InventoryError`` raised when any product runs short.
+    Reserved units expire ``STOCK_RESERVATION_TTL`` seconds after the last
+    change to the reservation.
+    """
+    try:
+        apply_reservations(cart_id, deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def apply_reservations(cart_id, deltas):
+    """Like ``adjust_reservations``, in the session's transaction: the caller commits or rolls back."""
+    _apply_deltas(cart_id, deltas, _utcnow() + reservation_ttl())
+
+
+def hold_for_checkout(cart_id, quantities):
+    """Make the cart's reservations cover ``{product_id: quantity}`` for checkout.
+
+    The cart's reservations are renewed first, so the sweeper cannot release
+    them while the order is placed; then lines missing units, for instance
+    after their reservation expired, are topped up and units reserved for
+    products no longer in the cart are given back. Returns whether the cart
+    holds any reservation, which the order transaction then consumes. Raises
+    ``InventoryError`` when a line cannot be covered anymore.
+    """
+    tracked = tracked_products()
+    wanted = {pid: qty for pid, qty in quantities.items() if pid in tracked}
+    expires_at = _utcnow() + reservation_ttl()
+    try:
+        # Renewing takes the write lock before the read, so nothing can
+        # release the reservations between the two
+        db.session.execute(
+            update(StockReservation).where(StockReservation.cart_id == cart_id)
+            .values(expires_at=expires_at).execution_options(synchronize_session=False)
+        )
+        held = held_quantities(cart_id)
+        deltas = {pid: wanted.get(pid, 0) - held.get(pid, 0) for pid in {*wanted, *held}}
+        _apply_deltas(cart_id, deltas, expires_at)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return bool(wanted)
+
+
+def release_expired_reservations(now=None):
+    """Give the units of expired reservations back to stock; returns how many reservations expired.
+
+    One transaction of two statements whatever the number of reservations:
+    a DELETE ... RETURNING of the expired rows, then one executemany UPDATE
+    of the products. A reservation is only returned by the statement that
+    deleted it, so a checkout renewing it at the same time either keeps it
+    whole or finds it gone.
+    """
+    now = now or _utcnow()
+    try:
+        rows = db.session.execute(
+            delete(StockReservation)
+            .where((StockReservation.expires_at <= now) | (StockReservation.quantity <= 0))
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        released = {}
+        for product_id, quantity in rows:
+            if quantity > 0:
+                released[product_id] = released.get(product_id, 0) + quantity
+        if released:
+            db.session.execute(_RETURN_STOCK.execution_options(**_STOCK_WRITE), [
+                {'product_id': pid, 'released': qty} for pid, qty in sorted(released.items())
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return sum(1 for _, quantity in rows if quantity > 0)
+
+
+def set_stock(product_id, stock):
+    """Set the units of a product left to sell, or ``None`` to stop tracking its stock.
+
+    ``stock`` does not count units already reserved. Untracking a product
+    drops its reservations.
+    """
+    try:
+        updated = db.session.execute(
+            update(Product).where(Product.id == product_id).values(stock=stock)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if stock is None:
+            db.session.execute(delete(StockReservation).where(StockReservation.product_id == product_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return bool(updated)
+
+
+def _apply_deltas(cart_id, deltas, expires_at):
+    # Products are locked in id order, so concurrent carts cannot deadlock
+    for product_id, delta in sorted(deltas.items()):
+        if delta > 0:
+            _reserve(cart_id, product_id, delta, expires_at)
+        elif delta < 0:
+            _release(cart_id, product_id, -delta)
+
+
+def _reserve(cart_id, product_id, quantity, expires_at):
+    taken = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .execution_options(**_STOCK_WRITE)
+    ).rowcount
+    if not taken:
+        raise InventoryError(f'Not enough stock left for product {product_id}')
+
+    dialect = db.session.get_bind().dialect.name
+    try:
+        upsert = UPSERT_INSERTS[dialect]
+    except KeyError:
+        raise NotImplementedError(f'Stock reservations are not supported on {dialect}')
+    stmt = upsert(StockReservation).values(cart_id=cart_id, product_id=product_id, quantity=quantity,
+                                           expires_at=expires_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockReservation.cart_id, StockReservation.product_id],
+        set_={'quantity': StockReservation.quantity + stmt.excluded.quantity, 'expires_at': stmt.excluded.expires_at}
+    )
+    db.session.execute(stmt)
+
+
+def _release(cart_id, product_id, quantity):
+    # Only units still reserved go back: a reservation the sweeper already
+    # released matches nothing
+    released = db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.cart_id == cart_id, StockReservation.product_id == product_id,
+               StockReservation.quantity >= quantity)
+        .values(quantity=StockReservation.quantity - quantity)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if released:
+        db.session.execute(_RETURN_STOCK.execution_options(**_STOCK_WRITE),
+                           {'product_id': product_id, 'released': quantity})
+
+
+def _utcnow():
+    # Naive UTC, as stored in DateTime columns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
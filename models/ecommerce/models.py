@@ -6,44 +6,123 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False, index=True)
     image = db.Column(db.String(300), nullable=True)
-    category = db.Column(db.String(100), nullable=True)
+    category = db.Column(db.String(100), nullable=True, index=True)
     rating_rate = db.Column(db.Float, default=0.0)
     rating_count = db.Column(db.Integer, default=0)
+    # Units left to sell; NULL for products sold without a stock limit
+    stock = db.Column(db.Integer, nullable=True)
+
+    # Keyset pagination indexes: (category, id) comes from the category index,
+    # (category, price, id) from this composite one
+    __table_args__ = (
+        db.Index('ix_product_category_price', 'category', 'price'),
+        # Finds the few stock-tracked products without scanning the catalog
+        db.Index('ix_product_stock_tracked', 'id', sqlite_where=db.text('stock IS NOT NULL'),
+                 postgresql_where=db.text('stock IS NOT NULL')),
+    )
+
+    def to_dict(self):
+        from models.ecommerce.schema import PRODUCT_COLUMNS, column_values, serialize_product
+        return serialize_product(column_values(self, PRODUCT_COLUMNS))
+
+class CategoryFacet(db.Model):
+    """Per-category product count and price range.
+
+    Maintained incrementally by triggers on ``product`` (see
+    ``models.ecommerce.facets``) so the catalog filter bar never needs a
+    GROUP BY over the whole product table.
+    """
+    category = db.Column(db.String(100), primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    price_min = db.Column(db.Float, nullable=True)
+    price_max = db.Column(db.Float, nullable=True)
 
     def to_dict(self):
         return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'price': self.price,
-            'image': self.image,
             'category': self.category,
-            'rating': {
-                'rate': self.rating_rate,
-                'count': self.rating_count
-            }
+            'count': self.product_count,
+            'price_min': self.price_min,
+            'price_max': self.price_max
         }
 
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    # Session cart the line belongs to
+    cart_id = db.Column(db.String(64), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, default=1)
     
+    # One line per product and cart, so cart writes can be single-statement upserts
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'product_id', name='uq_cart_item_cart_product'),
+    )
+    
     # Relationship
     product = db.relationship('Product', backref=db.backref('cart_items', lazy=True))
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'product_id': self.product_id,
-            'quantity': self.quantity,
-            'product': {
-                'id': self.product.id,
-                'title': self.product.title,
-                'price': self.product.price,
-                'image': self.product.image
-            },
-            'total_price': self.quantity * self.product.price
-        }
+        from models.ecommerce.schema import CART_PRODUCT_COLUMNS, column_values, serialize_cart_line
+        return serialize_cart_line(self.id, self.quantity, column_values(self.product, CART_PRODUCT_COLUMNS))
+
+class Order(db.Model):
+    """A placed order; amounts are integer cents, computed in SQL at checkout."""
+    id = db.Column(db.Integer, primary_key=True)
+    # Sent with the checkout form; a retried or double-submitted POST finds the
+    # order it already placed instead of placing another. Unique per cart, so
+    # a key sent by another session never matches this cart's order
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    cart_id = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='placed')
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+    
+    # Contact and shipping details; card data is never stored
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(30), nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    address2 = db.Column(db.String(200), nullable=True)
+    city = db.Column(db.String(100), nullable=False)
+    state = db.Column(db.String(100), nullable=False)
+    zip_code = db.Column(db.String(20), nullable=False)
+    country = db.Column(db.String(100), nullable=False)
+    payment_method = db.Column(db.String(20), nullable=False)
+    
+    subtotal_cents = db.Column(db.Integer, nullable=False, default=0)
+    tax_cents = db.Column(db.Integer, nullable=False, default=0)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    
+    items = db.relationship('OrderItem', backref='order', lazy=True, order_by='OrderItem.id')
+    
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'idempotency_key', name='uq_order_cart_idempotency_key'),
+    )
+
+class OrderItem(db.Model):
+    """A cart line as it was at checkout: the title and price are copied from the product."""
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    unit_price_cents = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+class StockReservation(db.Model):
+    """Units of a stock-tracked product held for a cart until ``expires_at``.
+
+    The units are taken from ``Product.stock`` when reserved. Checkout turns
+    them into an order; expired ones are given back by a sweeper (see
+    ``models.ecommerce.inventory``).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(64), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    # One row per product and cart, so reservations are single-statement upserts
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'product_id', name='uq_stock_reservation_cart_product'),
+    )
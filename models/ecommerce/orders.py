@@ -0,0 +1,136 @@
+from sqlalchemy import Integer, cast, delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models.ecommerce.cart import get_cart_store
+from models.ecommerce.inventory import hold_for_checkout, tracked_products
+from models.ecommerce.models import db, CartItem, Order, OrderItem, StockReservation
+from models.ecommerce.schema import product_table
+
+# Sales tax, in percent of the subtotal
+TAX_PERCENT = 10
+
+# Checkout form fields copied onto the order
+ORDER_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'address', 'address2', 'city', 'state', 'zip_code',
+                'country', 'payment_method')
+
+_orders = Order.__table__
+_order_items = OrderItem.__table__
+_cart_items = CartItem.__table__
+_reservations = StockReservation.__table__
+
+
+class OrderError(ValueError):
+    """Raised when a checkout cannot place an order."""
+
+
+def price_cents(price):
+    """Integer cents of a ``Float`` price.
+
+    Prices have cent precision, so ``price * 100`` is always within rounding
+    error of an integer and the database rounds it to the same one.
+    """
+    return int(round(price * 100))
+
+
+def tax_cents(subtotal_cents):
+    """Tax on a subtotal in cents, rounded half up.
+
+    Integer arithmetic only, so it computes the same value on a Python int
+    and as a SQL expression.
+    """
+    return (subtotal_cents * TAX_PERCENT + 50) // 100
+
+
+def cart_totals(lines):
+    """``(subtotal, tax, total)`` in cents of serialized cart lines, as checkout will charge them."""
+    subtotal = sum(price_cents(line['product']['price']) * line['quantity'] for line in lines)
+    tax = tax_cents(subtotal)
+    return subtotal, tax, subtotal + tax
+
+
+def find_order(cart_id, idempotency_key):
+    """Id of the order the cart placed with ``idempotency_key``, or ``None``.
+
+    Keys are scoped to the cart: the same key sent for another cart finds
+    nothing, and places that cart's own order.
+    """
+    return db.session.execute(
+        select(_orders.c.id).where(_orders.c.cart_id == cart_id, _orders.c.idempotency_key == idempotency_key)
+    ).scalar()
+
+
+def place_order(cart_id, idempotency_key, details):
+    """Place an order for the cart and return ``(order_id, created)``.
+
+    ``details`` maps ``ORDER_FIELDS`` to their values. When the cart placed
+    an order with ``idempotency_key`` already, by an earlier or a concurrent
+    request, nothing is written and that order is returned with ``created``
+    false.
+
+    The cart is written through to ``cart_item`` first, and its stock
+    reservations are renewed and topped up to cover the lines of tracked
+    products (see ``inventory.hold_for_checkout``). Then one transaction of
+    four statements inserts the order, copies the cart lines with their
+    current titles and prices in cents in one INSERT ... SELECT, computes the
+    totals in SQL and deletes the cart lines, plus a fifth consuming the
+    reservations. No Python work runs between them, so the write lock is
+    held for at most five statements whatever the size of the cart. Raises
+    ``OrderError`` when the cart is empty and ``InventoryError`` when a line
+    is no longer in stock.
+    """
+    order_id = find_order(cart_id, idempotency_key)
+    if order_id is not None:
+        return order_id, False
+
+    store = get_cart_store()
+    store.persist(cart_id)
+    reserved = bool(tracked_products()) and hold_for_checkout(cart_id, store.items(cart_id))
+    try:
+        order_id = db.session.execute(
+            insert(_orders).values(idempotency_key=idempotency_key, cart_id=cart_id,
+                                   **{field: details.get(field) for field in ORDER_FIELDS})
+        ).inserted_primary_key[0]
+    except IntegrityError:
+        db.session.rollback()
+        # The unique key: a concurrent request with the same key got there first
+        order_id = find_order(cart_id, idempotency_key)
+        if order_id is None:
+            raise
+        return order_id, False
+
+    try:
+        lines = (
+            select(literal(order_id), product_table.c.id, product_table.c.title,
+                   cast(func.round(product_table.c.price * 100), Integer), _cart_items.c.quantity)
+            .join_from(_cart_items, product_table, _cart_items.c.product_id == product_table.c.id)
+            .where(_cart_items.c.cart_id == cart_id, _cart_items.c.quantity > 0)
+            .order_by(_cart_items.c.id)
+        )
+        copied = db.session.execute(
+            insert(_order_items).from_select(
+                ['order_id', 'product_id', 'title', 'unit_price_cents', 'quantity'], lines
+            )
+        ).rowcount
+        if not copied:
+            raise OrderError('Your cart is empty!')
+
+        subtotal = (
+            select(func.coalesce(func.sum(_order_items.c.unit_price_cents * _order_items.c.quantity), 0))
+            .where(_order_items.c.order_id == order_id)
+            .scalar_subquery()
+        )
+        db.session.execute(
+            update(_orders).where(_orders.c.id == order_id)
+            .values(subtotal_cents=subtotal, tax_cents=tax_cents(subtotal), total_cents=subtotal + tax_cents(subtotal))
+        )
+        db.session.execute(delete(_cart_items).where(_cart_items.c.cart_id == cart_id))
+        if reserved:
+            # The ordered units leave stock for good
+            db.session.execute(delete(_reservations).where(_reservations.c.cart_id == cart_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    store.checked_out(cart_id)
+    return order_id, True
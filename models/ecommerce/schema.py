@@ -0,0 +1,67 @@
+from models.ecommerce.models import Product
+
+# Table columns, not ORM attributes: a select of plain table columns skips
+# the ORM's compile and result-processing layers when the session runs it
+product_table = Product.__table__
+
+# Columns selected to serialize a product: API reads project exactly these
+# instead of loading ORM instances. The serializers below unpack rows in this
+# order, which is several times faster than reading Row attributes by name
+PRODUCT_COLUMNS = (
+    product_table.c.id,
+    product_table.c.title,
+    product_table.c.description,
+    product_table.c.price,
+    product_table.c.image,
+    product_table.c.category,
+    product_table.c.rating_rate,
+    product_table.c.rating_count,
+)
+
+# Product columns embedded in a cart line (no description or rating)
+CART_PRODUCT_COLUMNS = (
+    product_table.c.id,
+    product_table.c.title,
+    product_table.c.price,
+    product_table.c.image,
+    product_table.c.category,
+)
+
+
+def column_values(instance, columns):
+    """Read ``columns`` from an ORM instance as a row for the serializers."""
+    return [getattr(instance, column.key) for column in columns]
+
+
+def serialize_product(row):
+    """JSON shape of a product from a row of ``PRODUCT_COLUMNS`` values."""
+    product_id, title, description, price, image, category, rating_rate, rating_count = row
+    return {
+        'id': product_id,
+        'title': title,
+        'description': description,
+        'price': price,
+        'image': image,
+        'category': category,
+        'rating': {
+            'rate': rating_rate,
+            'count': rating_count
+        }
+    }
+
+
+def serialize_cart_line(line_id, quantity, product):
+    """JSON shape of a cart line; ``product`` is a row of ``CART_PRODUCT_COLUMNS`` values."""
+    product_id, title, price, image, category = product
+    return {
+        'id': line_id,
+        'product_id': product_id,
+        'quantity': quantity,
+        'product': {
+            'id': product_id,
+            'title': title,
+            'price': price,
+            'image': image,
+            'category': category
+        }
+    }
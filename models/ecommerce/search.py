@@ -0,0 +1,187 @@
+import re
+from html import escape
+
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import DDL, and_, event, func, or_, select, text
+
+from models.ecommerce.models import db, Product
+from models.ecommerce.schema import PRODUCT_COLUMNS, product_table, serialize_product
+
+# Maximum page size and query length accepted by /api/products/search
+MAX_PAGE_SIZE = 100
+MAX_QUERY_LENGTH = 200
+
+# Column weights for BM25: title matches count most, then category, then description
+RANK_FUNCTION = 'bm25(10.0, 1.0, 5.0)'
+
+# Words around the first match in a snippet, as in the FTS5 snippet() call
+SNIPPET_WORDS = 16
+
+# Private-use markers around matches; the text is HTML-escaped before they
+# are turned into <mark> tags, so product text can never inject markup
+_MARK_OPEN, _MARK_CLOSE = '\ue000', '\ue001'
+
+# External-content FTS5 index over product; the triggers keep it in sync
+# incrementally, including for bulk statements that bypass the ORM
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "title, description, category, content='product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"INSERT INTO product_fts(product_fts, rank) VALUES ('rank', '{RANK_FUNCTION}')",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, title, description, category) "
+    "VALUES (new.id, new.title, new.description, new.category); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, title, description, category) "
+    "VALUES ('delete', old.id, old.title, old.description, old.category); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF title, description, category ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, title, description, category) "
+    "VALUES ('delete', old.id, old.title, old.description, old.category); "
+    "INSERT INTO product_fts(rowid, title, description, category) "
+    "VALUES (new.id, new.title, new.description, new.category); END",
+]
+
+DROP_DDL = [
+    "DROP TRIGGER IF EXISTS product_fts_au",
+    "DROP TRIGGER IF EXISTS product_fts_ad",
+    "DROP TRIGGER IF EXISTS product_fts_ai",
+    "DROP TABLE IF EXISTS product_fts",
+]
+
+for _statement in SEARCH_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in DROP_DDL:
+    event.listen(Product.__table__, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+class SearchError(ValueError):
+    """Raised when a search query or cursor is invalid."""
+
+
+def search_terms(q):
+    """Split free text into the words searched for."""
+    if len(q) > MAX_QUERY_LENGTH:
+        raise SearchError(f'q must be at most {MAX_QUERY_LENGTH} characters')
+    terms = re.findall(r'\w+', q)
+    if not terms:
+        raise SearchError('q must contain at least one word')
+    return terms
+
+
+def build_match_query(q):
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted, so FTS5 operators typed by users are searched for
+    literally, and the last word matches as a prefix for search-as-you-type.
+    """
+    quoted = [f'"{term}"' for term in search_terms(q)]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _serializer(secret_key):
+    return URLSafeSerializer(secret_key, salt='search-cursor')
+
+
+def _marked_html(value):
+    return escape(value or '').replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def search_products(secret_key, q, limit=12, cursor=None):
+    """Return one page of products matching ``q``, best BM25 rank first.
+
+    Pages are keyset-paginated on ``(rank, id)``. Each item carries HTML-safe
+    ``title_highlight`` and ``snippet`` fields with matches wrapped in ``<mark>``.
+    Returns ``(items, next_cursor)``. Databases other than SQLite have no
+    FTS5 index and are searched by ``like_search`` instead.
+    """
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return like_search(secret_key, q, limit, cursor)
+
+    params = {'match': build_match_query(q), 'limit': limit + 1}
+    position = ''
+    if cursor is not None:
+        try:
+            params['rank'], params['last_id'] = _serializer(secret_key).loads(cursor)
+        except (BadSignature, ValueError, TypeError):
+            raise SearchError('Invalid cursor')
+        position = 'AND (product_fts.rank, product_fts.rowid) > (:rank, :last_id)'
+
+    rows = db.session.execute(text(f"""
+        SELECT p.id, p.title, p.description, p.price, p.image, p.category,
+               p.rating_rate, p.rating_count, product_fts.rank AS rank,
+               highlight(product_fts, 0, '{_MARK_OPEN}', '{_MARK_CLOSE}') AS title_highlight,
+               snippet(product_fts, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 16) AS snippet
+        FROM product_fts
+        JOIN product AS p ON p.id = product_fts.rowid
+        WHERE product_fts MATCH :match {position}
+        ORDER BY product_fts.rank, product_fts.rowid
+        LIMIT :limit
+    """), params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _serializer(secret_key).dumps([rows[-1].rank, rows[-1].id])
+
+    items = [
+        dict(serialize_product(product), title_highlight=_marked_html(title_highlight), snippet=_marked_html(snippet))
+        for *product, _, title_highlight, snippet in rows
+    ]
+    return items, next_cursor
+
+
+def like_search(secret_key, q, limit=12, cursor=None):
+    """Unindexed fallback of ``search_products``, for databases without FTS5.
+
+    Every word must appear, in any case, in the title, description or
+    category. There is no ranking: pages are keyset-paginated on ``id``. The
+    response has the same shape, highlights and snippets included.
+    """
+    terms = search_terms(q)
+    stmt = select(*PRODUCT_COLUMNS).where(and_(*(
+        or_(*(func.lower(column).contains(term.lower(), autoescape=True)
+              for column in (product_table.c.title, product_table.c.description, product_table.c.category)))
+        for term in terms
+    )))
+    if cursor is not None:
+        try:
+            last_id, = _serializer(secret_key).loads(cursor)
+        except (BadSignature, ValueError, TypeError):
+            raise SearchError('Invalid cursor')
+        stmt = stmt.where(product_table.c.id > last_id)
+    rows = db.session.execute(stmt.order_by(product_table.c.id).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _serializer(secret_key).dumps([rows[-1].id])
+
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    items = [
+        dict(serialize_product(row), title_highlight=_marked_html(_mark(row.title, pattern)),
+             snippet=_marked_html(_snippet(row.description, pattern)))
+        for row in rows
+    ]
+    return items, next_cursor
+
+
+def _mark(value, pattern):
+    return pattern.sub(lambda match: f'{_MARK_OPEN}{match.group(0)}{_MARK_CLOSE}', value or '')
+
+
+def _snippet(value, pattern):
+    words = (value or '').split()
+    first = next((index for index, word in enumerate(words) if pattern.search(word)), 0)
+    start = max(0, min(first - SNIPPET_WORDS // 2, len(words) - SNIPPET_WORDS))
+    end = start + SNIPPET_WORDS
+    return ('…' if start else '') + _mark(' '.join(words[start:end]), pattern) + ('…' if end < len(words) else '')
+
+
+def rebuild_search_index(session):
+    """Create the index if needed and rebuild it from the product table."""
+    for statement in SEARCH_DDL:
+        session.execute(text(statement))
+    session.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+    session.execute(text("INSERT INTO product_fts(product_fts) VALUES ('optimize')"))
+    session.commit()
@@ -0,0 +1,257 @@
+import bisect
+import csv
+import json
+import random
+from itertools import accumulate, groupby, islice
+from pathlib import Path
+
+from sqlalchemy import delete, exists, select, text
+from sqlalchemy.orm import Session
+
+from models.ecommerce import facets, search
+from models.ecommerce.cache import mark_catalog_changed
+from models.ecommerce.models import db, Product, CartItem, OrderItem, StockReservation
+
+# Rows per INSERT executemany and per transaction
+DEFAULT_CHUNK_SIZE = 10000
+
+FAKESTORE_URL = 'https://fakestoreapi.com/products'
+
+# Category name -> relative weight of the synthetic generator
+DEFAULT_CATEGORIES = {
+    "men's clothing": 1,
+    "women's clothing": 1,
+    'jewelery': 1,
+    'electronics': 1,
+}
+
+# Durability is not needed while loading a throwaway or rebuildable catalog
+FAST_PRAGMAS = (
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',  # 64MB
+)
+
+# Distinct titles and descriptions the synthetic generator picks from
+_TEXT_POOL_BITS = 12
+
+_WORDS = ('cotton', 'slim', 'classic', 'leather', 'wireless', 'silver', 'casual',
+          'rain', 'jacket', 'shirt', 'ring', 'drive', 'monitor', 'backpack', 'dress')
+
+
+class SeedError(ValueError):
+    """Raised when a seed source is unreadable or yields an invalid product."""
+
+
+def synthetic_products(count, seed=0, categories=None):
+    """Yield ``count`` deterministic products.
+
+    ``categories`` maps category names to relative weights. Rows carry no id,
+    so loading them into an empty table numbers them 1 to ``count``.
+    """
+    categories = categories or DEFAULT_CATEGORIES
+    names = list(categories)
+    cumulative = list(accumulate(categories.values()))
+    rng = random.Random(seed)
+
+    # Text is drawn from pregenerated pools: building it per row would cost
+    # more than inserting the row
+    pool_size = 1 << _TEXT_POOL_BITS
+    titles = [' '.join(rng.sample(_WORDS, 3)).title() for _ in range(pool_size)]
+    descriptions = [' '.join(rng.choices(_WORDS, k=20)) for _ in range(pool_size)]
+    uniform, bits = rng.random, rng.getrandbits
+
+    for i in range(1, count + 1):
+        yield {
+            'title': titles[bits(_TEXT_POOL_BITS)],
+            'description': descriptions[bits(_TEXT_POOL_BITS)],
+            'price': round(1 + uniform() * 999, 2),
+            'image': f'https://example.com/images/{i}.jpg',
+            'category': names[bisect.bisect(cumulative, uniform() * cumulative[-1])],
+            'rating_rate': round(1 + uniform() * 4, 1),
+            'rating_count': bits(10) % 1001
+        }
+
+
+def read_products(path):
+    """Stream products from a ``.json`` array, ``.jsonl``/``.ndjson`` or ``.csv`` file.
+
+    Records use either the FakeStore shape (nested ``rating``) or flat
+    ``rating_rate``/``rating_count`` columns. Files are read incrementally,
+    so memory use does not grow with their size.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in ('.jsonl', '.ndjson'):
+        return _read_jsonl(path)
+    if suffix == '.json':
+        return _read_json_array(path)
+    if suffix == '.csv':
+        return _read_csv(path)
+    raise SeedError(f"Unsupported seed file type '{suffix}' (use .json, .jsonl, .ndjson or .csv)")
+
+
+def fakestore_products(url=FAKESTORE_URL):
+    """Yield the sample products of the FakeStore API (needs network access)."""
+    import requests
+
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    yield from response.json()
+
+
+def normalize_product(record, number=None):
+    """Validate one source record and return it as ``product`` column values."""
+    try:
+        rating = record.get('rating') or {}
+        row = {
+            'title': str(record['title']),
+            'description': record.get('description') or None,
+            'price': float(record['price']),
+            'image': record.get('image') or None,
+            'category': record.get('category') or 'uncategorized',
+            'rating_rate': float(record.get('rating_rate') or rating.get('rate') or 0),
+            'rating_count': int(record.get('rating_count') or rating.get('count') or 0)
+        }
+        if record.get('id') not in (None, ''):
+            row['id'] = int(record['id'])
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        where = f'Record {number}' if number is not None else 'Record'
+        raise SeedError(f'{where}: invalid product ({e.__class__.__name__}: {e})')
+    return row
+
+
+def load_products(rows, replace=False, chunk_size=DEFAULT_CHUNK_SIZE, fast=False, defer_indexes=False,
+                  progress=None):
+    """Bulk insert products from an iterable of records; returns how many were loaded.
+
+    Rows are inserted with one executemany per ``chunk_size`` rows, each chunk
+    in its own transaction, so a failure keeps the chunks already committed.
+    ``replace`` deletes existing products, cart lines and stock reservations
+    first; it refuses, raising ``SeedError``, when orders refer to the
+    products, since order lines keep their product id. On SQLite,
+    ``fast`` relaxes durability pragmas for the load, and ``defer_indexes``
+    drops the product indexes and the search and facet triggers, then
+    rebuilds all of them once at the end instead of updating them row by
+    row. ``progress`` is called with the running total after every chunk.
+    """
+    if chunk_size < 1:
+        raise SeedError('chunk_size must be at least 1')
+    sqlite = db.engine.dialect.name == 'sqlite'
+    normalized = (normalize_product(record, number) for number, record in enumerate(rows, 1))
+    loaded = 0
+
+    with db.engine.connect() as connection:
+        if fast and sqlite:
+            for pragma in FAST_PRAGMAS:
+                connection.exec_driver_sql(pragma)
+            connection.commit()
+
+        # One connection for the whole load, so the pragmas stay in effect
+        session = Session(bind=connection)
+        deferred = defer_indexes and sqlite
+        try:
+            if deferred:
+                for statement in search.DROP_DDL + facets.DROP_DDL:
+                    if statement.startswith('DROP TRIGGER'):
+                        session.execute(text(statement))
+                for index in Product.__table__.indexes:
+                    index.drop(session.connection(), checkfirst=True)
+                session.commit()
+            if replace:
+                if session.execute(select(exists().select_from(OrderItem))).scalar():
+                    raise SeedError('Orders refer to the existing products; load with --append '
+                                    'or reset the database to replace them')
+                session.execute(delete(CartItem))
+                session.execute(delete(StockReservation))
+                session.execute(delete(Product))
+                session.commit()
+
+            while True:
+                chunk = list(islice(normalized, chunk_size))
+                if not chunk:
+                    break
+                _insert_chunk(session, chunk)
+                session.commit()
+                loaded += len(chunk)
+                if progress is not None:
+                    progress(loaded)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            if deferred:
+                for index in Product.__table__.indexes:
+                    index.create(session.connection(), checkfirst=True)
+                # Recreates the triggers as well as the index contents
+                search.rebuild_search_index(session)
+                for statement in facets.FACET_DDL:
+                    session.execute(text(statement))
+                facets.rebuild_category_facets(session)
+                # Requests served during the rebuild may have cached empty
+                # facets or search results under the version of the last chunk
+                mark_catalog_changed(session)
+                session.commit()
+            session.close()
+            if fast and sqlite:
+                # Do not hand a connection with relaxed pragmas back to the pool
+                connection.invalidate()
+    return loaded
+
+
+def _insert_chunk(session, chunk):
+    # executemany straight on the DBAPI cursor: ORM and Core parameter
+    # processing would cost more than SQLite spends inserting the rows
+    connection = session.connection()
+    for columns, rows in groupby(chunk, key=tuple):
+        compiled = Product.__table__.insert().compile(dialect=connection.dialect, column_keys=list(columns))
+        rows = list(rows)
+        if compiled.positional:
+            rows = [tuple(row[key] for key in compiled.positiontup) for row in rows]
+        connection.exec_driver_sql(str(compiled), rows)
+    mark_catalog_changed(session)
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise SeedError(f'{path}:{line_number}: invalid JSON ({e})')
+
+
+def _read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def _read_json_array(path, read_size=1 << 16):
+    # Decode one array element at a time from a sliding buffer
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            raise SeedError(f'{path}: a .json seed file must contain an array of products')
+        position = 1
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                if position >= len(buffer):
+                    raise ValueError('buffer exhausted')
+                record, position = decoder.raw_decode(buffer, position)
+            except ValueError as e:
+                if eof:
+                    raise SeedError(f'{path}: invalid or truncated JSON array ({e})')
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield record
@@ -0,0 +1,326 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from flask import current_app
+from loguru import logger
+from sqlalchemy import select
+
+from models.ecommerce.cache import catalog_cache
+from models.ecommerce.catalog import decode_cursor, encode_cursor
+from models.ecommerce.models import db
+from models.ecommerce.schema import PRODUCT_COLUMNS, product_table, serialize_product
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+MAGIC = b'CATSNAP1'
+
+# Snapshot file layout, in native byte order (the file never leaves the host):
+#   header      magic, catalog version, product count and the byte offsets of
+#               the id array, the record offset array and the category table
+#   records     one encoded product JSON object per product, in id order
+#   ids         int64 per product, ascending
+#   offsets     uint64 per product plus one; record i is offsets[i]:offsets[i + 1]
+#   categories  uint64 count, then per category its name length and size
+#               (uint32 each), the UTF-8 name and the uint32 positions of its
+#               products in id order
+# Every section after the records starts on an 8-byte boundary.
+_HEADER = struct.Struct('=8sQQQQQ')
+_HEADER_SIZE = 64
+_COUNT = struct.Struct('=Q')
+_CATEGORY = struct.Struct('=II')
+
+# Rows fetched per round trip while building a snapshot
+BUILD_BATCH_SIZE = 5000
+
+# Seconds between rebuild attempts while another process holds the build lock
+_RETRY_SECONDS = 1.0
+
+
+class SnapshotError(ValueError):
+    """Raised when a file is not a readable catalog snapshot."""
+
+
+def _pad(f, position):
+    padding = -position % 8
+    f.write(bytes(padding))
+    return position + padding
+
+
+def _aligned(position):
+    return position + (-position % 8)
+
+
+def write_snapshot(path, version, rows, dumps):
+    """Write a snapshot of ``rows`` to ``path``, replacing any previous one atomically.
+
+    ``rows`` are ``PRODUCT_COLUMNS`` rows in ascending id order and ``dumps``
+    encodes one serialized product. Readers that mapped the previous file keep
+    it until they remap. Returns the number of products written.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    ids, offsets = array('q'), array('Q')
+    categories = {}
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.catalog-snapshot-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(bytes(_HEADER_SIZE))
+            position = _HEADER_SIZE
+            for row in rows:
+                record = dumps(serialize_product(row)).encode('utf-8')
+                offsets.append(position)
+                category = row[5]
+                if category is not None:
+                    categories.setdefault(category, array('I')).append(len(ids))
+                ids.append(row[0])
+                f.write(record)
+                position += len(record)
+            offsets.append(position)
+
+            ids_offset = position = _pad(f, position)
+            f.write(ids.tobytes())
+            offsets_offset = position = position + len(ids) * ids.itemsize
+            f.write(offsets.tobytes())
+            categories_offset = position = position + len(offsets) * offsets.itemsize
+
+            f.write(_COUNT.pack(len(categories)))
+            position += _COUNT.size
+            for name, positions in categories.items():
+                encoded = name.encode('utf-8')
+                f.write(_CATEGORY.pack(len(encoded), len(positions)))
+                f.write(encoded)
+                position = _pad(f, position + _CATEGORY.size + len(encoded))
+                f.write(positions.tobytes())
+                position = _pad(f, position + len(positions) * positions.itemsize)
+
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, version, len(ids), ids_offset, offsets_offset, categories_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return len(ids)
+
+
+class CatalogSnapshot:
+    """Read-only, memory-mapped catalog snapshot.
+
+    Records are served straight from the mapping, so every process that maps
+    the same file shares one copy of it in the page cache.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < _HEADER_SIZE:
+                raise SnapshotError(f'{path} is too short to be a catalog snapshot')
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Identifies the file mapped, to notice when it has been replaced
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, self.version, count, ids_offset, offsets_offset, categories_offset = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise SnapshotError(f'{path} is not a catalog snapshot')
+        view = memoryview(self._mmap)
+        self._view = view
+        self.ids = view[ids_offset:ids_offset + 8 * count].cast('q')
+        self.offsets = view[offsets_offset:offsets_offset + 8 * (count + 1)].cast('Q')
+
+        self.categories = {}
+        (category_count,) = _COUNT.unpack_from(self._mmap, categories_offset)
+        position = categories_offset + _COUNT.size
+        for _ in range(category_count):
+            name_length, size = _CATEGORY.unpack_from(self._mmap, position)
+            position += _CATEGORY.size
+            name = bytes(view[position:position + name_length]).decode('utf-8')
+            position = _aligned(position + name_length)
+            self.categories[name] = view[position:position + 4 * size].cast('I')
+            position = _aligned(position + 4 * size)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, position):
+        """The encoded product at ``position``, as a view into the mapping."""
+        return self._view[self.offsets[position]:self.offsets[position + 1]]
+
+    def get(self, product_id):
+        """Return the encoded product with ``product_id``, or ``None``."""
+        position = bisect_left(self.ids, product_id)
+        if position < len(self.ids) and self.ids[position] == product_id:
+            return bytes(self.record(position))
+        return None
+
+    def page(self, category=None, after_id=None, limit=12):
+        """Return up to ``limit`` encoded products in id order after ``after_id``.
+
+        Returns ``(records, last_id, more)``; ``more`` tells whether another
+        page follows.
+        """
+        start = 0 if after_id is None else bisect_right(self.ids, after_id)
+        if category is None:
+            positions = range(start, min(start + limit + 1, len(self.ids)))
+        else:
+            in_category = self.categories.get(category)
+            if in_category is None:
+                return [], None, False
+            first = bisect_left(in_category, start)
+            positions = in_category[first:first + limit + 1]
+
+        more = len(positions) > limit
+        positions = positions[:limit]
+        records = [self.record(position) for position in positions]
+        last_id = self.ids[positions[-1]] if len(positions) else None
+        return records, last_id, more
+
+
+class SnapshotStore:
+    """Serves catalog reads from a snapshot file shared by every worker process.
+
+    A snapshot is valid while its version matches the catalog version. When a
+    worker finds it stale, it rebuilds it in a background thread; an exclusive
+    lock next to the file makes sure only one process builds at a time, and
+    requests fall back to SQL meanwhile. A finished build is renamed over the
+    previous file, and every worker remaps it on its next read.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.auto_rebuild = True
+        self.path = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._building = False
+        self._retry_at = 0.0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CATALOG_SNAPSHOT_ENABLED', False)
+        self.path = str(app.config.get('CATALOG_SNAPSHOT_PATH', 'instance/catalog.snap'))
+        self.auto_rebuild = app.config.get('CATALOG_SNAPSHOT_AUTO_REBUILD', True)
+        self._snapshot = None
+        if self.enabled and catalog_cache.version.path is None:
+            raise ValueError('CATALOG_SNAPSHOT_ENABLED requires CATALOG_VERSION_FILE')
+        app.extensions['catalog_snapshot'] = self
+
+    def current(self):
+        """Return the snapshot of the current catalog version, or ``None`` to use SQL."""
+        if not self.enabled:
+            return None
+        version = catalog_cache.version.current()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = self._remap()
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        if self.auto_rebuild:
+            self._rebuild_in_background()
+        return None
+
+    def products_page(self, secret_key, filters):
+        """Encoded ``/api/products`` page for ``filters``, or ``None`` when SQL must serve it.
+
+        Only id-ordered pages without price filters are served from a snapshot.
+        """
+        if filters['sort'] != 'id' or filters['min_price'] is not None or filters['max_price'] is not None:
+            return None
+        snapshot = self.current()
+        if snapshot is None:
+            return None
+
+        after_id = None
+        if filters['cursor'] is not None:
+            _, after_id = decode_cursor(secret_key, filters['cursor'], 'id')
+        records, last_id, more = snapshot.page(filters['category'], after_id, filters['limit'])
+        next_cursor = encode_cursor(secret_key, 'id', last_id, last_id) if more else None
+        return b''.join((
+            b'{"items":[', b','.join(records),
+            b'],"next_cursor":', current_app.json.dumps(next_cursor).encode('utf-8'),
+            b',"limit":', str(filters['limit']).encode('ascii'), b'}'
+        ))
+
+    def rebuild(self):
+        """Build a snapshot of the current catalog.
+
+        Returns the version built, or ``None`` when another process holds the
+        build lock.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+
+            # Read before the rows: a write committed meanwhile leaves the
+            # snapshot labelled with an older version, so it is rebuilt again
+            version = catalog_cache.version.current()
+            snapshot = self._remap()
+            if snapshot is not None and snapshot.version == version:
+                return version
+
+            started = time.perf_counter()
+            try:
+                rows = db.session.execute(
+                    select(*PRODUCT_COLUMNS).order_by(product_table.c.id)
+                    .execution_options(yield_per=BUILD_BATCH_SIZE)
+                )
+                count = write_snapshot(self.path, version, rows, current_app.json.dumps)
+            finally:
+                db.session.rollback()
+        logger.info("Built catalog snapshot version {} ({} products) in {:.1f}s",
+                    version, count, time.perf_counter() - started)
+        self._remap()
+        return version
+
+    def _remap(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.identity != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                try:
+                    snapshot = self._snapshot = CatalogSnapshot(self.path)
+                except (OSError, SnapshotError) as e:
+                    logger.warning("Cannot map catalog snapshot {}: {}", self.path, e)
+                    return None
+            return snapshot
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._building or time.monotonic() < self._retry_at:
+                return
+            self._building = True
+        app = current_app._get_current_object()
+        threading.Thread(target=self._background_rebuild, args=(app,), name='catalog-snapshot', daemon=True).start()
+
+    def _background_rebuild(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            logger.warning("Catalog snapshot rebuild failed: {}", e)
+        finally:
+            with self._lock:
+                self._building = False
+                self._retry_at = time.monotonic() + _RETRY_SECONDS
+
+
+catalog_snapshot = SnapshotStore()
@@ -0,0 +1,33 @@
+from itertools import islice
+
+# Items encoded per chunk written to the client
+CHUNK_ITEMS = 500
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def json_array_chunks(items, dumps, prefix='[', suffix=']', chunk_items=CHUNK_ITEMS):
+    """Yield ``prefix``, the comma-separated JSON of ``items`` and ``suffix`` as text chunks.
+
+    Only ``chunk_items`` encoded items are held at a time, so a response built
+    from a streamed query never materializes the whole document.
+    """
+    yield prefix
+    separator = ''
+    for chunk in _chunks(items, chunk_items):
+        yield separator + ','.join(map(dumps, chunk))
+        separator = ','
+    yield suffix
+
+
+def ndjson_chunks(items, dumps, chunk_items=CHUNK_ITEMS):
+    """Yield ``items`` as newline-delimited JSON, ``chunk_items`` lines per chunk."""
+    for chunk in _chunks(items, chunk_items):
+        yield ''.join(dumps(item) + '\n' for item in chunk)
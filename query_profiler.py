@@ -0,0 +1,161 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from loguru import logger
+from sqlalchemy import event
+
+from models.ecommerce.models import db
+
+# Literals and bind placeholders of every DBAPI paramstyle become '?'
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+')
+# IN lists expanded to a varying number of placeholders count as one shape
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in testing mode when a request runs more statements than allowed."""
+
+
+def normalize_statement(statement):
+    """Reduce a SQL statement to its shape, without literals or bind values."""
+    statement = _PLACEHOLDERS.sub('?', _LITERALS.sub('?', statement))
+    return ' '.join(_IN_LISTS.sub('(?)', statement).split())
+
+
+def parameter_shape(parameters, executemany=False):
+    """Describe bound parameters by type only, so values never reach the logs."""
+    if executemany:
+        if not parameters:
+            return '[]'
+        return f'{len(parameters)} x {parameter_shape(parameters[0])}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+
+def query_budget(max_queries):
+    """Declare the most statements one request to the decorated view may run.
+
+    ``max_queries`` may also be a callable, called once the view returned,
+    for views whose statement count grows with what the request touched.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+@contextmanager
+def assert_max_queries(max_queries, engine=None):
+    """Fail with ``QueryBudgetExceeded`` if the block runs more than ``max_queries`` statements.
+
+    Yields the list of statements run so far. Needs an application context
+    unless ``engine`` is given.
+    """
+    engine = engine if engine is not None else db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(
+            f'{len(statements)} statements run, budget is {max_queries}:\n' + '\n'.join(statements)
+        )
+
+
+class QueryProfiler:
+    """Opt-in SQL profiler for the application's engines.
+
+    Logs statements slower than ``SQL_SLOW_QUERY_MS`` with their parameter
+    shape and endpoint, and warns when one request runs the same SELECT more
+    than ``SQL_N_PLUS_ONE_THRESHOLD`` times. In testing mode, both an N+1 and a
+    request over its view's ``query_budget`` raise ``QueryBudgetExceeded``.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 100.0
+        self.n_plus_one_threshold = 10
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SQL_PROFILER_ENABLED', False)
+        self.slow_query_ms = app.config.get('SQL_SLOW_QUERY_MS', 100.0)
+        self.n_plus_one_threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 10)
+        app.extensions['query_profiler'] = self
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.sql_statements = Counter()
+
+    def _after_request(self, response):
+        statements = g.pop('sql_statements', None)
+        if statements is None:
+            return response
+
+        strict = current_app.testing
+        for statement, count in statements.items():
+            if count > self.n_plus_one_threshold and statement.startswith('SELECT'):
+                message = f'Possible N+1 in {request.endpoint}: statement ran {count} times: {statement}'
+                if strict:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if callable(budget):
+            budget = budget()
+        total = sum(statements.values())
+        if budget is not None and total > budget:
+            message = f'{request.endpoint} ran {total} statements, budget is {budget}'
+            if strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profiler_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_profiler_started', None)
+        elapsed_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        in_request = has_request_context()
+
+        if in_request:
+            statements = g.get('sql_statements')
+            if statements is not None:
+                statements[normalize_statement(statement)] += 1
+
+        if elapsed_ms >= self.slow_query_ms:
+            logger.bind(
+                duration_ms=round(elapsed_ms, 3),
+                endpoint=request.endpoint if in_request else None
+            ).warning(
+                "Slow query ({:.1f}ms) in {}: {} parameters {}",
+                elapsed_ms,
+                request.endpoint if in_request else '<no request>',
+                ' '.join(statement.split()),
+                parameter_shape(parameters, executemany)
+            )
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,160 @@
+import os
+import threading
+
+from flask import current_app, render_template
+from jinja2 import meta, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from models.ecommerce.cache import encoded_response, make_etag
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'name' %}...{% endcache %}`` renders its body once and reuses it.
+
+    The body must not depend on the request or on template variables: it is
+    keyed only by fragment name and the render cache's key (template mtimes,
+    config hash and registered dependencies). Names should be literals.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(render_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression(), nodes.Const(parser.name)]
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached', args), [], [], body).set_lineno(lineno)
+
+    def _cached(self, name, template_name, caller):
+        cache = self.environment.render_cache
+        if cache is None or not cache.enabled:
+            return caller()
+        return cache.fragment(template_name, name, caller)
+
+
+class RenderCache:
+    """Caches rendered templates that do not depend on the request.
+
+    Full pages, for templates rendered without context, are kept with a
+    strong ETag and served without running Jinja. Fragments of other
+    templates, marked with ``{% cache %}``, are kept as markup. Both are
+    rebuilt when the key they were rendered under changes: the mtimes of the
+    template and of every template it extends, includes or imports, a hash
+    of the app config, and the values of the functions registered with
+    ``depends_on``. Pages holding a CSRF token or flashed messages must not be
+    cached as a whole.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._pages = {}
+        self._fragments = {}
+        self._dependencies = []
+        self._sources = {}
+        self._config_hash = None
+        self._config_values = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RENDER_CACHE_ENABLED', True)
+        self._dependencies = []
+        self.clear()
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.render_cache = self
+        app.extensions['render_cache'] = self
+
+    def depends_on(self, function):
+        """Rebuild cached renders whenever ``function()`` returns a new value."""
+        self._dependencies.append(function)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._fragments.clear()
+            self._sources.clear()
+            self._config_hash = None
+            self._config_values = None
+
+    def page(self, template_name):
+        """Response with ``template_name`` rendered without context.
+
+        Revalidations with ``If-None-Match`` are answered with 304.
+        """
+        if not self.enabled:
+            return render_template(template_name)
+        key = self._key(template_name)
+        entry = self._pages.get(template_name)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+        else:
+            self.misses += 1
+            body = render_template(template_name).encode('utf-8')
+            entry = self._pages[template_name] = (key, body, make_etag(body))
+        return encoded_response(entry[1], entry[2], mimetype='text/html')
+
+    def fragment(self, template_name, name, render):
+        """Cached markup of fragment ``name`` of ``template_name``, rendered by ``render()`` on a miss."""
+        key = self._key(template_name)
+        entry = self._fragments.get((template_name, name))
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        markup = Markup(render())
+        self._fragments[(template_name, name)] = (key, markup)
+        return markup
+
+    def _key(self, template_name):
+        # Comparing with a shallow copy is cheap, since unchanged values are
+        # the same objects; the hash is only recomputed when a setting is
+        # assigned a new value
+        config = current_app.config
+        if self._config_hash is None or config != self._config_values:
+            self._config_values = dict(config)
+            text = repr(sorted((name, repr(value)) for name, value in config.items()))
+            self._config_hash = make_etag(text.encode('utf-8'))
+        return (self._config_hash, self._template_mtimes(template_name),
+                tuple(function() for function in self._dependencies))
+
+    def _template_mtimes(self, template_name):
+        # mtimes of the files of a template and of the templates it references.
+        # References are read again when any file changes, since an edit may
+        # add or remove some
+        cached = self._sources.get(template_name)
+        if cached is not None:
+            files, mtimes = cached
+            if _mtimes(files) == mtimes:
+                return mtimes
+        env = current_app.jinja_env
+        files, pending, seen = [], [template_name], set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            source, filename, _ = env.loader.get_source(env, name)
+            if filename is not None:
+                files.append(filename)
+            pending.extend(ref for ref in meta.find_referenced_templates(env.parse(source)) if ref)
+        mtimes = _mtimes(files)
+        self._sources[template_name] = (files, mtimes)
+        return mtimes
+
+
+def _mtimes(paths):
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+render_cache = RenderCache()
@@ -0,0 +1,250 @@
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from flask import g, jsonify, request, send_from_directory
+from itsdangerous import BadSignature, TimestampSigner
+from loguru import logger
+
+# Header carrying a signed token that profiles one request on demand
+PROFILE_HEADER = 'X-Profile-Request'
+
+_TOKEN_SALT = 'request-profile'
+_TOKEN_VALUE = 'profile'
+
+
+def profile_token(secret_key):
+    """Return a token that enables profiling when sent in ``X-Profile-Request``."""
+    return TimestampSigner(secret_key, salt=_TOKEN_SALT).sign(_TOKEN_VALUE).decode('ascii')
+
+
+def verify_profile_token(secret_key, token, max_age):
+    if not token:
+        return False
+    try:
+        return TimestampSigner(secret_key, salt=_TOKEN_SALT).unsign(token, max_age=max_age) == _TOKEN_VALUE.encode()
+    except BadSignature:
+        return False
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread every ``interval`` seconds.
+
+    Samples are counted per distinct stack of ``(function, file, first line)``
+    frames, root first, so the cost per sample is one frame walk.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+def _frame_name(frame):
+    name, filename, line = frame
+    try:
+        filename = os.path.relpath(filename)
+    except ValueError:
+        pass
+    return f'{name} ({filename}:{line})'
+
+
+def write_collapsed(path, samples):
+    """Write samples as collapsed stacks (``root;...;leaf count``), as read by flamegraph.pl."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(';'.join(_frame_name(frame).replace(';', ':') for frame in stack) + f' {count}\n')
+
+
+def write_speedscope(path, samples, name, interval_ms, duration_ms):
+    """Write samples as a speedscope sampled profile (https://www.speedscope.app)."""
+    frames, index = [], {}
+    stacks, weights = [], []
+    for stack, count in samples.items():
+        indices = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+            indices.append(index[frame])
+        stacks.append(indices)
+        weights.append(count * interval_ms)
+
+    document = {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'request_profiler',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': duration_ms,
+            'samples': stacks,
+            'weights': weights
+        }]
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f)
+
+
+_WRITERS = {
+    'collapsed': ('.collapsed.txt', write_collapsed),
+    'speedscope': ('.speedscope.json', write_speedscope),
+}
+
+
+class RequestProfiler:
+    """Samples the stacks of selected requests and writes one profile per request.
+
+    A request is profiled when it carries a valid signed ``X-Profile-Request``
+    token, or at random with probability ``PROFILER_SAMPLE_RATE``. Profiles
+    go to ``PROFILER_DIR`` with a ``.meta.json`` file describing the request;
+    only the ``PROFILER_KEEP`` most recent are kept.
+    """
+
+    def __init__(self):
+        self.enabled = False
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILER_ENABLED', False)
+        self.directory = Path(app.config.get('PROFILER_DIR', 'logs/profiles')).resolve()
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+        self.interval_ms = app.config.get('PROFILER_INTERVAL_MS', 5.0)
+        self.format = app.config.get('PROFILER_FORMAT', 'speedscope')
+        self.keep = app.config.get('PROFILER_KEEP', 100)
+        self.token_max_age = app.config.get('PROFILER_TOKEN_MAX_AGE', 3600)
+        if self.format not in _WRITERS:
+            raise ValueError(f"Unknown PROFILER_FORMAT '{self.format}'")
+        app.extensions['request_profiler'] = self
+        if not self.enabled:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._secret_key = app.config['SECRET_KEY']
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/debug/profiles', 'profiles_index', self._index_view)
+        app.add_url_rule('/debug/profiles/<path:filename>', 'profiles_file', self._file_view)
+
+    def authorized(self, token):
+        return verify_profile_token(self._secret_key, token, self.token_max_age)
+
+    def recent_profiles(self, limit=50):
+        """Describe the most recent profiles, newest first."""
+        profiles = []
+        for meta_path in self._meta_files()[:limit]:
+            try:
+                profiles.append(json.loads(meta_path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                # Pruned by another worker, or still being written
+                continue
+        return profiles
+
+    def _index_view(self):
+        """List recent profiles with their route and duration."""
+        if not self.authorized(request.headers.get(PROFILE_HEADER) or request.args.get('token')):
+            return jsonify({'status': 'error', 'message': 'A valid profile token is required'}), 403
+        return jsonify({'profiles': self.recent_profiles()})
+
+    def _file_view(self, filename):
+        if not self.authorized(request.headers.get(PROFILE_HEADER) or request.args.get('token')):
+            return jsonify({'status': 'error', 'message': 'A valid profile token is required'}), 403
+        return send_from_directory(self.directory, filename)
+
+    def _before_request(self):
+        if request.endpoint in ('profiles_index', 'profiles_file'):
+            return
+        if not (self.authorized(request.headers.get(PROFILE_HEADER))
+                or (self.sample_rate and random.random() < self.sample_rate)):
+            return
+        g.profile_sampler = StackSampler(threading.get_ident(), self.interval_ms / 1000)
+        g.profile_started = time.perf_counter()
+        g.profile_sampler.start()
+
+    def _after_request(self, response):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return response
+        samples = sampler.stop()
+        duration_ms = (time.perf_counter() - g.profile_started) * 1000
+        try:
+            response.headers['X-Profile'] = self._write(samples, duration_ms, response.status_code)
+        except OSError as e:
+            logger.warning("Failed to write request profile: {}", e)
+        return response
+
+    def _teardown_request(self, exc):
+        # The request failed before after_request could stop the sampler
+        sampler = g.pop('profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    def _write(self, samples, duration_ms, status):
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{secrets.token_hex(4)}"
+        suffix, writer = _WRITERS[self.format]
+        filename = stem + suffix
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        name = f'{request.method} {route}'
+        if self.format == 'speedscope':
+            writer(self.directory / filename, samples, name, self.interval_ms, duration_ms)
+        else:
+            writer(self.directory / filename, samples)
+
+        meta = {
+            'file': filename,
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round(duration_ms, 3),
+            'samples': sum(samples.values()),
+            'created': time.time()
+        }
+        (self.directory / f'{stem}.meta.json').write_text(json.dumps(meta), encoding='utf-8')
+        self._prune()
+        logger.info("Profiled {} in {:.1f}ms: {}", name, duration_ms, filename)
+        return filename
+
+    def _meta_files(self):
+        def mtime(path):
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return 0
+        return sorted(self.directory.glob('*.meta.json'), key=mtime, reverse=True)
+
+    def _prune(self):
+        for meta_path in self._meta_files()[self.keep:]:
+            stem = meta_path.name[:-len('.meta.json')]
+            for path in self.directory.glob(f'{stem}.*'):
+                path.unlink(missing_ok=True)
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,178 @@
+from functools import wraps
+
+from flask import current_app
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from models.ecommerce.models import db
+
+# Bind key of the engine serving read-only views
+READ_BIND = 'read'
+
+# Session.info flag set while a read-only view runs
+_READ_ONLY = 'storage_read_only'
+
+# Per-connection SQLite pragmas of each storage profile, applied in this order
+PROFILES = {
+    # WAL lets readers and the writer proceed concurrently; NORMAL sync is
+    # crash-safe in WAL mode and only risks the last commits on power loss
+    'balanced': (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', '5000'),
+        ('mmap_size', str(256 * 1024 * 1024)),
+        ('cache_size', str(-32 * 1024)),  # KiB
+        ('temp_store', 'MEMORY'),
+    ),
+    # Every commit is synced to disk before it returns
+    'durable': (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'FULL'),
+        ('busy_timeout', '5000'),
+    ),
+    # SQLite's own defaults
+    'default': (),
+}
+
+
+# Engine pool options and the settings they are read from; they apply to the
+# read engine as well
+POOL_OPTIONS = {
+    'pool_size': 'DB_POOL_SIZE',
+    'max_overflow': 'DB_MAX_OVERFLOW',
+    'pool_timeout': 'DB_POOL_TIMEOUT',
+    'pool_recycle': 'DB_POOL_RECYCLE',
+    'pool_pre_ping': 'DB_POOL_PRE_PING',
+}
+
+
+class StorageError(ValueError):
+    """Raised for an unknown storage profile or malformed pragma list."""
+
+
+def parse_pragmas(text):
+    """Parse ``"name=value,name=value"`` into ``(name, value)`` pairs."""
+    pragmas = []
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, sep, value = item.partition('=')
+        name, value = name.strip().lower(), value.strip()
+        if not sep or not name.replace('_', '').isalnum() or not value.replace('-', '').replace('_', '').isalnum():
+            raise StorageError(f'Malformed SQLite pragma {item!r}')
+        pragmas.append((name, value))
+    return pragmas
+
+
+def read_only(view):
+    """Run the reads of a view, textual SQL included, on the read engine, when there is one.
+
+    The view must not write: on SQLite the read engine refuses writes, and a
+    replica may lag the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        info = db.session.info
+        info[_READ_ONLY] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            info.pop(_READ_ONLY, None)
+    return wrapper
+
+
+class Storage:
+    """Engine configuration: SQLite pragmas, pool sizing and read routing.
+
+    ``init_app`` must run before ``db.init_app``, since it fills in
+    ``SQLALCHEMY_ENGINE_OPTIONS`` and ``SQLALCHEMY_BINDS``; ``init_engines``
+    after it, to hook the pragmas onto the engines it created.
+
+    The pragmas of ``STORAGE_PROFILE``, with ``SQLITE_PRAGMAS`` overrides, are
+    set on every new SQLite connection. Views decorated with ``read_only`` run
+    their SELECTs on a ``read`` bind: ``DATABASE_READ_URL`` (a replica) when
+    set, otherwise, for a SQLite file, a second pool on the same file whose
+    connections are ``query_only``. With WAL, catalog reads then neither wait
+    on cart writers for the database nor for a pooled connection.
+    """
+
+    def __init__(self):
+        self.pragmas = ()
+        self.read_engine = None
+
+    def init_app(self, app):
+        profile = app.config.get('STORAGE_PROFILE', 'balanced')
+        if profile not in PROFILES:
+            raise StorageError(f"Unknown storage profile '{profile}', expected one of {', '.join(PROFILES)}")
+        pragmas = dict(PROFILES[profile])
+        pragmas.update(parse_pragmas(app.config.get('SQLITE_PRAGMAS', '')))
+        self.pragmas = tuple(pragmas.items())
+        self.read_engine = None
+
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        pool = {option: app.config[setting] for option, setting in POOL_OPTIONS.items()
+                if app.config.get(setting) is not None}
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        if not _in_memory(url):
+            # Memory databases get a single static connection instead
+            for option, value in pool.items():
+                options.setdefault(option, value)
+
+        read_url = app.config.get('DATABASE_READ_URL') or None
+        if read_url is None and app.config.get('READ_ENGINE_ENABLED', True) \
+                and url.get_backend_name() == 'sqlite' and not _in_memory(url):
+            read_url = url.render_as_string(hide_password=False)
+        if read_url is not None:
+            # Binds do not inherit SQLALCHEMY_ENGINE_OPTIONS
+            read_options = dict(pool, url=read_url)
+            if make_url(read_url).get_backend_name() == 'postgresql':
+                read_options['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+            app.config.setdefault('SQLALCHEMY_BINDS', {})[READ_BIND] = read_options
+        app.extensions['storage'] = self
+
+    def init_engines(self, app):
+        with app.app_context():
+            engines = dict(db.engines)
+        for key, engine in engines.items():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', self._sqlite_pragmas(read=key == READ_BIND))
+        self.read_engine = engines.get(READ_BIND)
+        if self.read_engine is not None:
+            logger.info(f"Read-only views use the '{READ_BIND}' engine: {self.read_engine.url!r}")
+
+    def _sqlite_pragmas(self, read):
+        # journal_mode is a property of the database file, set by the primary;
+        # query_only makes read connections refuse writes
+        statements = [f'PRAGMA {name} = {value}' for name, value in self.pragmas
+                      if not (read and name == 'journal_mode')]
+        if read:
+            statements.append('PRAGMA query_only = ON')
+
+        def on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+            finally:
+                cursor.close()
+        return on_connect
+
+
+def _in_memory(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+storage = Storage()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _route_reads(orm_execute_state):
+    # Textual statements, like the FTS5 search, are neither selects nor DML
+    # to the ORM; read-only views do not write, so they are routed as reads
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete or not state.session.info.get(_READ_ONLY):
+        return
+    extension = current_app.extensions.get('storage')
+    engine = extension.read_engine if extension is not None else None
+    if engine is not None and 'bind' not in state.bind_arguments:
+        state.bind_arguments['bind'] = engine
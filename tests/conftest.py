@@ -1,24 +1,35 @@
 import os
+import shutil
 import sys
 import tempfile
 import pytest
+from sqlalchemy import event
 
 # Add the parent directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# The database engine and log sinks are created when app.py is imported, so the
+# test database and log file must be configured before that import happens
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ['LOG_FILE'] = os.path.join(tempfile.gettempdir(), 'ecommerce-test.log')
+os.environ['CATALOG_VERSION_FILE'] = f'{_db_path}.version'
+# Fail any test whose requests trigger an N+1 or go over a view's query budget
+os.environ['SQL_PROFILER_ENABLED'] = 'True'
+os.environ['PROFILER_ENABLED'] = 'True'
+os.environ['PROFILER_DIR'] = tempfile.mkdtemp(prefix='ecommerce-profiles-')
+os.environ['METRICS_TOKEN'] = 'test-metrics-token'
+
 from app import create_app, db
 from models.ecommerce.models import Product
 
 @pytest.fixture(scope='module')
 def test_app():
     """Create and configure a new app instance for testing."""
-    # Create a temporary file for the database
-    db_fd, db_path = tempfile.mkstemp()
-    
     # Create a test config
     class TestConfig:
         TESTING = True
-        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{_db_path}'
         SQLALCHEMY_TRACK_MODIFICATIONS = False
         WTF_CSRF_ENABLED = False
     
@@ -31,10 +42,6 @@ def test_app():
         db.create_all()
         
     yield app
-    
-    # Clean up after testing
-    os.close(db_fd)
-    os.unlink(db_path)
 
 @pytest.fixture(scope='module')
 def client(test_app):
@@ -76,3 +83,34 @@ def init_database(test_app):
     with test_app.app_context():
         db.session.remove()
         db.drop_all()
+
+
+@pytest.fixture
+def statements(test_app):
+    """Record every SQL statement sent to the database."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    # Including the read engine of the read-only views
+    with test_app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    for engine in engines:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Remove the temporary test database."""
+    os.close(_db_fd)
+    os.unlink(_db_path)
+    # WAL mode files
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(_db_path + suffix):
+            os.unlink(_db_path + suffix)
+    if os.path.exists(f'{_db_path}.version'):
+        os.unlink(f'{_db_path}.version')
+    shutil.rmtree(os.environ['PROFILER_DIR'], ignore_errors=True)
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from assets import BUNDLES, DIST_DIR, IMMUTABLE_MAX_AGE, AssetError, assets, build_assets, minify_js
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def source_tree(tmp_path):
+    """A project root holding copies of the component scripts, without vendor scripts."""
+    for source in BUNDLES['catalog.js'] + BUNDLES['cart.js']:
+        (tmp_path / source).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(ROOT_DIR / source, tmp_path / source)
+    return tmp_path
+
+
+def test_minify_keeps_strings_regexes_and_line_breaks():
+    source = (
+        "// leading comment\n"
+        "const url = '/api/products'; // trailing comment\n"
+        "    /* block\n       comment */\n"
+        "const pattern = /\\/\\/[a-z/]+/g;\n\n\n"
+        "const ratio = total / count / 2;\n"
+        "const text = `line one\n    // not a comment`;\n"
+        "function f() {\n    return /'/.test(url);\n}\n"
+    )
+    assert minify_js(source) == (
+        "const url = '/api/products';\n"
+        "const pattern = /\\/\\/[a-z/]+/g;\n"
+        "const ratio = total / count / 2;\n"
+        "const text = `line one\n    // not a comment`;\n"
+        "function f() {\n"
+        "return /'/.test(url);\n"
+        "}\n"
+    )
+
+
+def test_build_writes_hashed_bundles_and_manifest(source_tree):
+    manifest = build_assets(source_tree)
+    # Vendor scripts have not been fetched
+    assert set(manifest) == {'catalog.js', 'cart.js'}
+    dist = source_tree / 'static' / DIST_DIR
+    assert json.loads((dist / 'manifest.json').read_text()) == manifest
+    cart = source_tree / 'static' / manifest['cart.js']
+    assert cart.name.startswith('cart.') and cart.suffix == '.js'
+    assert len(cart.read_bytes()) < os.path.getsize(source_tree / BUNDLES['cart.js'][0])
+    assert (dist / f'{cart.name}.gz').exists()
+
+    # Unchanged sources give the same names; a changed one a new name
+    assert build_assets(source_tree) == manifest
+    with open(source_tree / BUNDLES['cart.js'][0], 'a') as f:
+        f.write('console.log("changed");\n')
+    rebuilt = build_assets(source_tree)
+    assert rebuilt['cart.js'] != manifest['cart.js'] and rebuilt['catalog.js'] == manifest['catalog.js']
+    # The previous build is kept for pages rendered before it, older ones are removed
+    assert cart.exists()
+    with open(source_tree / BUNDLES['cart.js'][0], 'a') as f:
+        f.write('console.log("changed again");\n')
+    build_assets(source_tree)
+    assert not cart.exists() and not (dist / f'{cart.name}.gz').exists()
+
+
+def test_build_fails_on_missing_component(source_tree):
+    os.unlink(source_tree / BUNDLES['cart.js'][0])
+    with pytest.raises(AssetError, match='cart.js'):
+        build_assets(source_tree)
+
+
+def test_build_script_survives_an_offline_vendor_fetch(source_tree, monkeypatch, capsys):
+    from instance.scripts import build_assets as script
+
+    def offline():
+        raise OSError('Network is unreachable')
+
+    monkeypatch.setattr(script, 'fetch_vendor', offline)
+    monkeypatch.setattr(script, 'build_assets', lambda: build_assets(source_tree))
+    assert script.main(['--fetch-vendor']) == 0
+    err = capsys.readouterr().err
+    assert 'Could not fetch the vendor scripts: Network is unreachable' in err
+    assert 'vendor.js not built' in err
+
+
+def test_templates_use_hashed_urls_once_built(client, init_database, tmp_path, monkeypatch):
+    page = client.get('/cart').get_data(as_text=True)
+    assert '/static/ecommerce/components/cart.vue' in page
+    assert 'https://unpkg.com/vue@3.2.47/dist/vue.global.prod.js' in page
+
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps({'cart.js': 'dist/cart.0123456789ab.js', 'vendor.js': 'dist/vendor.ba9876543210.js'}))
+    monkeypatch.setattr(assets, 'manifest_path', str(manifest))
+    page = client.get('/cart').get_data(as_text=True)
+    assert '/static/dist/cart.0123456789ab.js' in page
+    assert '/static/dist/vendor.ba9876543210.js' in page
+    assert 'unpkg.com' not in page and 'cart.vue"' not in page
+
+
+def test_hashed_files_are_served_immutable(client, test_app):
+    dist = Path(test_app.static_folder) / DIST_DIR
+    dist.mkdir(parents=True, exist_ok=True)
+    path = dist / 'test-bundle.0123456789ab.js'
+    path.write_text('console.log(1);\n')
+    try:
+        response = client.get(f'/static/{DIST_DIR}/{path.name}')
+        assert response.status_code == 200
+        assert response.cache_control.immutable
+        assert response.cache_control.max_age == IMMUTABLE_MAX_AGE
+        response.close()
+
+        response = client.get('/static/ecommerce/components/cart.vue')
+        assert not response.cache_control.immutable
+        response.close()
+    finally:
+        path.unlink()
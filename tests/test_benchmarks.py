@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.bench_logging import MODES, overheads
+from benchmarks.compare import compare_results
+from benchmarks.load_test import Shopper, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _run(**cases):
+    return {'results': {
+        name: {'median_us': median_us, 'sql_statements': statements}
+        for name, (median_us, statements) in cases.items()
+    }}
+
+
+def test_compare_flags_slowdowns_and_extra_statements():
+    baseline = _run(products=(100.0, 1), cart=(200.0, 2), checkout=(300.0, 3))
+    current = _run(products=(115.0, 1), cart=(260.0, 2), checkout=(290.0, 4), search=(50.0, 1))
+
+    rows = {row['case']: row for row in compare_results(baseline, current, threshold=0.2)}
+
+    assert set(rows) == {'products', 'cart', 'checkout'}
+    assert not rows['products']['regressed']
+    assert rows['cart']['regressed']
+    assert rows['checkout']['regressed']
+
+
+def test_load_report_percentiles_and_errors():
+    records = [('GET /api/cart', ms / 1000, ms != 100, False) for ms in range(1, 101)]
+    records.append(('POST /checkout', 0.5, False, True))
+
+    report = summarize(records, elapsed=10)
+
+    cart = report['requests']['GET /api/cart']
+    assert (cart['p50_ms'], cart['p95_ms'], cart['p99_ms']) == (50, 95, 99)
+    assert cart['error_rate'] == 0.01
+    assert report['total']['requests'] == 101
+    assert report['total']['throughput_rps'] == 10.1
+    assert report['total']['server_errors'] == 1
+
+
+def test_load_checkout_counts_only_placed_orders():
+    shopper = Shopper('http://shop', {'checkout': 1}, deadline=0, seed=0, products=1, think_time=0)
+    answers = iter([(302, 'http://shop/'), (302, 'http://shop/cart'), (200, None), (500, None)])
+
+    def answer(*args, **kwargs):
+        status, location = next(answers)
+        return SimpleNamespace(status_code=status, headers={'Location': location} if location else {})
+
+    shopper.session.request = answer
+    for _ in range(4):
+        shopper.request('POST /checkout', 'POST', '/checkout', expect=302, location='/')
+
+    assert [(ok, server_error) for _, _, ok, server_error in shopper.records] == [
+        (True, False), (False, False), (False, False), (False, True)
+    ]
+
+
+def test_logging_overhead_is_relative_to_no_logging():
+    results = overheads({'none': {'median_us': 100.0}, 'text': {'median_us': 180.0}, 'json': {'median_us': 130.0}})
+    assert [results[mode]['overhead_us'] for mode in MODES] == [0.0, 80.0, 30.0]
+
+
+def test_logging_benchmark_measures_every_mode(tmp_path):
+    # A separate process: the benchmark reconfigures the global loguru logger
+    output = tmp_path / 'logging.json'
+    subprocess.run([sys.executable, str(ROOT / 'benchmarks' / 'bench_logging.py'), '--requests', '20',
+                    '--repeat', '1', '--output', str(output)], check=True, capture_output=True, cwd=tmp_path)
+    results = json.loads(output.read_text())['results']
+    assert set(results) == set(MODES)
+    assert all(result['median_us'] > 0 for result in results.values())
@@ -0,0 +1,160 @@
+import pytest
+
+from models.ecommerce.models import db, CartItem
+
+
+CART_ID = 'test-cart'
+
+
+def fill_cart(client, test_app, lines):
+    """Put the first ``lines`` test products in the client's session cart."""
+    with client.session_transaction() as sess:
+        sess['cart_id'] = CART_ID
+    with test_app.app_context():
+        CartItem.query.delete()
+        db.session.add_all([CartItem(cart_id=CART_ID, product_id=i, quantity=i) for i in range(1, lines + 1)])
+        db.session.commit()
+
+
+def test_get_cart_returns_lines_with_products(client, test_app, init_database):
+    fill_cart(client, test_app, 2)
+
+    response = client.get('/api/cart')
+    assert response.status_code == 200
+
+    lines = response.get_json()
+    assert [line['product_id'] for line in lines] == [1, 2]
+    assert lines[1]['quantity'] == 2
+    assert lines[1]['product'] == {
+        'id': 2,
+        'title': 'Test Product 2',
+        'price': pytest.approx(11.99),
+        'image': 'test2.jpg',
+        'category': 'category2'
+    }
+
+
+@pytest.mark.parametrize('path', ['/api/cart', '/checkout'])
+def test_cart_reads_use_fixed_number_of_statements(client, test_app, init_database, statements, path):
+    counts = []
+    for lines in (1, 5):
+        fill_cart(client, test_app, lines)
+        statements.clear()
+        assert client.get(path).status_code == 200
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
+
+
+def test_cart_post_adds_and_removes(client, test_app, init_database):
+    fill_cart(client, test_app, 0)
+
+    lines = client.post('/api/cart', json={'product_id': 3, 'action': 'add'}).get_json()
+    assert [(line['product_id'], line['quantity']) for line in lines] == [(3, 1)]
+
+    client.post('/api/cart', json={'product_id': 3, 'action': 'add'})
+    lines = client.post('/api/cart', json={'product_id': 3, 'action': 'remove'}).get_json()
+    assert lines[0]['quantity'] == 1
+
+    assert client.post('/api/cart', json={'product_id': 3, 'action': 'remove'}).get_json() == []
+
+
+def test_cart_mutations_are_single_statements(client, test_app, init_database, statements):
+    fill_cart(client, test_app, 0)
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add'})
+
+    statements.clear()
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add'})
+    writes = [s for s in statements if not s.lstrip().upper().startswith('SELECT')]
+    assert len(writes) == 1
+    assert 'ON CONFLICT' in writes[0].upper()
+
+    with test_app.app_context():
+        assert CartItem.query.filter_by(cart_id=CART_ID, product_id=1).one().quantity == 2
+
+
+def test_cart_set_quantity_and_invalid_actions(client, test_app, init_database):
+    fill_cart(client, test_app, 1)
+
+    lines = client.post('/api/cart', json={'product_id': 1, 'action': 'set', 'quantity': 7}).get_json()
+    assert lines[0]['quantity'] == 7
+    assert client.post('/api/cart', json={'product_id': 1, 'action': 'set', 'quantity': 0}).get_json() == []
+
+    assert client.post('/api/cart', json={'product_id': 1, 'action': 'explode'}).status_code == 400
+    assert client.post('/api/cart', json={'product_id': 1, 'action': 'set'}).status_code == 400
+
+
+def test_cart_post_rejects_missing_and_non_object_bodies(client, init_database):
+    for kwargs in ({}, {'json': [1, 2]}, {'data': '{"product_id": ', 'content_type': 'application/json'},
+                   {'data': 'product_id=1'}):
+        response = client.post('/api/cart', **kwargs)
+        assert response.status_code == 400
+        assert response.get_json() == {'status': 'error', 'message': 'Request body must be a JSON object'}
+
+
+def test_cart_batch_applies_operations_in_order(client, test_app, init_database):
+    fill_cart(client, test_app, 1)
+
+    response = client.post('/api/cart/batch', json={'operations': [
+        {'product_id': 2, 'action': 'add', 'quantity': 3},
+        {'product_id': 2, 'action': 'remove'},
+        {'product_id': 1, 'action': 'set', 'quantity': 0},
+        {'product_id': 4, 'action': 'add'},
+    ]})
+    assert response.status_code == 200
+    assert [(line['product_id'], line['quantity']) for line in response.get_json()] == [(2, 2), (4, 1)]
+
+
+def test_cart_batch_is_all_or_nothing(client, test_app, init_database):
+    fill_cart(client, test_app, 1)
+
+    response = client.post('/api/cart/batch', json={'operations': [
+        {'product_id': 2, 'action': 'add'},
+        {'product_id': 2, 'action': 'explode'},
+    ]})
+    assert response.status_code == 400
+    assert 'Operation 1' in response.get_json()['message']
+
+    assert [line['product_id'] for line in client.get('/api/cart').get_json()] == [1]
+    assert client.post('/api/cart/batch', json={'operations': []}).status_code == 400
+
+
+def test_cart_summary_is_one_aggregate_query(client, test_app, init_database, statements):
+    fill_cart(client, test_app, 3)
+
+    statements.clear()
+    summary = client.get('/api/cart/summary').get_json()
+    assert len(statements) == 1
+    assert summary == {'count': 6, 'subtotal': round(9.99 + 1 + 2 * (9.99 + 2) + 3 * (9.99 + 3), 2)}
+
+    fill_cart(client, test_app, 0)
+    assert client.get('/api/cart/summary').get_json() == {'count': 0, 'subtotal': 0.0}
+
+
+def test_cart_post_delta_returns_changed_line_and_summary(client, test_app, init_database):
+    fill_cart(client, test_app, 2)
+
+    delta = client.post('/api/cart?view=delta', json={'product_id': 1, 'action': 'add'}).get_json()
+    assert [(line['product_id'], line['quantity']) for line in delta['lines']] == [(1, 2)]
+    assert delta['removed'] == []
+    assert delta['summary']['count'] == 4
+
+    delta = client.post('/api/cart/batch?view=delta', json={'operations': [
+        {'product_id': 2, 'action': 'set', 'quantity': 0},
+        {'product_id': '1', 'action': 'remove'},
+    ]}).get_json()
+    assert [(line['product_id'], line['quantity']) for line in delta['lines']] == [(1, 1)]
+    assert delta['removed'] == [2]
+    assert delta['summary']['count'] == 1
+
+
+def test_carts_are_scoped_to_the_session(client, test_app, init_database):
+    fill_cart(client, test_app, 2)
+
+    other = test_app.test_client()
+    assert other.get('/api/cart').get_json() == []
+    assert other.get('/api/cart/summary').get_json()['count'] == 0
+
+    lines = other.post('/api/cart', json={'product_id': 5, 'action': 'add'}).get_json()
+    assert [line['product_id'] for line in lines] == [5]
+    assert [line['product_id'] for line in client.get('/api/cart').get_json()] == [1, 2]
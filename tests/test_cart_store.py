@@ -0,0 +1,144 @@
+import pytest
+
+from models.ecommerce.cart_store import MemoryCartStore, RedisCartStore, SqlCartStore
+
+
+class FakeWatchError(Exception):
+    pass
+
+
+class FakeRedis:
+    """The subset of redis-py used by RedisCartStore, kept in a dict."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+        self.versions = {}
+        self.on_watched_read = None
+
+    def hgetall(self, key):
+        return {str(f).encode(): str(v).encode() for f, v in self.hashes.get(key, {}).items()}
+
+    def hincrby(self, key, field, amount):
+        h = self.hashes.setdefault(key, {})
+        h[str(field)] = int(h.get(str(field), 0)) + amount
+        self._changed(key)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({str(f): v for f, v in mapping.items()})
+        self._changed(key)
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+        self._changed(key)
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _changed(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+        self.watched = {}
+        self.immediate = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        self.watched[key] = self.redis.versions.get(key, 0)
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def execute(self):
+        try:
+            for key, version in self.watched.items():
+                if self.redis.versions.get(key, 0) != version:
+                    raise FakeWatchError(key)
+            for name, args, kwargs in self.queued:
+                getattr(self.redis, name)(*args, **kwargs)
+        finally:
+            self.queued = []
+            self.watched = {}
+
+    def hgetall(self, key):
+        result = self.redis.hgetall(key)
+        if self.immediate and self.redis.on_watched_read:
+            hook, self.redis.on_watched_read = self.redis.on_watched_read, None
+            hook()
+        return result
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+        return queue
+
+
+@pytest.fixture(params=['sql', 'memory', 'redis'])
+def store(request, test_app, init_database):
+    if request.param == 'sql':
+        store = SqlCartStore()
+    elif request.param == 'memory':
+        store = MemoryCartStore(ttl=60)
+    else:
+        store = RedisCartStore(FakeRedis(), ttl=60, watch_error=FakeWatchError)
+    with test_app.app_context():
+        yield store
+
+
+def test_store_operations(store):
+    store.apply('a', [(1, 'add', 2), (2, 'add', 1), (3, 'set', 5)])
+    assert store.items('a') == {1: 2, 2: 1}
+
+    store.apply('a', [(1, 'remove', None), (2, 'remove', None), (1, 'set', 4)])
+    assert store.items('a') == {1: 4}
+    assert store.items('b') == {}
+
+    store.clear('a')
+    assert store.items('a') == {}
+
+
+def test_store_lines_and_summary(store):
+    store.apply('a', [(2, 'add', 1), (1, 'add', 3)])
+
+    lines = store.lines('a')
+    assert [(line['product_id'], line['quantity']) for line in lines] == [(2, 1), (1, 3)]
+    assert lines[1]['product']['title'] == 'Test Product 1'
+    assert [line['product_id'] for line in store.lines('a', [1])] == [1]
+
+    assert store.summary('a') == {'count': 4, 'subtotal': round(10.99 * 3 + 11.99, 2)}
+    assert store.summary('b') == {'count': 0, 'subtotal': 0.0}
+
+
+def test_store_persist_writes_through_to_sql(store):
+    from models.ecommerce.models import CartItem
+
+    store.apply('a', [(1, 'add', 2), (4, 'add', 1)])
+    store.persist('a')
+
+    rows = CartItem.query.filter_by(cart_id='a').order_by(CartItem.product_id).all()
+    assert [(row.product_id, row.quantity) for row in rows] == [(1, 2), (4, 1)]
+
+
+def test_redis_store_retries_on_concurrent_write(test_app):
+    redis = FakeRedis()
+    store = RedisCartStore(redis, watch_error=FakeWatchError)
+    store.apply('a', [(1, 'add', 1)])
+
+    # Another worker adds a unit between our read and our write
+    redis.on_watched_read = lambda: redis.hincrby('cart:a', 1, 1)
+    store.apply('a', [(1, 'remove', None)])
+
+    assert store.items('a') == {1: 1}
@@ -0,0 +1,68 @@
+import pytest
+
+from models.ecommerce.cache import CatalogCache
+from models.ecommerce.models import db, Product
+
+
+def test_cache_hit_does_not_query_database(client, init_database, statements):
+    first = client.get('/api/products')
+    assert first.status_code == 200
+    assert statements
+
+    statements.clear()
+    second = client.get('/api/products')
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert statements == []
+
+
+def test_if_none_match_returns_304(client, init_database):
+    response = client.get('/api/products')
+    etag = response.headers['ETag']
+    assert etag.startswith('"')
+
+    revalidated = client.get('/api/products', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+
+
+def test_product_update_invalidates_cache(client, test_app, init_database):
+    before = client.get('/api/products')
+
+    with test_app.app_context():
+        product = db.session.get(Product, 1)
+        product.title = 'Renamed Product'
+        db.session.commit()
+
+    after = client.get('/api/products', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()['items'][0]['title'] == 'Renamed Product'
+
+
+def test_bulk_delete_invalidates_cache(client, test_app, init_database):
+    client.get('/api/products')
+
+    with test_app.app_context():
+        Product.query.filter(Product.id > 2).delete()
+        db.session.commit()
+
+    assert len(client.get('/api/products').get_json()['items']) == 2
+
+
+@pytest.mark.parametrize('policy, survivor', [('lru', 'a'), ('fifo', 'b')])
+def test_eviction_policy_respects_memory_bound(policy, survivor):
+    cache = CatalogCache()
+    cache.policy = policy
+    cache.max_bytes = 20
+    version = cache.version.current()
+
+    assert cache.get('a') is None
+    cache.set('a', version, b'x' * 8)
+    cache.set('b', version, b'y' * 8)
+    assert cache.get('a') is not None
+    cache.set('c', version, b'z' * 8)
+
+    assert cache.get('c') is not None
+    assert cache.get(survivor) is not None
+    assert cache.get('b' if survivor == 'a' else 'a') is None
@@ -0,0 +1,100 @@
+import gzip
+import os
+
+import pytest
+
+from compression import brotli, compression, precompress_directory
+from models.ecommerce.cache import catalog_cache
+
+ASSET = b'const catalog = {\n' + b''.join(b'  item%d: "product %d",\n' % (i, i) for i in range(200)) + b'};\n'
+
+
+@pytest.fixture
+def small_threshold(monkeypatch):
+    monkeypatch.setattr(compression, 'min_size', 100)
+    compression.clear()
+    catalog_cache.clear()
+
+
+def test_negotiates_gzip_and_revalidates_compressed_variant(client, init_database, small_threshold):
+    plain = client.get('/api/products')
+    response = client.get('/api/products', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+
+    # Same entity, different bytes: the compressed variant carries a weak ETag
+    assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+    revalidated = client.get('/api/products', headers={'Accept-Encoding': 'gzip',
+                                                       'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == response.headers['ETag']
+
+
+@pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+def test_prefers_brotli_unless_the_client_ranks_gzip_higher(client, init_database, small_threshold):
+    plain = client.get('/api/products')
+    response = client.get('/api/products', headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == plain.data
+
+    response = client.get('/api/products', headers={'Accept-Encoding': 'br;q=0.5, gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_or_unaccepted_responses_are_sent_as_is(client, init_database, small_threshold):
+    assert 'Content-Encoding' not in client.get('/api/products').headers
+    assert 'Content-Encoding' not in client.get('/api/products', headers={'Accept-Encoding': 'identity'}).headers
+
+    compression.min_size = 1 << 20
+    response = client.get('/api/products', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_catalog_pages_are_compressed_once_per_etag(client, init_database, small_threshold):
+    first = client.get('/api/products', headers={'Accept-Encoding': 'gzip'})
+    hits = compression.hits
+    second = client.get('/api/products', headers={'Accept-Encoding': 'gzip'})
+    assert compression.hits == hits + 1
+    assert second.data == first.data
+
+
+def test_precompress_writes_smaller_siblings(tmp_path):
+    (tmp_path / 'app.js').write_bytes(ASSET)
+    (tmp_path / 'tiny.css').write_bytes(b'a{}')
+    (tmp_path / 'photo.jpg').write_bytes(ASSET)
+
+    written = precompress_directory(tmp_path)
+    assert str(tmp_path / 'app.js.gz') in written
+    assert gzip.decompress((tmp_path / 'app.js.gz').read_bytes()) == ASSET
+    if brotli is not None:
+        assert brotli.decompress((tmp_path / 'app.js.br').read_bytes()) == ASSET
+    assert not (tmp_path / 'tiny.css.gz').exists()
+    assert not (tmp_path / 'photo.jpg.gz').exists()
+    # Up to date siblings are left alone
+    assert precompress_directory(tmp_path) == []
+
+
+def test_static_files_are_served_from_fresh_siblings(test_app, tmp_path):
+    (tmp_path / 'app.js').write_bytes(ASSET)
+    precompress_directory(tmp_path)
+
+    with test_app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = compression.send_static(str(tmp_path), 'app.js')
+        response.direct_passthrough = False
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.mimetype == 'text/javascript'
+        assert gzip.decompress(response.get_data()) == ASSET
+        response.close()
+
+    # A source edited after the build is sent uncompressed rather than stale
+    stat = os.stat(tmp_path / 'app.js.gz')
+    os.utime(tmp_path / 'app.js', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with test_app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = compression.send_static(str(tmp_path), 'app.js')
+        response.direct_passthrough = False
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == ASSET
+        assert 'Accept-Encoding' in response.headers['Vary']
+        response.close()
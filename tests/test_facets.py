@@ -0,0 +1,51 @@
+from sqlalchemy import func
+
+from models.ecommerce.facets import category_facets, rebuild_category_facets
+from models.ecommerce.models import db, Product
+
+
+def aggregated(test_app):
+    """The facets as a GROUP BY over the product table would compute them."""
+    with test_app.app_context():
+        rows = db.session.query(
+            Product.category, func.count(), func.min(Product.price), func.max(Product.price)
+        ).group_by(Product.category).order_by(Product.category).all()
+    return [
+        {'category': c, 'count': n, 'price_min': lo, 'price_max': hi}
+        for c, n, lo, hi in rows if c is not None
+    ]
+
+
+def test_categories_endpoint_returns_facets(client, test_app, init_database):
+    response = client.get('/api/categories')
+    assert response.status_code == 200
+    assert response.get_json() == aggregated(test_app)
+    assert [f['count'] for f in response.get_json()] == [1, 2, 2]
+
+
+def test_facets_follow_product_writes(client, test_app, init_database):
+    with test_app.app_context():
+        db.session.add(Product(title='Cheap', price=0.5, category='category1'))
+        db.session.add(Product(title='New', price=3.0, category='fresh'))
+        db.session.add(Product(title='Unfiled', price=1.0))
+        db.session.commit()
+
+        # Move the most expensive product of category2 and reprice another one
+        db.session.get(Product, 5).category = 'fresh'
+        db.session.get(Product, 1).price = 100.0
+        db.session.commit()
+
+        # Emptying a category removes its facet
+        Product.query.filter_by(category='category0').delete()
+        db.session.commit()
+
+    facets = client.get('/api/categories').get_json()
+    assert facets == aggregated(test_app)
+    assert 'category0' not in [f['category'] for f in facets]
+
+
+def test_rebuild_matches_incremental_maintenance(test_app, init_database):
+    with test_app.app_context():
+        incremental = category_facets()
+        rebuild_category_facets(db.session)
+        assert category_facets() == incremental
@@ -0,0 +1,221 @@
+import threading
+from datetime import timedelta
+
+from models.ecommerce import inventory
+from models.ecommerce.cache import catalog_cache
+from models.ecommerce.cart import MAX_BATCH_OPERATIONS
+from models.ecommerce.cart_store import SqlCartStore, apply_operations
+from models.ecommerce.inventory import (InventoryError, adjust_reservations, held_quantities,
+                                        release_expired_reservations, set_stock)
+from models.ecommerce.models import db, Order, Product, StockReservation
+
+CHECKOUT = {
+    'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'phone': '555-0100',
+    'address': '1 Analytical Way', 'city': 'London', 'state': 'London', 'zip_code': 'N1 9GU',
+    'country': 'UK', 'payment_method': 'paypal',
+}
+
+
+def stock_of(test_app, product_id):
+    with test_app.app_context():
+        return db.session.get(Product, product_id).stock
+
+
+def limit_stock(test_app, product_id, stock):
+    with test_app.app_context():
+        set_stock(product_id, stock)
+
+
+def test_add_to_cart_reserves_until_sold_out(client, test_app, init_database):
+    limit_stock(test_app, 1, 3)
+    response = client.post('/api/cart', json={'product_id': 1, 'action': 'add', 'quantity': 2})
+    assert response.status_code == 200
+    assert stock_of(test_app, 1) == 1
+
+    response = client.post('/api/cart?view=delta', json={'product_id': 1, 'action': 'add', 'quantity': 2})
+    assert response.status_code == 409
+    assert response.get_json()['message'] == 'Not enough stock left for product 1'
+    # Nothing changed
+    assert stock_of(test_app, 1) == 1
+    assert client.get('/api/cart').get_json()[0]['quantity'] == 2
+
+    # Untracked products are not limited
+    assert client.post('/api/cart', json={'product_id': 2, 'action': 'add', 'quantity': 50}).status_code == 200
+    assert stock_of(test_app, 2) is None
+
+
+def test_removing_units_gives_them_back(client, test_app, init_database):
+    limit_stock(test_app, 1, 5)
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add', 'quantity': 4})
+    client.post('/api/cart', json={'product_id': 1, 'action': 'remove'})
+    assert stock_of(test_app, 1) == 2
+    client.post('/api/cart', json={'product_id': 1, 'action': 'set', 'quantity': 5})
+    assert stock_of(test_app, 1) == 0
+
+    response = client.post('/api/cart/batch', json={'operations': [
+        {'product_id': 1, 'action': 'set', 'quantity': 0},
+        {'product_id': 3, 'action': 'add'},
+    ]})
+    assert response.status_code == 200
+    assert stock_of(test_app, 1) == 5
+    with client.session_transaction() as sess:
+        cart_id = sess['cart_id']
+    with test_app.app_context():
+        assert held_quantities(cart_id) == {}
+
+
+def test_failed_batch_reserves_nothing(client, test_app, init_database):
+    limit_stock(test_app, 1, 2)
+    limit_stock(test_app, 2, 2)
+    response = client.post('/api/cart/batch', json={'operations': [
+        {'product_id': 1, 'action': 'add', 'quantity': 2},
+        {'product_id': 2, 'action': 'add', 'quantity': 3},
+    ]})
+    assert response.status_code == 409
+    assert stock_of(test_app, 1) == 2 and stock_of(test_app, 2) == 2
+
+
+def test_sweeper_returns_expired_reservations(test_app, init_database):
+    limit_stock(test_app, 1, 10)
+    limit_stock(test_app, 2, 10)
+    with test_app.app_context():
+        adjust_reservations('cart-a', {1: 3, 2: 1})
+        adjust_reservations('cart-b', {1: 2})
+        later = inventory._utcnow() + inventory.reservation_ttl() + timedelta(seconds=1)
+
+        assert release_expired_reservations() == 0
+        assert release_expired_reservations(now=later) == 3
+        assert StockReservation.query.count() == 0
+        assert db.session.get(Product, 1).stock == 10 and db.session.get(Product, 2).stock == 10
+
+        # Expired units cannot be given back twice by the cart
+        adjust_reservations('cart-a', {1: 1})
+        release_expired_reservations(now=later + timedelta(hours=1))
+        adjust_reservations('cart-a', {1: -1})
+        assert db.session.get(Product, 1).stock == 10
+
+
+def checkout_cart(client, test_app, quantities):
+    limit_stock(test_app, 1, 4)
+    for product_id, quantity in quantities.items():
+        client.post('/api/cart', json={'product_id': product_id, 'action': 'add', 'quantity': quantity})
+    return client.post('/checkout', data=dict(CHECKOUT, idempotency_key=f'stock-{len(quantities)}'))
+
+
+def test_checkout_consumes_reservations(client, test_app, init_database):
+    response = checkout_cart(client, test_app, {1: 3, 2: 1})
+    assert response.location.endswith('/')
+    with test_app.app_context():
+        assert Order.query.one().items[0].quantity == 3
+        assert StockReservation.query.count() == 0
+    assert stock_of(test_app, 1) == 1
+
+
+def test_checkout_tops_up_expired_reservations(client, test_app, init_database):
+    with client.session_transaction() as sess:
+        sess['cart_id'] = 'late-cart'
+    limit_stock(test_app, 1, 4)
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add', 'quantity': 3})
+    with test_app.app_context():
+        release_expired_reservations(now=inventory._utcnow() + timedelta(days=1))
+        # Someone else took two of the four units meanwhile
+        adjust_reservations('other-cart', {1: 2})
+
+    response = client.post('/checkout', data=dict(CHECKOUT, idempotency_key='late'))
+    assert response.location.endswith('/cart')
+    with client.session_transaction() as sess:
+        assert ('warning', 'Not enough stock left for product 1') in sess['_flashes']
+    with test_app.app_context():
+        assert Order.query.count() == 0
+    assert stock_of(test_app, 1) == 2
+
+    # Settling for the units left reserves them again
+    client.post('/api/cart', json={'product_id': 1, 'action': 'set', 'quantity': 2})
+    assert stock_of(test_app, 1) == 0
+    response = client.post('/checkout', data=dict(CHECKOUT, idempotency_key='late'))
+    assert response.location.endswith('/')
+    with test_app.app_context():
+        assert Order.query.one().items[0].quantity == 2
+    assert stock_of(test_app, 1) == 0
+
+
+def test_concurrent_reservations_do_not_oversell(test_app, init_database):
+    limit_stock(test_app, 1, 5)
+    results = []
+
+    def buy(index):
+        with test_app.app_context():
+            try:
+                adjust_reservations(f'cart-{index}', {1: 1})
+                results.append(True)
+            except InventoryError:
+                results.append(False)
+
+    threads = [threading.Thread(target=buy, args=(index,)) for index in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5 and results.count(False) == 15
+    assert stock_of(test_app, 1) == 0
+    with test_app.app_context():
+        assert db.session.query(db.func.sum(StockReservation.quantity)).scalar() == 5
+
+
+def test_stock_moves_keep_the_catalog_version(client, test_app, init_database):
+    limit_stock(test_app, 1, 5)
+    version = catalog_cache.version.current()
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add', 'quantity': 2})
+    client.post('/api/cart', json={'product_id': 1, 'action': 'remove'})
+    with test_app.app_context():
+        release_expired_reservations(now=inventory._utcnow() + timedelta(days=1))
+    assert catalog_cache.version.current() == version
+
+    # Tracking a product is a catalog change
+    limit_stock(test_app, 2, 1)
+    assert catalog_cache.version.current() != version
+    with test_app.app_context():
+        assert inventory.tracked_products() == {1, 2}
+
+
+def test_batch_statements_grow_with_tracked_products_only(client, test_app, init_database, statements):
+    limit_stock(test_app, 1, 500)
+    limit_stock(test_app, 2, 500)
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add', 'quantity': 3})
+    client.post('/api/cart', json={'product_id': 3, 'action': 'add'})
+    # A full batch mixing every action over tracked and untracked products;
+    # the query profiler enforces the view's budget in tests
+    actions = [('add', 2), ('remove', None), ('set', 4), ('add', 1)]
+    operations = [
+        {'product_id': index % 5 + 1, 'action': actions[index % 4][0], 'quantity': actions[index % 4][1]}
+        for index in range(MAX_BATCH_OPERATIONS)
+    ]
+
+    statements.clear()
+    response = client.post('/api/cart/batch', json={'operations': operations})
+    assert response.status_code == 200
+    expected = apply_operations({1: 3, 3: 1}, [(op['product_id'], op['action'], op['quantity']) for op in operations])
+    assert {line['product_id']: line['quantity'] for line in response.get_json()} == expected
+    assert stock_of(test_app, 1) == 500 - expected[1] and stock_of(test_app, 2) == 500 - expected[2]
+    assert len(statements) <= 8 + 2 * 2
+
+    statements.clear()
+    operations = [{'product_id': op['product_id'] + 2, 'action': 'add'} for op in operations if op['product_id'] < 4]
+    assert client.post('/api/cart/batch', json={'operations': operations}).status_code == 200
+    assert len(statements) <= 8
+
+
+def test_reservation_and_cart_line_commit_together(client, test_app, init_database, monkeypatch):
+    limit_stock(test_app, 1, 5)
+
+    def fail(*args):
+        raise RuntimeError('cart write failed')
+
+    monkeypatch.setattr(SqlCartStore, '_add', fail)
+    response = client.post('/api/cart', json={'product_id': 1, 'action': 'add', 'quantity': 2})
+    assert response.status_code == 500
+    assert stock_of(test_app, 1) == 5
+    # Rolled back, not reserved then given back by a second transaction
+    with test_app.app_context():
+        assert StockReservation.query.count() == 0
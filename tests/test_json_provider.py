@@ -0,0 +1,73 @@
+import datetime
+import decimal
+import json
+import uuid
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from markupsafe import Markup
+
+from json_provider import OrjsonProvider, init_json_provider
+from models.ecommerce.models import db, Product
+from models.ecommerce.schema import PRODUCT_COLUMNS, serialize_product
+
+pytest.importorskip('orjson')
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.debug = False
+    return app
+
+
+def test_orjson_matches_stdlib_output(app):
+    fast, stdlib = OrjsonProvider(app), DefaultJSONProvider(app)
+    value = {
+        'when': datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        'day': datetime.date(2024, 5, 1),
+        'amount': decimal.Decimal('9.99'),
+        'uuid': uuid.UUID(int=1),
+        'html': Markup('<b>x</b>'),
+        'nested': [1, 2.5, None, True, 'é'],
+        'huge': 2 ** 70
+    }
+    assert json.loads(fast.dumps(value)) == json.loads(stdlib.dumps(value))
+    assert fast.loads(fast.dumps(value)) == stdlib.loads(stdlib.dumps(value))
+    assert fast.dumps({3: 'integer key'}) == '{"3":"integer key"}'
+    # stdlib-only keyword arguments are honoured
+    assert fast.dumps({'b': 1, 'a': 2}, sort_keys=True, indent=1) == stdlib.dumps({'b': 1, 'a': 2}, indent=1)
+
+
+def test_orjson_response(app):
+    with app.app_context():
+        response = OrjsonProvider(app).response({'a': [1, 2]})
+    assert response.mimetype == 'application/json'
+    assert response.get_data() == b'{"a":[1,2]}\n'
+
+    app.debug = True
+    with app.app_context():
+        assert OrjsonProvider(app).response({'a': 1}).get_data() == b'{\n  "a": 1\n}\n'
+
+
+def test_init_json_provider_honours_config(app):
+    app.config['JSON_PROVIDER'] = 'stdlib'
+    assert type(init_json_provider(app)) is DefaultJSONProvider
+    app.config['JSON_PROVIDER'] = 'auto'
+    assert isinstance(init_json_provider(app), OrjsonProvider)
+    app.config['JSON_PROVIDER'] = 'ujson'
+    with pytest.raises(ValueError):
+        init_json_provider(app)
+
+
+def test_app_rejects_malformed_json_bodies(client, init_database):
+    response = client.post('/api/cart/batch', data='{"operations": [', content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_models_and_projected_rows_serialize_alike(test_app, init_database):
+    with test_app.app_context():
+        product = db.session.get(Product, 1)
+        row = db.session.execute(db.select(*PRODUCT_COLUMNS).where(Product.id == 1)).one()
+        assert product.to_dict() == serialize_product(row)
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+from loguru import logger
+
+from logging_config import BoundedQueueSink, RotatingFileWriter, parse_duration, parse_size
+
+
+@pytest.fixture
+def records():
+    """Capture every log record emitted during the test."""
+    captured = []
+    handler_id = logger.add(lambda message: captured.append(message.record), level='DEBUG')
+    yield captured
+    logger.remove(handler_id)
+
+
+def test_request_id_reaches_log_records(client, init_database, records):
+    response = client.get('/api/cart/summary', headers={'X-Request-ID': 'abc-123'})
+    assert response.headers['X-Request-ID'] == 'abc-123'
+
+    request_records = [r for r in records if r['message'].startswith('Response:')]
+    assert request_records
+    assert all(r['extra']['request_id'] == 'abc-123' for r in request_records)
+    assert request_records[0]['extra']['status'] == 200
+
+    # Outside a request the default ID is restored
+    logger.info('after request')
+    assert records[-1]['extra']['request_id'] == 'N/A'
+
+
+def test_generated_request_ids_are_unique(client, init_database):
+    ids = {client.get('/api/cart/summary').headers['X-Request-ID'] for _ in range(3)}
+    assert len(ids) == 3
+    assert 'N/A' not in ids
+
+
+def test_request_bodies_are_not_logged_by_default(client, test_app, init_database, records):
+    client.post('/api/cart', json={'product_id': 1, 'action': 'add'})
+    assert not any('Request JSON' in r['message'] for r in records)
+
+    test_app.config['LOG_REQUEST_BODIES'] = True
+    try:
+        client.post('/api/cart', json={'product_id': 1, 'action': 'add'})
+    finally:
+        test_app.config['LOG_REQUEST_BODIES'] = False
+    assert any('Request JSON' in r['message'] for r in records)
+
+
+def test_successful_requests_are_sampled_but_errors_are_not(client, test_app, init_database, records):
+    test_app.config['LOG_SAMPLE_RATE'] = 0.0
+    try:
+        client.get('/api/cart/summary')
+        client.get('/api/products?limit=0')
+    finally:
+        test_app.config['LOG_SAMPLE_RATE'] = 1.0
+
+    statuses = [r['extra']['status'] for r in records if r['message'].startswith('Response:')]
+    assert statuses == [400]
+
+
+def test_bounded_queue_sink_drops_instead_of_blocking():
+    release = threading.Event()
+
+    class BlockedWriter:
+        def __init__(self):
+            self.lines = []
+
+        def write(self, text):
+            release.wait()
+            self.lines.append(text)
+
+        def flush(self):
+            pass
+
+    writer = BlockedWriter()
+    sink = BoundedQueueSink(writer, maxsize=2)
+    for i in range(10):
+        sink.write(f'line {i}\n')
+    assert sink.dropped >= 7
+
+    release.set()
+    sink.stop()
+    assert writer.lines[0] == 'line 0\n'
+    assert 'Dropped' in writer.lines[-1]
+
+
+def test_parse_rotation_settings():
+    assert parse_size('10 MB') == 10 * 1024 * 1024
+    assert parse_size('00:00') is None
+    assert parse_duration('30 days') == 30 * 86400
+    assert parse_duration('1 week') == 7 * 86400
+
+
+def test_text_mode_logs_the_request_line_at_info(client, init_database, records):
+    client.get('/api/cart/summary')
+    request_lines = [r for r in records if r['message'] == 'Request: GET /api/cart/summary']
+    assert [r['level'].name for r in request_lines] == ['INFO']
+
+
+def test_rotation_counts_bytes(tmp_path):
+    writer = RotatingFileWriter(tmp_path / 'app.log', rotation=10)
+    writer.write('ééééé')  # 5 characters, 10 bytes
+    writer.write('after\n')
+    writer.close()
+    assert (tmp_path / 'app.log').read_text() == 'after\n'
+    assert [path.read_text(encoding='utf-8') for path in tmp_path.glob('app.*.log')] == ['ééééé']
+
+
+def test_writers_sharing_a_file_rotate_it_once(tmp_path):
+    first = RotatingFileWriter(tmp_path / 'app.log', rotation=20)
+    second = RotatingFileWriter(tmp_path / 'app.log', rotation=20)
+    first.write('a' * 15)
+    first.flush()
+    # Below the limit on its own, past it with the other writer's bytes
+    second.write('b' * 10)
+    second.flush()
+    rotated = list(tmp_path.glob('app.*.log'))
+    assert [path.read_text() for path in rotated] == ['a' * 15 + 'b' * 10]
+
+    # The other writer reopens the new file instead of rotating it again
+    first.flush()
+    first.write('c' * 15)
+    first.flush()
+    second.write('d' * 4)
+    second.flush()
+    assert len(list(tmp_path.glob('app.*.log'))) == 1
+    assert (tmp_path / 'app.log').read_text() == 'c' * 15 + 'd' * 4
+
+    first.write('e')
+    first.flush()
+    second.flush()
+    assert len(list(tmp_path.glob('app.*.log'))) == 2
+    second.write('f')
+    first.close()
+    second.close()
+    assert (tmp_path / 'app.log').read_text() == 'f'
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+
+from metrics import Metrics, MmapValues, mark_process_dead
+
+# Set in conftest.py
+AUTHORIZATION = {'Authorization': f"Bearer {os.environ['METRICS_TOKEN']}"}
+
+
+def _value(body, line_prefix):
+    for line in body.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_requests_are_counted_per_route(client, init_database):
+    requests_line = 'http_requests_total{method="GET",endpoint="/api/products/search",status="200"}'
+    count_line = 'http_request_duration_seconds_count{method="GET",endpoint="/api/products/search"}'
+    before = client.get('/metrics', headers=AUTHORIZATION).get_data(as_text=True)
+
+    client.get('/api/products/search?q=test')
+    client.get('/api/products/search?q=product')
+
+    response = client.get('/metrics', headers=AUTHORIZATION)
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert _value(body, requests_line) == _value(before, requests_line) + 2
+    assert _value(body, count_line) == _value(before, count_line) + 2
+    assert _value(body, 'db_statements_total{endpoint="/api/products/search"}') >= 2
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    # Only the /metrics request itself is in flight
+    assert _value(body, 'http_requests_in_progress{method="GET",endpoint="/metrics"}') == 1
+
+
+def test_unmatched_paths_share_one_label(client, init_database):
+    client.get('/no/such/page')
+    body = client.get('/metrics', headers=AUTHORIZATION).get_data(as_text=True)
+    assert 'endpoint="<unmatched>",status="404"' in body
+    assert '/no/such/page' not in body
+
+
+def test_metrics_need_the_bearer_token(client):
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': os.environ['METRICS_TOKEN']}).status_code == 403
+    assert client.get('/metrics', headers=AUTHORIZATION).status_code == 200
+
+    # Without a configured token, nobody is let in
+    assert not Metrics().authorized('Bearer ')
+
+
+def _worker_requests(metrics):
+    metrics.inc('http_requests_total', (('method', 'GET'), ('endpoint', '/'), ('status', '200')))
+    metrics.add_gauge('http_requests_in_progress', (('method', 'GET'), ('endpoint', '/')), 1)
+
+
+def test_values_are_summed_across_processes(tmp_path):
+    metrics = Metrics(directory=tmp_path)
+    labels = (('method', 'GET'), ('endpoint', '/'), ('status', '200'))
+    metrics.inc('http_requests_total', labels)
+
+    worker = multiprocessing.get_context('fork').Process(target=_worker_requests, args=(metrics,))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+
+    series = metrics.collect()
+    assert series['http_requests_total', (('method', 'GET'), ('endpoint', '/'), ('status', '200'))] == 2
+    assert series['http_requests_in_progress', (('method', 'GET'), ('endpoint', '/'))] == 1
+
+    # A dead worker's gauges go away but its counts are kept
+    mark_process_dead(tmp_path, worker.pid)
+    series = metrics.collect()
+    assert series['http_requests_total', (('method', 'GET'), ('endpoint', '/'), ('status', '200'))] == 2
+    assert ('http_requests_in_progress', (('method', 'GET'), ('endpoint', '/'))) not in series
+
+
+def test_mmap_values_grow_and_reopen(tmp_path):
+    path = tmp_path / 'counter_1.db'
+    values = MmapValues(path, initial_size=64)
+    for i in range(100):
+        values.inc(f'key-{i}', i)
+    values.inc('key-3', 0.5)
+    values.close()
+
+    assert MmapValues.read(path)['key-3'] == 3.5
+    reopened = MmapValues(path)
+    reopened.inc('key-99', 1)
+    assert len(MmapValues.read(path)) == 100
+    assert MmapValues.read(path)['key-99'] == 100
+    reopened.close()
@@ -0,0 +1,186 @@
+import re
+
+import pytest
+
+from models.ecommerce import orders
+from models.ecommerce.cart_store import MemoryCartStore
+from models.ecommerce.models import db, CartItem, Order, OrderItem
+from models.ecommerce.orders import OrderError, cart_totals, place_order, tax_cents
+
+CART_ID = 'order-cart'
+
+DETAILS = {
+    'first_name': 'Ada',
+    'last_name': 'Lovelace',
+    'email': 'ada@example.com',
+    'phone': '555-0100',
+    'address': '1 Analytical Way',
+    'address2': '',
+    'city': 'London',
+    'state': 'London',
+    'zip_code': 'N1 9GU',
+    'country': 'UK',
+    'payment_method': 'paypal',
+}
+
+
+def fill_cart(test_app, quantities):
+    with test_app.app_context():
+        CartItem.query.delete()
+        db.session.add_all([CartItem(cart_id=CART_ID, product_id=pid, quantity=qty) for pid, qty in quantities.items()])
+        db.session.commit()
+
+
+def test_checkout_places_order_and_clears_cart(client, test_app, init_database, statements):
+    # Prices are 10.99 to 14.99
+    fill_cart(test_app, {1: 3, 4: 1})
+    with client.session_transaction() as sess:
+        sess['cart_id'] = CART_ID
+
+    statements.clear()
+    response = client.post('/checkout', data=dict(DETAILS, idempotency_key='key-1'))
+    assert response.status_code == 302
+    # Plus the read of the stock-tracked products, once per catalog version
+    assert len(statements) <= 6
+
+    with test_app.app_context():
+        order = Order.query.one()
+        assert (order.subtotal_cents, order.tax_cents, order.total_cents) == (4696, 470, 5166)
+        assert order.email == 'ada@example.com' and order.payment_method == 'paypal'
+        assert [(item.product_id, item.title, item.unit_price_cents, item.quantity) for item in order.items] == [
+            (1, 'Test Product 1', 1099, 3),
+            (4, 'Test Product 4', 1399, 1),
+        ]
+        assert CartItem.query.count() == 0
+    with client.session_transaction() as sess:
+        assert ('success', f'Your order #{order.id} has been placed successfully!') in sess['_flashes']
+
+
+def test_resubmitted_checkout_returns_the_existing_order(client, test_app, init_database):
+    fill_cart(test_app, {2: 1})
+    with client.session_transaction() as sess:
+        sess['cart_id'] = CART_ID
+
+    client.post('/checkout', data=dict(DETAILS, idempotency_key='key-2'))
+    # The cart is empty now, but the same submission finds its order
+    response = client.post('/checkout', data=dict(DETAILS, idempotency_key='key-2'))
+    assert response.status_code == 302 and response.location.endswith('/')
+
+    with test_app.app_context():
+        order = Order.query.one()
+        assert OrderItem.query.count() == 1
+    with client.session_transaction() as sess:
+        assert ('info', f'Your order #{order.id} has already been placed.') in sess['_flashes']
+
+    # A new submission with an empty cart places nothing
+    response = client.post('/checkout', data=dict(DETAILS, idempotency_key='key-3'))
+    assert response.location.endswith('/cart')
+    with test_app.app_context():
+        assert Order.query.count() == 1
+
+
+def test_concurrent_duplicate_loses_on_the_unique_key(test_app, init_database, monkeypatch):
+    fill_cart(test_app, {1: 1})
+    with test_app.test_request_context():
+        first, created = place_order(CART_ID, 'key-4', DETAILS)
+        assert created
+
+        # The other request checked for the key before this one committed
+        monkeypatch.setattr(orders, 'find_order', lambda cart_id, key, lookups=iter((None, first)): next(lookups))
+        fill_cart(test_app, {1: 1})
+        assert place_order(CART_ID, 'key-4', DETAILS) == (first, False)
+        assert Order.query.count() == 1
+        # The losing request left the cart alone
+        assert CartItem.query.count() == 1
+
+
+def test_empty_cart_is_rolled_back(test_app, init_database):
+    fill_cart(test_app, {})
+    with test_app.test_request_context():
+        with pytest.raises(OrderError):
+            place_order(CART_ID, 'key-5', DETAILS)
+        assert Order.query.count() == 0
+
+
+def test_out_of_process_store_is_written_through_and_cleared(test_app, init_database, monkeypatch):
+    store = MemoryCartStore()
+    monkeypatch.setitem(test_app.extensions, 'cart_store', store)
+    fill_cart(test_app, {})
+    store.apply(CART_ID, [(3, 'add', 2)])
+    with test_app.test_request_context():
+        order_id, _ = place_order(CART_ID, 'key-6', DETAILS)
+        assert db.session.get(Order, order_id).total_cents == 2 * 1299 + tax_cents(2 * 1299)
+        assert CartItem.query.count() == 0
+    assert store.items(CART_ID) == {}
+
+
+def test_totals_use_integer_cents():
+    lines = [{'product': {'price': 0.1}, 'quantity': 3}, {'product': {'price': 19.99}, 'quantity': 3}]
+    assert cart_totals(lines) == (6027, 603, 6630)
+    assert tax_cents(5) == 1 and tax_cents(4) == 0
+
+
+def test_idempotency_keys_are_scoped_to_the_cart(test_app, init_database):
+    other_client = test_app.test_client()
+    client = test_app.test_client()
+    fill_cart(test_app, {})
+    for session_client, cart_id, product_id in ((other_client, 'other-cart', 2), (client, CART_ID, 3)):
+        with session_client.session_transaction() as sess:
+            sess['cart_id'] = cart_id
+        session_client.post('/api/cart', json={'product_id': product_id, 'action': 'add'})
+
+    headers = {'Idempotency-Key': 'shared-key'}
+    other_client.post('/checkout', data=dict(DETAILS, idempotency_key='form-key'), headers=headers)
+    response = client.post('/checkout', data=dict(DETAILS, idempotency_key='form-key'), headers=headers)
+    assert response.location.endswith('/')
+
+    with test_app.app_context():
+        orders_by_cart = {order.cart_id: order for order in Order.query.all()}
+        assert set(orders_by_cart) == {'other-cart', CART_ID}
+        assert orders_by_cart[CART_ID].items[0].product_id == 3
+    with client.session_transaction() as sess:
+        # The other session's order id is never shown
+        assert sess['_flashes'] == [
+            ('success', f'Your order #{orders_by_cart[CART_ID].id} has been placed successfully!')
+        ]
+
+
+@pytest.mark.parametrize('key', ['k' * 65, 'key with spaces', ''])
+def test_malformed_idempotency_keys_are_rejected(client, test_app, init_database, key):
+    fill_cart(test_app, {1: 1})
+    with client.session_transaction() as sess:
+        sess['cart_id'] = CART_ID
+
+    response = client.post('/checkout', data=dict(DETAILS, idempotency_key='form-key'), headers={'Idempotency-Key': key})
+    assert response.status_code == 400
+    assert 'Idempotency-Key' in response.get_json()['message']
+
+    # The form field is held to the same rule
+    response = client.post('/checkout', data=dict(DETAILS, idempotency_key=key))
+    assert response.status_code == 200
+    with test_app.app_context():
+        assert Order.query.count() == 0
+
+
+def test_checkout_without_a_key_places_nothing(client, test_app, init_database):
+    fill_cart(test_app, {1: 1})
+    with client.session_transaction() as sess:
+        sess['cart_id'] = CART_ID
+
+    # The rendered form carries a fresh key each time
+    key = re.compile(r'name="idempotency_key"[^>]* value="(\w+)"')
+    keys = [key.search(client.get('/checkout').get_data(as_text=True)) for _ in range(2)]
+    assert all(keys) and keys[0].group(1) != keys[1].group(1)
+
+    # A retried POST without a key must not place one order per attempt
+    for _ in range(2):
+        response = client.post('/checkout', data=DETAILS)
+        assert response.status_code == 200
+    with test_app.app_context():
+        assert Order.query.count() == 0
+
+    # The header alone is enough
+    response = client.post('/checkout', data=DETAILS, headers={'Idempotency-Key': 'header-only'})
+    assert response.location.endswith('/')
+    with test_app.app_context():
+        assert Order.query.one().idempotency_key == 'header-only'
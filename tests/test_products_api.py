@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from models.ecommerce.models import db, Product
+
+
+@pytest.fixture
+def catalog(test_app, init_database):
+    """Add a larger catalog on top of the default test products."""
+    with test_app.app_context():
+        db.session.add_all([
+            Product(
+                title=f'Bulk Product {i}',
+                description=f'Bulk Description {i}',
+                price=float(i % 7),
+                image=f'bulk{i}.jpg',
+                category='bulk'
+            ) for i in range(25)
+        ])
+        db.session.commit()
+    yield
+
+
+def fetch_all_pages(client, **params):
+    """Follow next_cursor until the last page and return every item."""
+    items = []
+    cursor = None
+    while True:
+        query = dict(params)
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/api/products', query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page['items']) <= page['limit']
+        items.extend(page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items
+
+
+def test_products_first_page_uses_items_per_page(client, test_app, catalog):
+    response = client.get('/api/products')
+    assert response.status_code == 200
+
+    page = response.get_json()
+    assert len(page['items']) == test_app.config['ITEMS_PER_PAGE']
+    assert page['next_cursor'] is not None
+    assert [p['id'] for p in page['items']] == sorted(p['id'] for p in page['items'])
+
+
+def test_products_pages_cover_catalog_without_duplicates(client, catalog):
+    items = fetch_all_pages(client, limit=4)
+    ids = [p['id'] for p in items]
+    assert len(ids) == 30
+    assert len(set(ids)) == 30
+
+
+@pytest.mark.parametrize('sort', ['price', '-price'])
+def test_products_price_sort_with_ties(client, catalog, sort):
+    items = fetch_all_pages(client, sort=sort, limit=5, category='bulk')
+    assert len(items) == 25
+
+    keys = [(p['price'], p['id']) for p in items]
+    assert keys == sorted(keys, reverse=sort.startswith('-'))
+
+
+def test_products_category_and_price_filters(client, catalog):
+    items = fetch_all_pages(client, category='bulk', min_price=2, max_price=4)
+    assert items
+    assert all(p['category'] == 'bulk' and 2 <= p['price'] <= 4 for p in items)
+
+
+def test_products_rejects_invalid_parameters(client, catalog):
+    assert client.get('/api/products?sort=title').status_code == 400
+    assert client.get('/api/products?limit=0').status_code == 400
+    assert client.get('/api/products?cursor=garbage').status_code == 400
+
+    # A cursor issued for one sort order cannot be replayed against another
+    cursor = client.get('/api/products?limit=1').get_json()['next_cursor']
+    response = client.get('/api/products', query_string={'cursor': cursor, 'sort': 'price'})
+    assert response.status_code == 400
+
+
+def test_products_stream_returns_every_page(client, catalog):
+    paged = fetch_all_pages(client, sort='-price', limit=7)
+
+    response = client.get('/api/products', query_string={'sort': '-price', 'stream': '1'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.get_json() == {'items': paged, 'next_cursor': None}
+
+    # Filters and a starting cursor apply as they do to pages
+    first = client.get('/api/products', query_string={'category': 'bulk', 'limit': 5}).get_json()
+    rest = client.get('/api/products', query_string={
+        'category': 'bulk', 'cursor': first['next_cursor'], 'stream': 'true'
+    }).get_json()['items']
+    assert len(rest) == 20
+    assert [p['id'] for p in first['items'] + rest] == sorted(p['id'] for p in paged if p['category'] == 'bulk')
+
+
+def test_products_export_is_ndjson(client, catalog):
+    response = client.get('/api/products/export', query_string={'min_price': 3})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+
+    lines = response.get_data(as_text=True).splitlines()
+    exported = [json.loads(line) for line in lines]
+    assert exported == fetch_all_pages(client, min_price=3)
+    assert all(p['price'] >= 3 for p in exported)
+
+
+def test_products_export_rejects_bad_cursor(client, catalog):
+    response = client.get('/api/products/export', query_string={'cursor': 'garbage'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
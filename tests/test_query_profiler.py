@@ -0,0 +1,81 @@
+import pytest
+from flask import Response
+from loguru import logger
+
+from models.ecommerce.models import db, Product, CartItem
+from query_profiler import (QueryBudgetExceeded, assert_max_queries, normalize_statement,
+                            parameter_shape, query_profiler)
+
+
+def test_normalize_statement():
+    assert normalize_statement(
+        "SELECT * FROM product\n WHERE id IN (?, ?, ?) AND title = 'x' LIMIT 10"
+    ) == 'SELECT * FROM product WHERE id IN (?) AND title = ? LIMIT ?'
+    assert normalize_statement('SELECT * FROM product WHERE id = %(id_1)s') == \
+        normalize_statement('SELECT * FROM product WHERE id = :id_1')
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape((1, 'secret')) == '(int, str)'
+    assert parameter_shape({'email': 'a@b.c'}) == '{email: str}'
+    assert parameter_shape([(1,), (2,)], executemany=True) == '2 x (int)'
+
+
+@pytest.fixture
+def low_threshold():
+    threshold = query_profiler.n_plus_one_threshold
+    query_profiler.n_plus_one_threshold = 3
+    yield
+    query_profiler.n_plus_one_threshold = threshold
+
+
+def test_lazy_loads_per_cart_line_are_an_n_plus_one(test_app, init_database, low_threshold):
+    with test_app.app_context():
+        db.session.add_all([CartItem(cart_id='a', product_id=i, quantity=1) for i in range(1, 6)])
+        db.session.commit()
+
+    with test_app.test_request_context('/api/cart'):
+        test_app.preprocess_request()
+        # The pattern the cart views used to have: one product query per line
+        for item in CartItem.query.filter_by(cart_id='a').all():
+            item.product.to_dict()
+        with pytest.raises(QueryBudgetExceeded, match='Possible N\\+1'):
+            test_app.process_response(Response())
+
+
+def test_views_over_their_query_budget_fail_in_tests(test_app, init_database):
+    with test_app.test_request_context('/api/cart/summary'):
+        test_app.preprocess_request()
+        Product.query.count()
+        Product.query.first()
+        with pytest.raises(QueryBudgetExceeded, match='budget is 1'):
+            test_app.process_response(Response())
+
+
+def test_slow_queries_are_logged_with_endpoint_and_parameter_shape(test_app, init_database):
+    records = []
+    handler_id = logger.add(lambda message: records.append(message.record), level='WARNING')
+    slow_query_ms = query_profiler.slow_query_ms
+    query_profiler.slow_query_ms = 0
+    try:
+        with test_app.test_request_context('/api/categories'):
+            db.session.get(Product, 1)
+    finally:
+        query_profiler.slow_query_ms = slow_query_ms
+        logger.remove(handler_id)
+
+    slow = [r for r in records if r['message'].startswith('Slow query')]
+    assert slow
+    assert 'get_categories' in slow[0]['message']
+    assert '(int)' in slow[0]['message']
+    assert slow[0]['extra']['endpoint'] == 'get_categories'
+
+
+def test_assert_max_queries(test_app, init_database):
+    with test_app.app_context():
+        with assert_max_queries(1):
+            Product.query.count()
+        with pytest.raises(QueryBudgetExceeded):
+            with assert_max_queries(1):
+                Product.query.count()
+                Product.query.count()
@@ -0,0 +1,93 @@
+import os
+from itertools import count
+
+import pytest
+
+from render_cache import render_cache
+
+
+@pytest.fixture
+def template_dir(test_app, tmp_path, monkeypatch):
+    """A template folder the tests can edit, with templates reloaded on change."""
+    monkeypatch.setattr(test_app.jinja_loader, 'searchpath', test_app.jinja_loader.searchpath + [str(tmp_path)])
+    monkeypatch.setattr(test_app.jinja_env, 'auto_reload', True)
+    render_cache.clear()
+    yield tmp_path
+    render_cache.clear()
+
+
+def write_template(path, source):
+    """Write ``source`` with an mtime that differs from any previous version."""
+    mtime = os.stat(path).st_mtime_ns + 10 ** 9 if path.exists() else None
+    path.write_text(source)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_static_pages_are_rendered_once(client, init_database):
+    render_cache.clear()
+    first = client.get('/')
+    misses, hits = render_cache.misses, render_cache.hits
+    second = client.get('/')
+    assert second.data == first.data and second.mimetype == 'text/html'
+    assert render_cache.misses == misses and render_cache.hits == hits + 1
+
+    assert client.get('/', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/cart').headers['ETag'] != first.headers['ETag']
+
+
+def test_pages_are_rebuilt_when_a_template_changes(test_app, template_dir):
+    page = template_dir / 'render-cache-page.html'
+    write_template(page, '{% extends "base.html" %}{% block content %}first version{% endblock %}')
+    with test_app.test_request_context():
+        assert b'first version' in render_cache.page('render-cache-page.html').get_data()
+        write_template(page, '{% extends "base.html" %}{% block content %}second version{% endblock %}')
+        assert b'second version' in render_cache.page('render-cache-page.html').get_data()
+
+        # Editing a parent template counts as well
+        base = template_dir / 'render-cache-base.html'
+        write_template(base, 'old layout {% block content %}{% endblock %}')
+        write_template(page, '{% extends "render-cache-base.html" %}{% block content %}child{% endblock %}')
+        assert render_cache.page('render-cache-page.html').get_data() == b'old layout child'
+        write_template(base, 'new layout {% block content %}{% endblock %}')
+        assert render_cache.page('render-cache-page.html').get_data() == b'new layout child'
+
+
+def test_fragments_are_cached_but_the_rest_is_rendered(test_app, template_dir, monkeypatch):
+    counter = count()
+    write_template(template_dir / 'render-cache-fragment.html',
+                   "{% cache 'numbers' %}<b>{{ next(counter) }}</b>{% endcache %} {{ next(counter) }}")
+    with test_app.test_request_context():
+        template = test_app.jinja_env.get_template('render-cache-fragment.html')
+        assert template.render(counter=counter, next=next) == '<b>0</b> 1'
+        assert template.render(counter=counter, next=next) == '<b>0</b> 2'
+
+        monkeypatch.setattr(render_cache, 'enabled', False)
+        assert template.render(counter=counter, next=next) == '<b>3</b> 4'
+
+
+def test_dependencies_invalidate_cached_renders(test_app, template_dir, monkeypatch):
+    values = iter(('first', 'second'))
+    monkeypatch.setattr(render_cache, '_dependencies', render_cache._dependencies + [lambda: current[0]])
+    current = [next(values)]
+    write_template(template_dir / 'render-cache-plain.html', 'rendered {{ now }}')
+    with test_app.test_request_context():
+        test_app.jinja_env.globals['now'] = 1
+        assert render_cache.page('render-cache-plain.html').get_data() == b'rendered 1'
+        test_app.jinja_env.globals['now'] = 2
+        assert render_cache.page('render-cache-plain.html').get_data() == b'rendered 1'
+        current[0] = next(values)
+        assert render_cache.page('render-cache-plain.html').get_data() == b'rendered 2'
+        del test_app.jinja_env.globals['now']
+
+
+def test_config_changes_invalidate_cached_renders(test_app, template_dir, monkeypatch):
+    write_template(template_dir / 'render-cache-config.html', 'items per page: {{ config.ITEMS_PER_PAGE }}')
+    with test_app.test_request_context():
+        default = test_app.config['ITEMS_PER_PAGE']
+        assert render_cache.page('render-cache-config.html').get_data() == f'items per page: {default}'.encode()
+        monkeypatch.setitem(test_app.config, 'ITEMS_PER_PAGE', default + 1)
+        assert render_cache.page('render-cache-config.html').get_data() == f'items per page: {default + 1}'.encode()
+        misses = render_cache.misses
+        render_cache.page('render-cache-config.html')
+        assert render_cache.misses == misses
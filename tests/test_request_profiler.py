@@ -0,0 +1,53 @@
+import json
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from request_profiler import PROFILE_HEADER, StackSampler, profile_token, write_collapsed
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_stack_sampler_records_running_code():
+    sampler = StackSampler(threading.get_ident(), 0.001)
+    sampler.start()
+    _busy(0.05)
+    samples = sampler.stop()
+
+    assert sum(samples.values()) > 5
+    assert any(frame[0] == '_busy' for stack in samples for frame in stack)
+
+
+def test_collapsed_output(tmp_path):
+    samples = Counter({(('main', 'app.py', 1), ('render', 'app.py', 10)): 3})
+    write_collapsed(tmp_path / 'p.txt', samples)
+    assert (tmp_path / 'p.txt').read_text() == 'main (app.py:1);render (app.py:10) 3\n'
+
+
+def test_signed_header_profiles_one_request(client, test_app, init_database):
+    token = profile_token(test_app.config['SECRET_KEY'])
+
+    assert 'X-Profile' not in client.get('/api/cart/summary').headers
+    assert 'X-Profile' not in client.get('/api/cart/summary', headers={PROFILE_HEADER: 'forged'}).headers
+
+    response = client.get('/api/products/search?q=test', headers={PROFILE_HEADER: token})
+    filename = response.headers['X-Profile']
+    profile = json.loads(Path(test_app.config['PROFILER_DIR'], filename).read_text())
+    assert profile['profiles'][0]['type'] == 'sampled'
+    assert profile['name'] == 'GET /api/products/search'
+
+    # The index needs the token too
+    assert client.get('/debug/profiles').status_code == 403
+    index = client.get(f'/debug/profiles?token={token}').get_json()['profiles']
+    assert index[0]['file'] == filename
+    assert index[0]['route'] == '/api/products/search'
+    assert index[0]['duration_ms'] > 0
+
+    download = client.get(f'/debug/profiles/{filename}', headers={PROFILE_HEADER: token})
+    assert download.status_code == 200
+    assert 'X-Profile' not in download.headers
@@ -0,0 +1,91 @@
+import pytest
+
+from models.ecommerce.models import db, Product
+from models.ecommerce.search import SearchError, build_match_query, like_search
+
+
+@pytest.fixture
+def searchable(test_app, init_database):
+    with test_app.app_context():
+        db.session.add_all([
+            Product(title='Blue Cotton Shirt', description='A shirt made of <b>soft</b> cotton',
+                    price=20.0, category='clothing'),
+            Product(title='Cotton Socks', description='Warm socks', price=5.0, category='clothing'),
+            Product(title='Steel Watch', description='Goes well with a cotton shirt', price=99.0,
+                    category='jewelery'),
+        ])
+        db.session.commit()
+    yield
+
+
+def search(client, **params):
+    response = client.get('/api/products/search', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_ranks_title_matches_first(client, searchable):
+    titles = [p['title'] for p in search(client, q='cotton shirt')['items']]
+    assert titles == ['Blue Cotton Shirt', 'Steel Watch']
+
+
+def test_search_prefix_and_highlight(client, searchable):
+    item = search(client, q='sock')['items'][0]
+    assert item['title'] == 'Cotton Socks'
+    assert item['title_highlight'] == 'Cotton <mark>Socks</mark>'
+
+
+def test_search_snippets_escape_product_html(client, searchable):
+    item = search(client, q='soft')['items'][0]
+    assert '&lt;b&gt;<mark>soft</mark>&lt;/b&gt;' in item['snippet']
+
+
+def test_search_index_follows_writes(client, test_app, searchable):
+    with test_app.app_context():
+        product = Product.query.filter_by(title='Steel Watch').one()
+        product.title = 'Gold Watch'
+        Product.query.filter_by(title='Cotton Socks').delete()
+        db.session.commit()
+
+    assert search(client, q='steel')['items'] == []
+    assert [p['title'] for p in search(client, q='gold')['items']] == ['Gold Watch']
+    assert [p['title'] for p in search(client, q='socks')['items']] == []
+
+
+def test_search_pages_with_cursor(client, searchable):
+    first = search(client, q='cotton', limit=2)
+    assert len(first['items']) == 2
+    second = search(client, q='cotton', limit=2, cursor=first['next_cursor'])
+    assert second['next_cursor'] is None
+
+    ids = [p['id'] for p in first['items'] + second['items']]
+    assert len(set(ids)) == 3
+
+
+def test_search_rejects_bad_queries(client, searchable):
+    assert client.get('/api/products/search?q=').status_code == 400
+    assert client.get('/api/products/search?q=cotton&cursor=bad').status_code == 400
+    # FTS5 syntax typed by users is searched for literally instead of failing
+    assert search(client, q='"shirt (*')['items']
+
+
+def test_build_match_query_quotes_terms():
+    assert build_match_query('blue  shirt') == '"blue" "shirt"*'
+    with pytest.raises(SearchError):
+        build_match_query('!!!')
+
+
+def test_like_search_fallback(test_app, searchable):
+    # What databases without FTS5 run; same shape, id order instead of rank
+    with test_app.app_context():
+        items, cursor = like_search(test_app.secret_key, 'COTTON shirt', limit=1)
+        assert [p['title'] for p in items] == ['Blue Cotton Shirt']
+        assert items[0]['title_highlight'] == 'Blue <mark>Cotton</mark> <mark>Shirt</mark>'
+        assert items[0]['snippet'] == ('A <mark>shirt</mark> made of &lt;b&gt;soft&lt;/b&gt; '
+                                       '<mark>cotton</mark>')
+
+        items, cursor = like_search(test_app.secret_key, 'cotton shirt', limit=1, cursor=cursor)
+        assert [p['title'] for p in items] == ['Steel Watch'] and cursor is None
+        assert like_search(test_app.secret_key, '100%')[0] == []
+        with pytest.raises(SearchError):
+            like_search(test_app.secret_key, 'cotton', cursor='bad')
@@ -0,0 +1,135 @@
+import json
+from collections import Counter
+
+import pytest
+
+from models.ecommerce import facets
+from models.ecommerce.cache import catalog_cache
+from models.ecommerce.facets import category_facets
+from models.ecommerce.inventory import adjust_reservations, set_stock
+from models.ecommerce.models import db, Order, OrderItem, Product, StockReservation
+from models.ecommerce.search import search_products
+from models.ecommerce.seeding import (SeedError, _read_json_array, load_products, normalize_product,
+                                      read_products, synthetic_products)
+
+FAKESTORE_RECORD = {
+    'id': 7, 'title': 'White Gold Plated Princess', 'price': 9.99, 'description': 'Ring',
+    'category': 'jewelery', 'image': 'ring.jpg', 'rating': {'rate': 3, 'count': 400}
+}
+
+
+def test_synthetic_products_are_deterministic():
+    assert list(synthetic_products(50, seed=3)) == list(synthetic_products(50, seed=3))
+    assert list(synthetic_products(50, seed=3)) != list(synthetic_products(50, seed=4))
+
+
+def test_synthetic_products_follow_category_weights():
+    counts = Counter(row['category'] for row in synthetic_products(4000, categories={'a': 3, 'b': 1}))
+    assert set(counts) == {'a', 'b'}
+    assert 2.5 < counts['a'] / counts['b'] < 3.5
+
+
+def test_read_products_streams_every_format(tmp_path):
+    flat = dict(title='Flat', price='2.50', category='misc', rating_rate='4.5', rating_count='12')
+
+    json_path = tmp_path / 'products.json'
+    json_path.write_text(json.dumps([FAKESTORE_RECORD] * 3))
+    jsonl_path = tmp_path / 'products.jsonl'
+    jsonl_path.write_text(json.dumps(FAKESTORE_RECORD) + '\n\n' + json.dumps(flat) + '\n')
+    csv_path = tmp_path / 'products.csv'
+    csv_path.write_text('title,price,category,rating_rate,rating_count\nFlat,2.50,misc,4.5,12\n')
+
+    # A read size smaller than one record forces the buffer to refill mid-element
+    assert list(_read_json_array(json_path, read_size=16)) == [FAKESTORE_RECORD] * 3
+    assert list(read_products(json_path)) == [FAKESTORE_RECORD] * 3
+    assert list(read_products(jsonl_path)) == [FAKESTORE_RECORD, flat]
+    assert [normalize_product(r) for r in read_products(csv_path)] == [normalize_product(flat)]
+
+
+def test_read_products_rejects_bad_files(tmp_path):
+    with pytest.raises(SeedError):
+        read_products(tmp_path / 'products.xml')
+    truncated = tmp_path / 'truncated.json'
+    truncated.write_text('[{"title": "A", "price": 1}, {"title": ')
+    with pytest.raises(SeedError):
+        list(read_products(truncated))
+
+
+def test_normalize_product():
+    assert normalize_product(FAKESTORE_RECORD) == {
+        'id': 7, 'title': 'White Gold Plated Princess', 'description': 'Ring', 'price': 9.99,
+        'image': 'ring.jpg', 'category': 'jewelery', 'rating_rate': 3.0, 'rating_count': 400
+    }
+    with pytest.raises(SeedError, match='Record 2'):
+        normalize_product({'title': 'No price'}, 2)
+    with pytest.raises(SeedError):
+        normalize_product({'title': 'Bad price', 'price': 'free'})
+
+
+def test_load_products_with_deferred_indexes(test_app, init_database):
+    with test_app.app_context():
+        version = catalog_cache.version.current()
+        progress = []
+        loaded = load_products(synthetic_products(250, categories={'garden': 1, 'toys': 1}), replace=True,
+                               chunk_size=100, fast=True, defer_indexes=True, progress=progress.append)
+
+        assert loaded == 250
+        assert progress == [100, 200, 250]
+        assert Product.query.count() == 250
+        assert catalog_cache.version.current() != version
+        assert sum(f['count'] for f in category_facets()) == 250
+
+        # The search and facet triggers are back in place after the load
+        title = db.session.get(Product, 1).title
+        assert search_products(test_app.secret_key, title)[0]
+        db.session.add(Product(title='Zyzzyva Lamp', price=5.0, category='garden'))
+        db.session.commit()
+        assert [p['title'] for p in search_products(test_app.secret_key, 'zyzzyva')[0]] == ['Zyzzyva Lamp']
+        assert sum(f['count'] for f in category_facets()) == 251
+
+
+def test_deferred_load_moves_the_catalog_version_after_the_rebuild(test_app, init_database, monkeypatch):
+    rebuilt_at = []
+    rebuild = facets.rebuild_category_facets
+
+    def record_version(session):
+        rebuild(session)
+        rebuilt_at.append(catalog_cache.version.current())
+
+    monkeypatch.setattr(facets, 'rebuild_category_facets', record_version)
+    with test_app.app_context():
+        load_products(synthetic_products(20), replace=True, defer_indexes=True)
+    assert rebuilt_at and catalog_cache.version.current() != rebuilt_at[0]
+
+
+def test_load_products_appends(test_app, init_database):
+    with test_app.app_context():
+        loaded = load_products([FAKESTORE_RECORD | {'id': None}, {'title': 'Second', 'price': 1}])
+        assert loaded == 2
+        assert Product.query.count() == 7
+        assert {'category0', 'jewelery', 'uncategorized'} <= {f['category'] for f in category_facets()}
+
+        with pytest.raises(SeedError, match='Record 2'):
+            load_products([{'title': 'Fine', 'price': 1}, {'title': 'Broken'}], replace=True)
+        # Replacing happens before the chunk that failed, and that chunk is rolled back
+        assert Product.query.count() == 0
+
+
+def test_replacing_products_clears_reservations_and_keeps_orders(test_app, init_database):
+    with test_app.app_context():
+        set_stock(1, 5)
+        adjust_reservations('cart-a', {1: 2})
+        assert load_products(synthetic_products(3), replace=True) == 3
+        assert StockReservation.query.count() == 0
+
+        order = Order(idempotency_key='seed', cart_id='cart-a', first_name='Ada', last_name='Lovelace',
+                      email='ada@example.com', phone='555-0100', address='1 Analytical Way', city='London',
+                      state='London', zip_code='N1 9GU', country='UK', payment_method='paypal')
+        product = Product.query.first()
+        order.items.append(OrderItem(product_id=product.id, title=product.title, unit_price_cents=999, quantity=1))
+        db.session.add(order)
+        db.session.commit()
+
+        with pytest.raises(SeedError, match='Orders refer'):
+            load_products(synthetic_products(3), replace=True)
+        assert Product.query.count() == 3
@@ -0,0 +1,128 @@
+import fcntl
+import json
+import time
+
+import pytest
+
+from models.ecommerce.models import db, Product
+from models.ecommerce.snapshot import CatalogSnapshot, SnapshotError, catalog_snapshot, write_snapshot
+
+
+@pytest.fixture
+def snapshot_store(test_app, init_database, tmp_path):
+    """Enable the snapshot store on a fresh file, without background rebuilds."""
+    with test_app.app_context():
+        db.session.add_all([
+            Product(title=f'Snap {i}', price=float(i), category='snap' if i % 2 else None) for i in range(20)
+        ])
+        db.session.commit()
+    catalog_snapshot.enabled = True
+    catalog_snapshot.auto_rebuild = False
+    catalog_snapshot.path = str(tmp_path / 'catalog.snap')
+    catalog_snapshot._snapshot = None
+    yield catalog_snapshot
+    catalog_snapshot.enabled = False
+    catalog_snapshot._snapshot = None
+
+
+def fetch_all_pages(client, **params):
+    items, cursor = [], None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        page = client.get('/api/products', query_string=query).get_json()
+        items.extend(page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items
+
+
+def test_snapshot_pages_match_sql(client, test_app, snapshot_store, statements):
+    cases = [{'limit': 7}, {'category': 'snap', 'limit': 3}, {'category': 'category1'}, {'category': 'none'}]
+    with test_app.app_context():
+        expected = [fetch_all_pages(client, **params) for params in cases]
+        assert snapshot_store.current() is None
+        assert snapshot_store.rebuild() is not None
+
+    statements.clear()
+    assert [fetch_all_pages(client, **params) for params in cases] == expected
+    # Served from the mapping without touching the database
+    assert not [s for s in statements if 'FROM product' in s]
+
+    # Price filters and sorts still go to SQL
+    response = client.get('/api/products', query_string={'sort': '-price', 'limit': 2})
+    assert [p['price'] for p in response.get_json()['items']] == [19.0, 18.0]
+
+
+def test_product_endpoint(client, test_app, snapshot_store):
+    from_sql = client.get('/api/products/3')
+    assert from_sql.status_code == 200
+    with test_app.app_context():
+        snapshot_store.rebuild()
+    from_snapshot = client.get('/api/products/3')
+    assert from_snapshot.get_json() == from_sql.get_json()
+    assert from_snapshot.headers['ETag'] == from_sql.headers['ETag']
+    assert client.get('/api/products/3', headers={'If-None-Match': from_sql.headers['ETag']}).status_code == 304
+    assert client.get('/api/products/999').status_code == 404
+
+
+def test_stale_snapshot_falls_back_until_rebuilt(client, test_app, snapshot_store):
+    with test_app.app_context():
+        snapshot_store.rebuild()
+        first = snapshot_store.current()
+        db.session.add(Product(title='Late arrival', price=1.0, category='snap'))
+        db.session.commit()
+        late_id = Product.query.filter_by(title='Late arrival').one().id
+
+        # The version moved on: the old mapping is no longer used
+        assert snapshot_store.current() is None
+        assert client.get(f'/api/products/{late_id}').status_code == 200
+
+        snapshot_store.rebuild()
+        second = snapshot_store.current()
+    assert second is not first and second.identity != first.identity
+    assert second.version > first.version
+    assert json.loads(second.get(late_id))['title'] == 'Late arrival'
+    # Views into the replaced file stay readable
+    assert json.loads(first.get(1))['id'] == 1
+
+
+def test_background_rebuild(test_app, snapshot_store):
+    snapshot_store.auto_rebuild = True
+    with test_app.app_context():
+        assert snapshot_store.current() is None
+        deadline = time.monotonic() + 10
+        while snapshot_store._building and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(snapshot_store.current()) == 25
+
+
+def test_only_one_process_builds(test_app, snapshot_store):
+    with open(snapshot_store.path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with test_app.app_context():
+            assert snapshot_store.rebuild() is None
+
+
+def test_snapshot_file_round_trip(tmp_path):
+    path = tmp_path / 'catalog.snap'
+    categories = {2: 'b', 3: 'a', 5: 'a', 8: None, 13: 'b'}
+    rows = [(i, f'P{i}', None, 1.5, None, category, 4.0, i) for i, category in categories.items()]
+    assert write_snapshot(path, 42, rows, json.dumps) == 5
+
+    snapshot = CatalogSnapshot(path)
+    assert snapshot.version == 42
+    assert list(snapshot.ids) == [2, 3, 5, 8, 13]
+    assert {name: list(positions) for name, positions in snapshot.categories.items()} == {'b': [0, 4], 'a': [1, 2]}
+    assert json.loads(snapshot.get(8))['title'] == 'P8'
+    assert snapshot.get(4) is None
+
+    records, last_id, more = snapshot.page(after_id=3, limit=2)
+    assert [json.loads(bytes(r))['id'] for r in records] == [5, 8] and last_id == 8 and more
+    records, last_id, more = snapshot.page('b', after_id=2, limit=2)
+    assert [json.loads(bytes(r))['id'] for r in records] == [13] and not more
+
+    write_snapshot(path, 43, [], json.dumps)
+    assert len(CatalogSnapshot(path)) == 0
+    path.write_bytes(b'not a snapshot' * 10)
+    with pytest.raises(SnapshotError):
+        CatalogSnapshot(path)
@@ -0,0 +1,114 @@
+import pytest
+from flask import Flask
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from models.ecommerce.models import db
+from storage import READ_BIND, Storage, StorageError, parse_pragmas, storage
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+
+def make_app(tmp_path, **config):
+    """An app with its own engines, configured by a separate Storage."""
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "storage.db"}', **config)
+    extension = Storage()
+    extension.init_app(app)
+    db.init_app(app)
+    extension.init_engines(app)
+    return app, extension
+
+
+def test_connections_use_the_profile_pragmas(test_app):
+    with test_app.app_context():
+        engine = db.engine
+        assert pragma(engine, 'journal_mode') == 'wal'
+        assert pragma(engine, 'synchronous') == 1  # NORMAL
+        assert pragma(engine, 'busy_timeout') == 5000
+        assert pragma(engine, 'query_only') == 0
+        assert engine.pool.size() == test_app.config['DB_POOL_SIZE']
+
+
+def test_read_engine_refuses_writes(test_app, init_database):
+    with test_app.app_context():
+        engine = db.engines[READ_BIND]
+        assert engine is storage.read_engine
+        assert pragma(engine, 'query_only') == 1
+        with engine.connect() as connection:
+            assert connection.execute(text('SELECT COUNT(*) FROM product')).scalar() == 5
+            with pytest.raises(OperationalError, match='readonly'):
+                connection.execute(text("UPDATE product SET title = 'x'"))
+
+
+def test_read_only_views_query_the_read_engine(client, test_app, init_database):
+    with test_app.app_context():
+        read, primary = db.engines[READ_BIND], db.engine
+    statements = {read: [], primary: []}
+    listeners = {
+        engine: lambda conn, cursor, statement, *args, engine=engine: statements[engine].append(statement)
+        for engine in statements
+    }
+    for engine, listener in listeners.items():
+        event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get('/api/products?limit=2&sort=price').status_code == 200
+        assert client.get('/api/categories').status_code == 200
+        # The export streams from the cursor its view opened on the read engine
+        assert len(client.get('/api/products/export').data.splitlines()) == 5
+        assert len(statements[read]) == 3 and statements[primary] == []
+
+        # The FTS5 search is a textual statement
+        statements[read].clear()
+        assert client.get('/api/products/search?q=product').status_code == 200
+        assert len(statements[read]) == 1 and 'product_fts MATCH' in statements[read][0]
+        assert statements[primary] == []
+
+        statements[read].clear()
+        assert client.post('/api/cart', json={'product_id': 1, 'action': 'add'}).status_code == 200
+        assert statements[read] == [] and statements[primary]
+    finally:
+        for engine, listener in listeners.items():
+            event.remove(engine, 'before_cursor_execute', listener)
+
+
+def test_profiles_and_overrides(tmp_path):
+    app, extension = make_app(tmp_path, STORAGE_PROFILE='durable', SQLITE_PRAGMAS='synchronous=OFF, cache_size=-1024',
+                              DB_POOL_SIZE=2)
+    with app.app_context():
+        assert pragma(db.engine, 'journal_mode') == 'wal'
+        assert pragma(db.engine, 'synchronous') == 0
+        assert pragma(db.engine, 'cache_size') == -1024
+        assert db.engine.pool.size() == 2 and db.engines[READ_BIND].pool.size() == 2
+        db.engine.dispose()
+        db.engines[READ_BIND].dispose()
+
+    app, extension = make_app(tmp_path, STORAGE_PROFILE='default', READ_ENGINE_ENABLED=False)
+    assert extension.read_engine is None
+    with app.app_context():
+        assert pragma(db.engine, 'journal_mode') == 'wal'  # Kept by the file
+        assert pragma(db.engine, 'synchronous') == 2  # FULL, the SQLite default
+        db.engine.dispose()
+
+    with pytest.raises(StorageError, match='Unknown storage profile'):
+        make_app(tmp_path, STORAGE_PROFILE='fast')
+
+
+def test_memory_databases_get_no_pool_or_read_engine():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', DB_POOL_SIZE=20)
+    extension = Storage()
+    extension.init_app(app)
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {}
+    assert READ_BIND not in app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def test_parse_pragmas():
+    assert parse_pragmas('') == []
+    assert parse_pragmas('Synchronous = FULL,mmap_size=0,') == [('synchronous', 'FULL'), ('mmap_size', '0')]
+    for malformed in ('synchronous', 'synchronous=FULL; DROP TABLE product', 'a b=1'):
+        with pytest.raises(StorageError):
+            parse_pragmas(malformed)